@@ -13,37 +13,44 @@ By specifying the python path as above, the necessary libraries
 '''
 
 import argparse
-import csv
+import bz2
+import ctypes
+import ctypes.util
 import glob
-import gzip
-import io
-import itertools
-import json
 import logging
 import os
 import plistlib
-import shutil
+import socket
 import sqlite3
 import string
 import subprocess
 import sys
-import tarfile
 import traceback
 from collections import OrderedDict
 from datetime import datetime
 from importlib import import_module
-from multiprocessing import Pool
 from random import choice
-from threading import Lock
-
-from modules.common.functions import finditem
 
 if sys.version_info[0] < 3:
-    import codecs
-    import cStringIO
+    from urllib import quote
+else:
+    from urllib.parse import quote
+
+from modules.common.archive import build_tar
+from modules.common.context import CollectionContext
+from modules.common.functions import finditem
+from modules.common.governor import ResourceGovernor, install
+from modules.common.hashing import open_cache
+from modules.common.journal import NullJournal, RunJournal, find_journal
+from modules.common.metrics import MetricsRecorder
+from modules.common.output import OutputBudget, OutputDatabase
+from modules.common.scheduler import ModuleScheduler, parse_class_limits
 
 __version__ = '1.2.0.13-alpha'
 
+XATTR_NOFOLLOW = 0x0001
+_libc = None
+
 
 def parseArguments():
     """Initialize argparser
@@ -66,10 +73,22 @@ def parseArguments():
     general.add_argument('-p', '--prefix', help='prefix to append to tarball and/or output files', default='automactc-output', required=False)
     general.add_argument('-f', '--forensic_mode', help='if flag is provided, will analyze mounted volume provided as inputdir', default=False, action='store_true', required=False)
     general.add_argument('-nt', '--no_tarball', help='if flag is provided, will NOT package output files into tarball', default=False, action='store_true', required=False)
+    general.add_argument('-zl', '--compression_level', type=int, help='gzip compression level of the output tarball, 1 (fastest) to 9 (smallest), defaults to 6', default=6, choices=range(1, 10), metavar='{1-9}', required=False)
+    general.add_argument('-zt', '--compression_threads', type=int, help='number of threads compressing the output tarball, defaults to 0 (one per CPU core)', default=0, required=False)
+    general.add_argument('-zo', '--compress_outputs', help='if flag is provided, WILL write csv and json outputs as block gzip (BGZF) files with a block index, as they are collected', default=False, action='store_true', required=False)
+    general.add_argument('-ss', '--shard_size', type=float, help='maximum MB per csv or json output file, after which the output continues in <name>.part0002 and so on and the full shard is archived right away, defaults to 0 (no limit)', default=0, required=False)
+    general.add_argument('-sr', '--shard_rows', type=int, help='maximum rows per csv or json output file, after which the output continues in <name>.part0002 and so on and the full shard is archived right away, defaults to 0 (no limit)', default=0, required=False)
     general.add_argument('-nl', '--no_logfile', help='if flag is provided, will NOT generate logfile on disk', default=False, action='store_true', required=False)
-    general.add_argument('-fmt', '--output_format', help='toggle between csv and json output, defaults to csv', default='csv', action='store', required=False, choices=['csv', 'json'])
-    general.add_argument('-np', '--no_low_priority', help='if flag is provided, will NOT run automactc with highest niceness (lowest CPU priority). high niceness is default', default=False, action='store_true', required=False)
-    general.add_argument('-b', '--multiprocessing', help='if flag is provided, WILL multiprocess modules [WARNING: Experimental!]', default=False, action='store_true', required=False)
+    general.add_argument('-fmt', '--output_format', help='toggle between csv and json output, all to write both in a single pass, or sqlite to write every output as a table of a single database, defaults to csv', default='csv', action='store', required=False, choices=['csv', 'json', 'all', 'sqlite'])
+    general.add_argument('-ns', '--no_sqlite_indexes', help='if flag is provided, will NOT index the path, user and timestamp columns of the -fmt sqlite database', default=False, action='store_true', required=False)
+    general.add_argument('-np', '--no_low_priority', help='if flag is provided, will NOT run automactc with lowest CPU and I/O priority and will NOT back off under system load. low priority is default', default=False, action='store_true', required=False)
+    general.add_argument('-rl', '--read_limit', type=float, help='maximum MB/s read by hashing, temporary database copies and compression, defaults to 0 (no limit)', default=0, required=False)
+    general.add_argument('-cs', '--cpu_share', type=float, help='target share of one CPU core used by automactc, e.g. 0.5, defaults to 0 (no limit)', default=0, required=False)
+    general.add_argument('-mb', '--memory_budget', type=float, help='maximum MB of rows held in the output buffers of all modules before the largest are written out, defaults to 256, 0 for no limit', default=256, required=False)
+    general.add_argument('-b', '--multiprocessing', help='if flag is provided, WILL run modules concurrently with the module scheduler', default=False, action='store_true', required=False)
+    general.add_argument('-w', '--workers', type=int, help='number of modules to run at the same time when -b is provided, defaults to 4', default=4, required=False)
+    general.add_argument('-cl', '--class_limits', type=str, nargs='+', help='per-class concurrency limits for -b as CLASS=N, classes are live, disk, sqlite and light. defaults to live=1 disk=1 sqlite=1', default=[''], required=False)
+    general.add_argument('-rs', '--resume', type=str, metavar='RUNID', help='resume the interrupted run RUNID from its journal in outputdir, skipping the modules it completed. provide the same arguments as the interrupted run', default=None, required=False)
     general.add_argument('-O', '--override_mount', help='if flag is provided, WILL bypass error where inputdir does not contain expected subdirs', default=False, action='store_true', required=False)
 
     console_log_args = parser.add_argument_group('console logging verbosity')
@@ -82,13 +101,22 @@ def parseArguments():
     dirlist_args.add_argument('-K', '--dir_include_dirs', type=str, nargs='+', help='directory inclusion filter for dirlist module, defaults to volume root, space separated list only', default=[''], required=False)
     dirlist_args.add_argument('-E', '--dir_exclude_dirs', type=str, nargs='+', help='directory and file exclusion filter for dirlist module. defaults are specified in README. space separated list only. \
                                put \'no-defaults\' as first item to overwrite default exclusions and then provide your own exclusions', default=[''], required=False)
-    dirlist_args.add_argument('-H', '--dir_hash_alg', nargs='+', help='either sha256 or md5 or both or none, at least one is recommended, defaults to sha256. also applies to autoruns module', default='sha256', required=False)
+    dirlist_args.add_argument('-H', '--dir_hash_alg', nargs='+', type=str.lower, choices=['sha256', 'md5', 'none'], metavar='{sha256,md5,none}', help='either sha256 or md5 or both or none, at least one is recommended, defaults to sha256. also applies to autoruns module, which like dirlist only has sha256 and md5 columns', default='sha256', required=False)
     dirlist_args.add_argument('-S', '--dir_hash_size_limit', type=int, help='file size filter for which files to hash, in megabytes, defaults to 10MB. also applies to autoruns module', default=10, required=False)
+    dirlist_args.add_argument('-HC', '--dir_hash_cache', type=str, help='directory of a hash cache kept across runs, so that files unchanged since an earlier run are not hashed again. also applies to autoruns module', default=None, required=False)
     dirlist_args.add_argument('-R', '--dir_recurse_bundles', help='will fully recurse app bundles if flag is provided. this takes much more time and space', default=False, action='store_true', required=False)
     dirlist_args.add_argument('-NC', '--dir_no_code_signatures', help='if flag is provided, will NOT check code signatures for app and kext files. also applies to autoruns module', default=False, action='store_true', required=False)
     dirlist_args.add_argument('-NM', '--dir_no_multithreading', help='if flag is provided, will NOT multithread the dirlist module', default=False, action='store_true', required=False)
+    dirlist_args.add_argument('-WN', '--dir_min_workers', type=int, help='minimum number of dirlist threads, the number in use is tuned to the measured throughput, defaults to 1', default=1, required=False)
+    dirlist_args.add_argument('-WX', '--dir_max_workers', type=int, help='maximum number of dirlist threads, set equal to -WN for a fixed number, defaults to and is capped at the number of CPU cores, or 5 if there are fewer', default=0, required=False)
     args = parser.parse_args()
 
+    # validated here, with or without -b, so that a bad limit stops the run before any setup
+    try:
+        args.class_limits = parse_class_limits(args.class_limits)
+    except ValueError as e:
+        parser.error(str(e))
+
     return args
 
 
@@ -164,7 +192,12 @@ def gen_fullprefix(startTime):
 
     for db in serial_dbs:
         try:
-            cursor = sqlite3.connect(db).cursor()
+            # Open read-only and without locking, so a database held open by
+            # the system does not have to be copied out first.
+            if sys.version_info[0] < 3:
+                cursor = sqlite3.connect(db).cursor()
+            else:
+                cursor = sqlite3.connect('file:{0}?mode=ro&immutable=1'.format(quote(db)), uri=True).cursor()
             _serial = cursor.execute(serial_query).fetchone()[0]
 
             log.debug("Retrieved serial number {0} from {1}.".format(_serial, db))
@@ -172,29 +205,14 @@ def gen_fullprefix(startTime):
 
         except sqlite3.OperationalError:
             error = [x for x in traceback.format_exc().split('\n') if "OperationalError" in x]
-            log.debug("Could not connect [{0}].".format(error[0]))
-            if "database is locked" or "unable to open" in error[0]:
-                tmpdb = os.path.basename(db) + '-tmp'
-                log.debug("Trying to connect to db copied to temp location...")
-
-                shutil.copyfile(db, os.path.join(outputdir, tmpdb))
-                db = os.path.join(outputdir, tmpdb)
-                try:
-                    cursor = sqlite3.connect(db).cursor()
-                    _serial = cursor.execute(serial_query).fetchone()[0]
-                    log.debug("Successfully connected.")
-                    os.remove(db)
-                    break
-                except Exception:
-                    log.debug("Could not get serial number from {0}. Trying another directory.".format(db))
-                os.remove(db)
+            log.debug("Could not connect to {0} [{1}]. Trying another database.".format(db, error[0]))
+        except Exception:
+            log.debug("Could not get serial number from {0}. Trying another database.".format(db))
 
     # Get local hostname.
     if 'Volumes' not in inputdir and forensic_mode is not True:
         try:
-            hostname_cmd, e = subprocess.Popen(["hostname"], stdout=subprocess.PIPE).communicate()
-            hostname_cmd = hostname_cmd.decode('utf-8')
-            _hostname = hostname_cmd.rstrip('\n')
+            _hostname = socket.gethostname()
             log.debug("Retrieved hostname {0}.".format(_hostname))
         except Exception:
             _hostname = 'HNERROR'
@@ -216,45 +234,50 @@ def gen_fullprefix(startTime):
 
     # Get current system IP address (if running on live machine).
     if 'Volumes' not in inputdir and forensic_mode is not True:
-        _ip, e = subprocess.Popen(["ifconfig", "en0"], stdout=subprocess.PIPE).communicate()
+        # Connecting a UDP socket sends nothing, but selects the address of
+        # the interface holding the default route.
         try:
-            _ip = ''.join([i for i in _ip.decode().split('\n\t') if i.startswith("inet ")]).split(' ')[1]
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.connect(('192.0.2.1', 9))
+                _ip = sock.getsockname()[0]
+            finally:
+                sock.close()
             log.debug("Retrieved IPv4 address as {0}.".format(_ip))
-        except IndexError:
+        except (socket.error, IndexError):
             _ip = "255.255.255.255"
             log.error("IPv4 not available, recorded as 255.255.255.255.")
     else:
         wifilog = os.path.join(inputdir, 'private/var/log/wifi.log')
         wifi_bzlogs = glob.glob(os.path.join(inputdir, 'private/var/log/wifi.log.*.bz2'))
 
+        last_ip = None
         try:
-            wifi_data = open(wifilog, 'r').readlines()
-            try:
-                last_ip = [i for i in wifi_data if "Local IP" in i][-1].rstrip()
-                _ip = last_ip.split(' ')[-1]
-                iptime = ' '.join(last_ip.split(' ')[0:4])
-                log.debug("Last IP address {0} was assigned around {1} (local time).".format(_ip, iptime))
-            except IndexError:
+            with open(wifilog, 'rb') as f:
+                last_ip = _last_wifi_ip(f)
+            if last_ip is None:
                 log.debug("Could not find last IP in wifi.log, will check historical wifi.log.*.bz2 files.")
         except IOError:
             log.debug("Could not parse wifi.log, will check historical wifi.log.*.bz2 files.")
 
-        wdata = []
-        if len(wifi_bzlogs) > 0:
-            for i in wifi_bzlogs:
+        # Rotations are numbered newest first, stop at the newest one with an IP.
+        for i in sorted(wifi_bzlogs, key=_wifi_log_index):
+            if last_ip is not None:
+                break
+            try:
+                f = bz2.BZ2File(i)
                 try:
-                    wifi_bzdata, e = subprocess.Popen(["bzcat", i], stdout=subprocess.PIPE, stderr=subprocess.STDOUT).communicate()
-                    wdata.append(wifi_bzdata.split('\n'))
-                except Exception:
-                    log.debug("Could not parse {0}.".format(i))
-        w = list(itertools.chain.from_iterable(wdata))
+                    last_ip = _last_wifi_ip(f)
+                finally:
+                    f.close()
+            except Exception:
+                log.debug("Could not parse {0}.".format(i))
 
-        try:
-            last_ip = [i for i in w if "Local IP" in i][0].rstrip()
+        if last_ip is not None:
             _ip = last_ip.split(' ')[-1]
             iptime = ' '.join(last_ip.split(' ')[0:4])
             log.debug("Last IP address {0} was assigned around {1} (local time).".format(_ip, iptime))
-        except Exception:
+        else:
             log.debug("Could not get last IP from current or historical wifi.log files. Recorded at 255.255.255.255.")
             _ip = "255.255.255.255"
 
@@ -269,298 +292,41 @@ def gen_fullprefix(startTime):
     return full_prefix, _serial
 
 
-def del_none(d):
-    """Utility to recursively delete keys with no value.
-    """
-    for key, value in list(d.items()):
-        if value is None or value == "":
-            del d[key]
-        elif isinstance(value, dict):
-            del_none(value)
-    return d
-
-
-class UnicodeWriter:
-    """
-    A CSV writer which will write rows to CSV file "f",
-    which is encoded in the given encoding.
-
-    Adopted from the Python documentation
-    Source: https://docs.python.org/2.7/library/csv.html
-    """
-
-    def __init__(self, f, dialect=csv.excel, encoding="utf-8", **kwds):
-        self.queue = cStringIO.StringIO()
-        self.writer = csv.writer(self.queue, dialect=dialect, **kwds)
-        self.stream = f
-        self.encoder = codecs.getincrementalencoder(encoding)()
-
-    def writerow(self, row):
-        self.writer.writerow([s.encode("utf-8") for s in row])
-        data = self.queue.getvalue()  # Fetch UTF-8 output from the queue ...
-        data = data.decode("utf-8")
-
-        self.stream.write(data)  # write to the target stream
-        self.queue.truncate(0)
-
-    def writerows(self, rows):
-        for row in rows:
-            self.writerow(row)
-
-
-class data_writer:
-    """
-    Establish data_writer class to handle output file format and naming scheme.
-    """
-
-    output_format = parseArguments().output_format
-
-    def __init__(self, name, headers, datatype=output_format):
-        """
-        Initialize the data_writer.
-        If headers is None, treats as just a wrapper.
-        If datatype is 'all', writes in all available formats (csv, json).
-
-        Caller must call the flush method at the close of the module to ensure
-        all contents of queue that were < buffer_size at the end are written
-        to the file.
-        """
-        possible_formats = ["json", "csv", "file"]
-        if datatype not in possible_formats and datatype != 'all':
-            raise ValueError('Unable to instantiate data_writer for datatype {0}'.format(datatype))
-
-        if sys.version_info[0] < 3 and headers is not None:
-            self.headers = [str(h).decode('utf-8') for h in headers]
-        else:
-            self.headers = headers
-        self.name = filename_prefix + ',' + name + runID
-        self.mod = name
-        self.datatype = datatype
-        self._log = logging.getLogger(self.mod)
-        self.__queue = list()
-        self.__queue_data_writer = None
-        self.__mux = Lock()  # make thread-safe for concurrent modules
-
-        formats = []
-        if datatype == 'all':
-            formats = possible_formats
-        else:
-            formats.append(datatype)
-
-        self.output_filename = self.name + '.' + self.datatype
-        self.data_file_name = os.path.join(outputdir, self.output_filename)
-
-        if headers is None:  # no file generated here. simply to manage file name for output to be captured.
-            return
-        if self.datatype == 'csv':
-            with io.open(self.data_file_name, 'w', encoding='utf-8') as data_file:
-                if sys.version_info[0] < 3:
-                    writer = UnicodeWriter(data_file)
-                else:
-                    writer = csv.writer(data_file)
-                writer.writerow(self.headers)
-        elif self.datatype == 'json':
-            with io.open(self.data_file_name, 'w', encoding='utf-8') as data_file:
-                pass
-        elif self.datatype == 'file':  # no file generated here. simply to manage file name for output to be captured.
-            return
-
-    def write_entry(self, data):
-        """
-        Writes output entry to output file.
-        data is a list of strings.
-        """
-        log.warn("write_entry will be deprecated in future versions, use write_record instead :) ")
-        if self.datatype == 'csv':
-            self.__csv_write_entry(data)
-        elif self.datatype == 'json':
-            self.__json_write_entry(data)
-        elif self.datatype == 'all':
-            self.__json_write_entry(data, all=True)
-            self.__csv_write_entry(data, All=True)
-        return ""
-
-    def write_record(self, record, buffer_cap=10000):
-        """
-        Writes output entry to buffer.
-        Record is a list object or dict like object.
-        Once buffer_cap entries are stored in the queue, it is flushed to file.
-
-        Caller must call the flush method at the close of the module to ensure
-        all contents of queue that were < buffer_size at the end are written
-        to the file.
-        """
-        if record is not None:
-            # We need to enforce the correct encoding for both versions of python
-            if sys.version_info[0] < 3:
-                if isinstance(record, list):
-                    self.__queue.append([str(s).decode('utf-8') if isinstance(s, unicode) is False else s for s in record])
-                else:
-                    self.__queue.append([str(s).decode('utf-8') if isinstance(s, unicode) is False else s for s in record.values()])
-            else:
-                if isinstance(record, list):
-                    self.__queue.append([s.decode('utf-8') if isinstance(s, bytes) else str(s) for s in record])
-                else:
-                    self.__queue.append(s.decode('utf-8') if isinstance(s, bytes) else str(s) for s in record.values())
-        if len(self.__queue) > buffer_cap:
-            self.flush_record()
-        return ""
-
-    def flush_record(self):
-        """
-        Flush the queue to the output file.
-        Blocking method.
-        This method should be called at the close of the module to handle
-        straggling entries in the buffer.
-        """
-        self.__mux.acquire()
-        try:
-            if self.datatype == 'csv':
-                self.__csv_flush_record()
-            elif self.datatype == 'json':
-                self.__json_flush_record()
-            elif self.datatype == 'all':
-                self.__csv_flush_record(all=True)
-                self.__json_flush_record(all=True)
-        except Exception as e:
-            log.debug("data_writer: Failed to flush queue: {0}: {1}".format(str(e), [traceback.format_exc()]))
-        finally:
-            try:
-                if sys.version_info[0] < 3:
-                    del self.__queue[:]
-                else:
-                    self.__queue.clear()
-            except Exception as e:
-                log.error("data_writer: Failed to clear datawriter queue: {0}".format(str(e)))
-            self.__mux.release()
-
-    def __csv_flush_record(self, all=False):
-        """
-        Lower method for flushing contents of data_writer queue to CSV file.
-        all is a bool determining if we are writing all output types as well.
-        After this method exits, the contents of the queue will be stored
-        in the CSV file.
-        """
-        data_file_name = self.data_file_name
-        if all is True:
-            data_file_name = data_file_name.split('all')[0] + 'csv'
-
-        with io.open(data_file_name, 'a', encoding='utf-8') as data_file:
-            if sys.version_info[0] < 3:
-                self.__queue_data_writer = UnicodeWriter(data_file)
-            else:
-                self.__queue_data_writer = csv.writer(data_file)
-            self.__queue_data_writer.writerows([row for row in self.__queue])
-            data_file.flush()
-
-    def __json_flush_record(self, all=False):
-        """
-        Lower method for flushing contents of data_writer queue to JSON file.
-        all is a bool determining if we are writing all output types as well.
-        After this method exits, the contents of the queue will be stored in
-        the JSON file.
-        """
-        data_file_name = self.data_file_name
-        if all is True:
-            data_file_name = data_file_name.split('all')[0] + 'json'
-        zipped_data_list = [del_none(dict(zip(self.headers, entry))) for entry in self.__queue]
-        with io.open(data_file_name, 'a', encoding='utf-8') as data_file:
-            for zipped_data in zipped_data_list:
-                if sys.version_info[0] < 3:
-                    data_file.write(unicode(json.dumps(zipped_data, indent=None)))
-                    data_file.write('\n'.decode('utf-8'))
-                else:
-                    # json.dump(zipped_data, data_file, indent=None)
-                    data_file.write(json.dumps(zipped_data, indent=None))
-                    data_file.write('\n')
-            data_file.flush()
-
-    def __json_write_entry(self, data, all=False):
-        log.warn("__json_write_entry will be deprecated in future versions, use __json_write_record instead :) ")
-        data_file_name = self.data_file_name
-        if all is True:
-            data_file_name = data_file_name.split('all')[0] + 'json'
-        zipped_data = del_none(dict(zip(self.headers, data)))
-        with io.open(data_file_name, 'a', encoding='utf-8') as data_file:
-
-            if sys.version_info[0] < 3:
-                data_file.write(unicode(json.dumps(zipped_data, indent=None)))
-                data_file.write('\n'.decode('utf-8'))
-            else:
-                json.dump(zipped_data, data_file, indent=None)
-                data_file.write('\n')
-
-            data_file.flush()
-
-    def __csv_write_entry(self, data, all=False):
-        log.warn("__csv_write_entry will be deprecated in future versions, use __csv_write_record instead :) ")
-        data_file_name = self.data_file_name
-        if all is True:
-            data_file_name = data_file_name.split('all')[0] + 'csv'
-        with io.open(data_file_name, 'a', encoding='utf-8') as data_file:
-            if sys.version_info[0] < 3:
-                writer = UnicodeWriter(data_file)
-            else:
-                writer = csv.writer(data_file)
-            writer.writerow(data)
-
-
-class build_tar:
-    """
-    Establish class to build tarball of AutoMacTC output files on the fly.
-    """
-
-    def __init__(self, name):
-        """
-        Initialize the build_rar wrapper.
-        name is a string denoting filename of the tarball.
-        """
-        self.name = name
-
-    def add_file(self, fname):
-        """
-        Add the filepath specified by fname to the tarball.
-        fname is a valid filepath to an AutoMacTC output file.
-        """
-        if not no_tarball:
-            out_tar = os.path.join(outputdir, self.name)
-            t_fname = os.path.join(outputdir, fname)
-            archive = tarfile.open(out_tar, 'a')
-
-            archive.add(t_fname, fname.replace(runID, ''))
-            archive.close()
-            try:
-                if not os.path.isdir(t_fname):
-                    os.remove(t_fname)
-                else:
-                    shutil.rmtree(t_fname)
-            except OSError:
-                log.error("Added to archive, but could not delete {0}.".format(t_fname))
-
-
 def run_modules():
     """Run the modules that were selected via gen_runlist().
     """
-    pool = Pool()
     if module_inc_opts != ['']:
         runmods = gen_runlist(module_inc_opts, available_mods)
-        if not multiprocessing:
-            for module in runmods:
-                modExec(module)
-        else:
-            runner = pool.map(modExec, runmods)
-
     elif module_exc_opts != ['']:
         runmods = [x for x in available_mods if x not in gen_runlist(module_exc_opts, available_mods)]
+    else:
+        return
 
-        if not multiprocessing:
-            for module in runmods:
-                modExec(module)
-        else:
-            runner = pool.map(modExec, runmods)
+    if multiprocessing:
+        workers = max(1, args.workers)
+        class_limits = args.class_limits
+        log.debug("Running modules with {0} workers, class limits: {1}".format(workers, class_limits))
+    else:
+        workers = 1
+        class_limits = None
+
+    completed = set(journal.completed_modules())
+    if completed:
+        log.info("Resuming run, skipping {0} module(s) completed before: {1}".format(
+            len(completed), ', '.join(m.split('_')[-1] for m in runmods if m in completed)))
+        runmods = [x for x in runmods if x not in completed]
+
+    scheduler = ModuleScheduler(modExec, workers=workers, class_limits=class_limits, on_complete=report_module)
+    scheduler.add_modules(runmods)
+    scheduler.run()
 
-    pool.close()
-    pool.join()
+
+def report_module(task, done, total):
+    """Report completion of a module run by the ModuleScheduler.
+    """
+    modName = task.module.split('_')[-1]
+    status = 'finished' if task.result else 'failed'
+    log.info("[{0}/{1}] {2} ({3}) {4} in {5:.2f}s.".format(done, total, modName.upper(), task.cls, status, task.runtime))
 
 
 def modExec(module):
@@ -573,22 +339,17 @@ def modExec(module):
     else:
         dn = '{0}'.format(modName.upper())
 
+    metrics = recorder.measure(module)
     try:
-        modStart = datetime.utcnow()
         log.info("Running {0}".format(dn))
         modImport = 'modules.' + module
 
-        import_module(modImport)
+        import_module(modImport).module(ctx.for_module(module))
+        metrics.stop(True)
+        archive_outputs(module, metrics)
 
-        modOutput = [i for i in glob.glob(outputdir + '/*') if all(p in i for p in [modName, runID])]
-        try:
-            arch = [archive.add_file(os.path.basename(outfile)) for outfile in modOutput]
-        except IndexError:
-            pass
-
-        modEnd = datetime.utcnow()
-        modRuntime = modEnd - modStart
-        log.debug("{0} finished in {1}.".format(dn, modRuntime))
+        log.debug("{0} finished in {1:.2f}s.".format(dn, metrics.wall_time))
+        return True
 
     except KeyboardInterrupt:
         sys.stdout.write('\r')
@@ -598,35 +359,82 @@ def modExec(module):
     except Exception:
         log.error("{0} failed: {1}".format(module, [traceback.format_exc()]))
 
+    metrics.stop(False)
+    archive_outputs(module, metrics)
+    return False
+
 
-def gz_tar(full_prefix):
-    """GZIP the tar archive.
-    full_prefix is a string denoting the filename prefix of the tar file.
+def archive_outputs(module=None, metrics=None):
+    """Hand the outputs registered in the manifest to the archiver.
+    module limits this to the outputs of a single module. If the metrics of
+    the module are provided, the module is recorded as completed in the
+    journal once its outputs are in the tarball.
     """
-    tarfile = os.path.join(outputdir, full_prefix + '.tar')
-    try:
-        with open(tarfile, 'rb') as f_in, gzip.open(tarfile + '.gz', 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
-        os.remove(tarfile)
-    except Exception as e:
-        log.error("Tarfile {0} was not generated. Module(s) run collected no info?".format(tarfile))
-        log.error(e)
+    entries = ctx.manifest.take(module)
+    checkpoint = None
+    if metrics is not None:
+        checkpoint = checkpoint_module(module, entries, metrics)
+    archive.add_files([e.filename for e in entries if e.table is None], checkpoint)  # tables are in the database
 
-    return tarfile + '.gz'
+
+def checkpoint_module(module, entries, metrics):
+    """Returns the archive checkpoint callback recording module, its
+    outputs and metrics as completed in the journal.
+    """
+    outputs = []
+    for e in entries:
+        output = e.to_dict()
+        output['filename'] = e.filename
+        outputs.append(output)
+    event = OrderedDict([('module', module), ('outputs', outputs), ('metrics', metrics.to_dict())])
+
+    def checkpoint(offset, tar_offset):
+        journal.record('module', sync=True, offset=offset, tar_offset=tar_offset, **event)
+    return checkpoint
 
 
 def subq_remove(subqpath):
-    """Subprocess remove quarantine xattrs.
+    """Remove the quarantine xattr from subqpath, if it is set.
+    Uses getxattr/removexattr from libc in-process, so that paths which are
+    not quarantined cost a single syscall.
+    Returns True if the xattr was removed.
+    """
+    global _libc
+    if sys.platform != 'darwin':
+        return False
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    path = subqpath.encode('utf-8') if not isinstance(subqpath, bytes) else subqpath
+    if _libc.getxattr(path, b'com.apple.quarantine', None, 0, 0, XATTR_NOFOLLOW) < 0:
+        return False
+    return _libc.removexattr(path, b'com.apple.quarantine', XATTR_NOFOLLOW) == 0
+
+
+def _last_wifi_ip(lines):
+    """Returns the last "Local IP" line in lines, or None.
+    """
+    last_ip = None
+    for line in lines:
+        if not isinstance(line, str):
+            line = line.decode('utf-8', 'replace')
+        if "Local IP" in line:
+            last_ip = line.rstrip()
+    return last_ip
+
+
+def _wifi_log_index(path):
+    """Sort key for wifi.log.N.bz2 rotations, newest (lowest N) first.
     """
-    xattr_cmd = "xattr -d com.apple.quarantine " + subqpath
     try:
-        subprocess.call(xattr_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except OSError:
-        return ''
+        return int(os.path.basename(path).split('.')[2])
+    except (IndexError, ValueError):
+        return sys.maxsize
 
 
 if __name__ == "__main__":
 
+    startTime = datetime.utcnow()
+
     # Remove quarantine xattrs for 10.15+
     quarantine_remove = ['./modules/common/dep/_cffi_backend.cpython-37m-darwin.so',
                          './modules/common/dep/_cffi_backend.cpython-39-darwin.so',
@@ -636,9 +444,10 @@ if __name__ == "__main__":
     for p in glob.glob('./modules/common/Crypto/*/*.so'):
         quarantine_remove.append(p)
     for i in quarantine_remove:
-        subq_remove(i)
-
-    startTime = datetime.utcnow()
+        try:
+            subq_remove(i)
+        except (OSError, AttributeError):
+            pass
 
     # Set environmental variable TZ to UTC.
     os.environ['TZ'] = 'UTC'
@@ -721,6 +530,34 @@ if __name__ == "__main__":
     if os.path.isdir(outputdir) is False:
         os.makedirs(outputdir)
 
+    # Load the journal of the run to resume, and take over its identity.
+    journal = NullJournal()
+    resumed = None
+    if args.resume:
+        if no_tarball:
+            print("--resume continues the tarball of a run, and cannot be used with --no_tarball. Exiting.")
+            sys.exit(1)
+        if args.output_format == 'sqlite':
+            print("--resume cannot be used with -fmt sqlite, whose database is only consistent once finished. Exiting.")
+            sys.exit(1)
+        journal_file = find_journal(outputdir, args.resume)
+        if journal_file is not None:
+            journal = RunJournal(journal_file)
+            resumed = journal.start()
+        if resumed is None:
+            print("No journal of run {0} found in {1}. Exiting.".format(args.resume, outputdir))
+            sys.exit(1)
+        runID = resumed['runID']
+        output_format = resumed['output_format']
+        startTime = datetime.strptime(resumed['startTime'], '%Y-%m-%dT%H:%M:%S.%f')
+
+        # Remove temporary database copies left behind by the interrupted run.
+        for tmp in glob.glob(os.path.join(outputdir, '*-tmp_amtc*')):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
     # Establish logger.
     if not args.no_logfile:
         if output_format == "json":
@@ -729,6 +566,10 @@ if __name__ == "__main__":
             logfilename = 'runtime{0}.log'.format(runID)
 
         logfile = os.path.join(outputdir, logfilename)
+
+        # Append to the runtime log of the interrupted run.
+        if resumed is not None and os.path.exists(os.path.join(outputdir, resumed['filename_prefix'] + ',' + logfilename)):
+            os.rename(os.path.join(outputdir, resumed['filename_prefix'] + ',' + logfilename), logfile)
     else:
         logfile = '/dev/null'
 
@@ -767,7 +608,10 @@ if __name__ == "__main__":
 
     logging.getLogger('').addHandler(ch)
 
-    log.info("Started automactc (v. {0}) at {1}.".format(__version__, startTime))
+    if resumed is not None:
+        log.info("Resuming automactc (v. {0}) run started at {1}.".format(__version__, startTime))
+    else:
+        log.info("Started automactc (v. {0}) at {1}.".format(__version__, startTime))
     log.debug("Invocation: {0}".format(' '.join(sys.argv)))
 
     # Check if user is trying to run AMTC against mounted volume.
@@ -785,10 +629,20 @@ if __name__ == "__main__":
             sys.exit(0)
 
     # Generate full prefix of the filenames.
-    full_prefix, serial = gen_fullprefix(startTime)
-    filename_prefix = ', '.join(full_prefix.split(', ')[:4])
+    if resumed is not None:
+        full_prefix, serial, filename_prefix = resumed['full_prefix'], resumed['serial'], resumed['filename_prefix']
+    else:
+        full_prefix, serial = gen_fullprefix(startTime)
+        filename_prefix = ', '.join(full_prefix.split(', ')[:4])
     log.debug("Full prefix: {0}".format(full_prefix))
 
+    # Start the journal of the run, so that it can be resumed if interrupted.
+    if not no_tarball and resumed is None and output_format != 'sqlite':
+        journal = RunJournal(os.path.join(outputdir, filename_prefix + ',journal' + runID + '.jsonl'))
+        journal.record('start', sync=True, runID=runID, full_prefix=full_prefix, filename_prefix=filename_prefix,
+                       serial=serial, output_format=output_format,
+                       startTime=startTime.strftime('%Y-%m-%dT%H:%M:%S.%f'))
+
     # Capture the OS version as a float for comparison tests in modules.
     try:
         pslistfile = open(os.path.join(inputdir, 'System/Library/CoreServices/SystemVersion.plist'), 'rb')
@@ -812,9 +666,11 @@ if __name__ == "__main__":
             if 'Volumes' not in inputdir and forensic_mode is not True:
                 try:
                     OSVersion, e = subprocess.Popen(["sw_vers", "-productVersion"], stdout=subprocess.PIPE).communicate()
+                    OSVersion = OSVersion.decode('utf-8').strip()
                     log.debug("Got OSVersion: {0}".format(OSVersion))
                 except Exception:
                     log.error("Could not get OSVersion: {0}".format([traceback.format_exc()]))
+                    OSVersion = None
             else:
                 log.error("Could not get OSVersion: alternative method does not work on forensic image.")
                 OSVersion = None
@@ -833,20 +689,60 @@ if __name__ == "__main__":
     if len(inputsysdir) > 1 and inputsysdir[-1] == '/':
         inputsysdir = inputsysdir[:-1]
 
-    # Instantiate archive as build_tar object.
-    tarname = full_prefix + ".tar"
-    archive = build_tar(tarname)
-
-    # Set CPU priority based on CLI invocation. Default is low priority.
+    # Establish the resource governor shared by all modules. Default is low priority.
+    governor = install(ResourceGovernor(not args.no_low_priority, read_rate=int(args.read_limit * 1048576),
+                                        cpu_share=args.cpu_share))
     if not args.no_low_priority:
-        log.info("Going to run in low CPU priority mode.")
-        os.nice(19)
+        log.info("Going to run in low priority mode.")
+        governor.apply_priority()
+
+    # Instantiate archive as build_tar object, continuing from the last completed module when resuming.
+    tarname = full_prefix + ".tar.gz"
+    last_module = journal.last_module()
+    archive = build_tar(tarname, outputdir, runID, not no_tarball,
+                        compresslevel=args.compression_level, threads=args.compression_threads,
+                        governor=governor,
+                        resume=(last_module['offset'], last_module['tar_offset']) if last_module else None)
+
+    # Build the context that is handed to every module.
+    ctx = CollectionContext(
+        inputdir=inputdir, inputsysdir=inputsysdir, outputdir=outputdir,
+        forensic_mode=forensic_mode, no_tarball=no_tarball, output_format=output_format,
+        quiet=quiet, rtr=rtr, verbose=verbose, debug=debug, startTime=startTime,
+        full_prefix=full_prefix, filename_prefix=filename_prefix, serial=serial,
+        OSVersion=OSVersion, runID=runID, archive=archive, governor=governor, journal=journal,
+        output_budget=OutputBudget(int(args.memory_budget * 1048576)),
+        compress_outputs=args.compress_outputs,
+        shard_rows=args.shard_rows, shard_size=int(args.shard_size * 1048576),
+        output_database=OutputDatabase(os.path.join(outputdir, full_prefix + '.sqlite'), not args.no_sqlite_indexes) if output_format == 'sqlite' else None,
+        dirlist_include_dirs=dirlist_include_dirs, dirlist_exclude_dirs=dirlist_exclude_dirs,
+        hash_alg=hash_alg, hash_size_limit=hash_size_limit,
+        hash_cache=open_cache(args.dir_hash_cache) if args.dir_hash_cache else None,
+        no_code_signatures=no_code_signatures, recurse_bundles=recurse_bundles,
+        dirlist_no_multithreading=dirlist_no_multithreading,
+        dirlist_min_workers=max(1, args.dir_min_workers), dirlist_max_workers=args.dir_max_workers
+    )
+
+    # The output database is archived after all modules, once indexed.
+    if ctx.output_database is not None:
+        ctx.output_database.entry = ctx.register_file(ctx.output_database.path, 'sqlite', 'sqlite')
+        ctx.output_database.entry.closer = ctx.output_database.close
+
+    # Measure every module run for the metrics output.
+    recorder = MetricsRecorder()
+
+    # Take over the outputs and metrics of the modules completed before resuming.
+    for event in journal.events:
+        if event['event'] == 'module':
+            ctx.manifest.restore(outputdir, event['module'], event['outputs'])
+            recorder.restore(event['module'], event['metrics'])
 
     # Run the modules!
     if not no_tarball:
         log.info("RunID: {0}".format(runID[1:]))
     else:
         log.info("RunID: {0}".format("N/A"))
+    log.debug("Startup finished in {0:.3f}s.".format((datetime.utcnow() - startTime).total_seconds()))
     run_modules()
 
     # Get program end time.
@@ -855,17 +751,43 @@ if __name__ == "__main__":
     log.info("Modules finished at {0}.".format(endTime))
     log.info("Module runtime: {0}.".format(total_runTime))
 
-    # Clean up any straggler files in the outputdir based on runID.
-    stragglers = [i for i in glob.glob(outputdir + '/*') if runID in i]
-    for i in stragglers:
-        if not no_tarball:
-            log.debug("Archiving straggler file {0}.".format(i))
-            archive.add_file(os.path.basename(i))
+    # Keep the digests of this run for the next one.
+    try:
+        ctx.hasher.close()
+    except Exception:
+        log.error("Could not save the hash cache: {0}".format([traceback.format_exc()]))
 
-    # Compress tar to tarball.
+    # Write the per-module metrics of the run.
+    try:
+        recorder.write(ctx)
+    except Exception:
+        log.error("Could not write module metrics: {0}".format([traceback.format_exc()]))
+
+    # Archive any outputs still registered in the manifest, including the runtime log.
+    if not args.no_logfile:
+        ctx.register_file(prefix_logfile, 'runtime', 'log')
+    archive_outputs()
+
+    # Write the output manifest and archive it with the outputs.
+    manifest_file = os.path.join(outputdir, filename_prefix + ',manifest' + runID + '.json')
+    try:
+        ctx.manifest.write(manifest_file)
+        archive.add_file(os.path.basename(manifest_file))
+    except Exception:
+        log.error("Could not write output manifest: {0}".format([traceback.format_exc()]))
+
+    # Finish the compressed tarball stream.
     if not no_tarball:
-        log.info("Creating tarball of output")
-        tarball = gz_tar(full_prefix)
+        log.info("Finishing tarball of output")
+        tarball = archive.close()
+        if tarball is None:
+            log.error("Tarball {0} was not generated. Module(s) run collected no info?".format(tarname))
+        else:
+            journal.close(remove=True)
+
+    log.debug("Output buffers: {0:.1f} MB queued at peak.".format(ctx.output_budget.peak / 1048576.0))
+    if governor.enabled:
+        log.debug("Resource governor: {0:.1f} MB read, threads paused for {1:.2f}s in total.".format(governor.bytes_read / 1048576.0, governor.paused))
 
     # Get program end time.
     endTime = datetime.utcnow()
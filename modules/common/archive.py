@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+
+'''
+
+@ purpose:
+
+Packaging of AutoMacTC output files into the tarball of the run.
+
+The tarball is written as a single compressed stream that stays open for
+the whole run. Output files are handed over as soon as the module that
+produced them finishes, and a background thread appends and compresses
+them while the next modules keep running. No uncompressed .tar is ever
+staged on disk.
+
+Compression is done by ParallelGzipWriter, which cuts the tar stream into
+independent blocks and deflates them on a thread pool (zlib releases the
+GIL while compressing). Every block becomes its own gzip member, and a
+concatenation of gzip members is still a valid .gz file for gzip, tar xzf
+and python's gzip module.
+
+Once all outputs of a module have been appended, the archiver can be asked
+to checkpoint: the compressed stream is cut at a member boundary and forced
+to disk, so that an interrupted run can truncate the tarball back to the
+last checkpoint and continue appending from there.
+
+BlockGzipWriter compresses a single output file as BGZF (the blocked gzip
+format of bgzip/samtools): gzip members of at most 64KB uncompressed, each
+recording its compressed size. Its index maps every block to its offsets
+in the compressed and the uncompressed stream, and to the number of
+records before it, so that readers can decompress a slice of an output.
+
+'''
+
+import io
+import logging
+import os
+import shutil
+import struct
+import sys
+import tarfile
+import threading
+import traceback
+import zlib
+from collections import deque
+from multiprocessing import cpu_count
+from multiprocessing.dummy import Pool as ThreadPool
+
+if sys.version_info[0] < 3:
+    import Queue as queue
+else:
+    import queue
+
+log = logging.getLogger('archive')
+
+BLOCK_SIZE = 1048576  # uncompressed bytes per gzip member
+BGZF_BLOCK_SIZE = 65280  # maximum uncompressed bytes per BGZF block
+
+
+def _gzip_member(data, compresslevel):
+    """
+    Compress data into a complete, standalone gzip member.
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _bgzf_block(data, compresslevel):
+    """
+    Compress data into a BGZF block: a gzip member whose extra field holds
+    the size of the member.
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+    cdata = compressor.compress(data) + compressor.flush()
+    header = struct.pack('<4BI2BH2BHH', 0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6, 66, 67, 2, len(cdata) + 25)
+    return header + cdata + struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data))
+
+
+class BlockGzipWriter(io.RawIOBase):
+    """
+    Write-only raw file object that compresses everything written to it as
+    BGZF blocks, cut at the record boundaries marked by the caller whenever
+    possible.
+    """
+
+    def __init__(self, fileobj, index=None, compresslevel=6, block_size=BGZF_BLOCK_SIZE):
+        """
+        Args:
+            fileobj - binary file object receiving the compressed stream
+            index - text file object receiving the block index, or None
+            compresslevel - zlib compression level, 1 (fastest) to 9 (smallest)
+            block_size - maximum uncompressed bytes per block
+        """
+        if compresslevel < 1 or compresslevel > 9:
+            raise ValueError("BlockGzipWriter - compresslevel must be 1-9: Got value '{0}'".format(compresslevel))
+        io.RawIOBase.__init__(self)
+        self.fileobj = fileobj
+        self.index = index
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self.__buffer = bytearray()
+        self.__start = 0  # uncompressed offset of the buffer
+        self.__start_record = None  # records before the buffer, None if it starts within a record
+        self.__marks = deque()  # (uncompressed offset, records) of boundaries in the buffer
+        self.__records = 0
+        if self.index is not None:
+            self.index.write(u'record,offset,block_offset\n')
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        """
+        Buffer data and compress every full block.
+        """
+        if self.closed:
+            raise ValueError("write to closed BlockGzipWriter")
+        self.__buffer.extend(data)
+        while len(self.__buffer) >= self.block_size:
+            self.__cut()
+        return len(data)
+
+    def mark(self, records):
+        """
+        Mark the current position as the boundary after records records.
+        """
+        offset = self.__start + len(self.__buffer)
+        if offset == self.__start:
+            self.__start_record = records
+        else:
+            self.__marks.append((offset, records))
+        self.__records = records
+
+    def __cut(self):
+        """
+        Compress a block of the buffer, ending at the last marked boundary
+        that fits in it.
+        """
+        end, records = self.__start + min(self.block_size, len(self.__buffer)), None
+        while self.__marks and self.__marks[0][0] <= self.__start + self.block_size:
+            end, records = self.__marks.popleft()
+        self.__emit(end - self.__start)
+        self.__start_record = records
+
+    def __emit(self, size):
+        if self.index is not None:
+            record = u'' if self.__start_record is None else u'{0}'.format(self.__start_record)
+            self.index.write(u'{0},{1},{2}\n'.format(record, self.__start, self.fileobj.tell()))
+        self.fileobj.write(_bgzf_block(bytes(self.__buffer[:size]), self.compresslevel))
+        del self.__buffer[:size]
+        self.__start += size
+
+    def close(self):
+        """
+        Compress the remaining buffer, end the stream with an empty block and
+        close fileobj and index.
+        """
+        if self.closed:
+            return
+        try:
+            while self.__buffer:
+                self.__cut()
+            self.fileobj.write(_bgzf_block(b'', self.compresslevel))
+            self.fileobj.close()
+            if self.index is not None:
+                self.index.close()
+        finally:
+            io.RawIOBase.close(self)
+
+
+class ParallelGzipWriter(object):
+    """
+    Write-only file object that compresses everything written to it as a
+    multi-member gzip stream, compressing blocks in parallel.
+    """
+
+    def __init__(self, fileobj, compresslevel=6, threads=1, block_size=BLOCK_SIZE, governor=None, position=0):
+        """
+        Args:
+            fileobj - binary file object receiving the compressed stream
+            compresslevel - zlib compression level, 1 (fastest) to 9 (smallest)
+            threads - integer number of compression threads, 0 uses all cores
+            block_size - uncompressed bytes per gzip member
+            governor - ResourceGovernor the archived bytes are drawn from
+            position - uncompressed bytes already in fileobj, when appending
+        """
+        if compresslevel < 1 or compresslevel > 9:
+            raise ValueError("ParallelGzipWriter - compresslevel must be 1-9: Got value '{0}'".format(compresslevel))
+        if threads < 1:
+            threads = cpu_count()
+        self.fileobj = fileobj
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self.threads = threads
+        self.governor = governor
+        self.closed = False
+        self.__position = position
+        self.__buffer = []
+        self.__buffered = 0
+        self.__pending = deque()
+        self.__max_pending = threads * 2  # bounds memory held in flight
+        self.__pool = ThreadPool(threads) if threads > 1 else None
+
+    def write(self, data):
+        """
+        Buffer data and submit every full block for compression.
+        """
+        if self.closed:
+            raise ValueError("write to closed ParallelGzipWriter")
+        if self.governor is not None:
+            self.governor.charge_read(len(data))
+        self.__buffer.append(data)
+        self.__buffered += len(data)
+        self.__position += len(data)
+        if self.__buffered >= self.block_size:
+            joined = b''.join(self.__buffer)
+            offset = 0
+            while len(joined) - offset >= self.block_size:
+                self.__submit(joined[offset:offset + self.block_size])
+                offset += self.block_size
+            rest = joined[offset:]
+            self.__buffer = [rest] if rest else []
+            self.__buffered = len(rest)
+        return len(data)
+
+    def tell(self):
+        """
+        Returns the uncompressed position in the stream.
+        """
+        return self.__position
+
+    def flush(self):
+        """
+        Blocks are written out in order as they complete, nothing to do here.
+        """
+        pass
+
+    def sync(self):
+        """
+        Compress the buffered data as a member of its own, write out all
+        pending members and force them to disk.
+        Returns the offset of the end of the compressed stream, from which
+        a later writer can continue the stream.
+        """
+        self.__drain()
+        self.fileobj.flush()
+        os.fsync(self.fileobj.fileno())
+        return self.fileobj.tell()
+
+    def close(self):
+        """
+        Compress the remaining buffer and write out all pending members.
+        The underlying fileobj is left open.
+        """
+        if self.closed:
+            return
+        self.__drain()
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+        self.fileobj.flush()
+        self.closed = True
+
+    def __drain(self):
+        if self.__buffered:
+            self.__submit(b''.join(self.__buffer))
+            self.__buffer = []
+            self.__buffered = 0
+        while self.__pending:
+            self.fileobj.write(self.__pending.popleft().get())
+
+    def __submit(self, block):
+        if self.__pool is None:
+            self.fileobj.write(_gzip_member(block, self.compresslevel))
+            return
+        self.__pending.append(self.__pool.apply_async(_gzip_member, (block, self.compresslevel)))
+        while len(self.__pending) > self.__max_pending:
+            self.fileobj.write(self.__pending.popleft().get())
+
+
+class build_tar:
+    """
+    Establish class to build tarball of AutoMacTC output files on the fly.
+    """
+
+    def __init__(self, name, outputdir, runID='', enabled=True, compresslevel=6, threads=0, governor=None, resume=None):
+        """
+        Initialize the build_tar wrapper.
+        name is a string denoting filename of the tarball (.tar.gz).
+        outputdir is the directory holding the tarball and output files.
+        runID is stripped from the output filenames inside the tarball.
+        enabled is False when the run was invoked with --no_tarball.
+        compresslevel, threads and governor are passed to the ParallelGzipWriter.
+        resume is the (offset, tar_offset) of the last checkpoint of an
+        interrupted run, to continue its tarball rather than starting over.
+        """
+        self.name = name
+        self.outputdir = outputdir
+        self.runID = runID
+        self.enabled = enabled
+        self.compresslevel = compresslevel
+        self.threads = threads
+        self.governor = governor
+        self.resume = resume
+        self.path = os.path.join(outputdir, name)
+        self.count = 0
+        self.__queue = queue.Queue()
+        self.__queued = set()
+        self.__tar = None
+        self.__gzip = None
+        self.__fileobj = None
+        self.__thread = None
+        self.__mux = threading.Lock()
+
+    def add_file(self, fname):
+        """
+        Queue the filepath specified by fname to be added to the tarball.
+        fname is a valid filepath to an AutoMacTC output file, relative to
+        outputdir. The file is removed once it has been archived.
+        """
+        self.add_files([fname])
+
+    def add_files(self, fnames, checkpoint=None):
+        """
+        Queue the filepaths in fnames to be added to the tarball, without
+        files queued by other threads in between.
+        checkpoint is called as checkpoint(offset, tar_offset) from the
+        archive thread once the files are durably in the tarball, offset
+        being the compressed and tar_offset the uncompressed size of the
+        tarball up to and including them.
+        """
+        if not self.enabled:
+            return
+        with self.__mux:
+            fnames = [f for f in fnames if f not in self.__queued]
+            self.__queued.update(fnames)
+            if not fnames and checkpoint is None:
+                return
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__writer, name='archive')
+                self.__thread.daemon = True
+                self.__thread.start()
+        self.__queue.put((fnames, checkpoint))
+
+    def close(self):
+        """
+        Wait for all queued files to be archived and finish the compressed
+        stream.
+        Returns the filepath of the tarball, or None if nothing was archived.
+        """
+        if self.__thread is None:
+            return None
+        self.__queue.put(None)
+        self.__thread.join()
+        self.__thread = None
+        if self.__tar is None:
+            return None
+        return self.path
+
+    def _open_stream(self, fileobj, position=0):
+        """
+        Open the tar stream on top of a ParallelGzipWriter wrapping fileobj.
+        position is the size of the tar stream already in fileobj.
+        """
+        self.__gzip = ParallelGzipWriter(fileobj, self.compresslevel, self.threads, governor=self.governor, position=position)
+        return tarfile.open(fileobj=self.__gzip, mode='w')
+
+    def __open(self):
+        if self.resume is not None and self.resume[0] > 0 and os.path.exists(self.path):
+            offset, tar_offset = self.resume
+            log.debug("Continuing {0} from offset {1}.".format(self.path, offset))
+            self.__fileobj = open(self.path, 'r+b')
+            self.__fileobj.truncate(offset)
+            self.__fileobj.seek(offset)
+            self.__tar = self._open_stream(self.__fileobj, tar_offset)
+        else:
+            self.__fileobj = open(self.path, 'wb')
+            self.__tar = self._open_stream(self.__fileobj)
+
+    def __writer(self):
+        """
+        Background thread appending queued files to the tar stream.
+        """
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                break
+            fnames, checkpoint = item
+            for fname in fnames:
+                try:
+                    self.__add(fname)
+                except Exception:
+                    log.error("Could not add {0} to archive: {1}".format(fname, [traceback.format_exc()]))
+            if checkpoint is not None:
+                try:
+                    self.__checkpoint(checkpoint)
+                except Exception:
+                    log.error("Could not checkpoint archive {0}: {1}".format(self.path, [traceback.format_exc()]))
+
+        if self.__tar is not None:
+            try:
+                self.__tar.close()
+                self.__gzip.close()
+                self.__fileobj.close()
+            except Exception:
+                log.error("Could not finish archive {0}: {1}".format(self.path, [traceback.format_exc()]))
+
+    def __add(self, fname):
+        t_fname = os.path.join(self.outputdir, fname)
+        if not os.path.exists(t_fname):
+            log.debug("{0} no longer exists, not archiving.".format(t_fname))
+            return
+
+        if self.__tar is None:
+            self.__open()
+
+        self.__tar.add(t_fname, fname.replace(self.runID, ''))
+        self.count += 1
+        try:
+            if not os.path.isdir(t_fname):
+                os.remove(t_fname)
+            else:
+                shutil.rmtree(t_fname)
+        except OSError:
+            log.error("Added to archive, but could not delete {0}.".format(t_fname))
+
+    def __checkpoint(self, checkpoint):
+        if self.__tar is None:
+            if self.resume is None:
+                checkpoint(0, 0)
+            else:
+                checkpoint(*self.resume)
+            return
+        checkpoint(self.__gzip.sync(), self.__gzip.tell())
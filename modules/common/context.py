@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+'''
+
+@ purpose:
+
+The CollectionContext holds everything a module needs to know about the
+current collection run. automactc.py builds one per run and passes it to
+the module(ctx) entry point of every module it runs.
+
+'''
+
+import copy
+import os
+from datetime import datetime
+
+from . import governor as _governor
+from .hashing import FileHasher
+from .journal import NullJournal
+from .output import WRITE_BUFFER_SIZE, OutputBudget, OutputManifest, data_writer
+
+
+class CollectionContext(object):
+    """
+    Paths, flags and shared objects of a single AutoMacTC collection run.
+    """
+
+    def __init__(self, inputdir='/', inputsysdir='', outputdir='./',
+                 forensic_mode=False, no_tarball=False, output_format='csv',
+                 quiet=False, rtr=False, verbose=False, debug=False,
+                 startTime=None, full_prefix='', filename_prefix='',
+                 serial='SERROR', OSVersion=None, runID='', archive=None,
+                 manifest=None, governor=None, journal=None, output_budget=None,
+                 output_database=None, compress_outputs=False, shard_rows=0, shard_size=0,
+                 dirlist_include_dirs=None, dirlist_exclude_dirs=None,
+                 hash_alg='sha256', hash_size_limit=10485760, hash_cache=None,
+                 no_code_signatures=False, recurse_bundles=False,
+                 dirlist_no_multithreading=False, dirlist_min_workers=1, dirlist_max_workers=0):
+        """
+        Initialize the CollectionContext.
+        hash_size_limit is in bytes.
+        hash_alg is a string or list of strings, stored as a lowercase list.
+        archive is the build_tar object output files are packaged into.
+        manifest is the OutputManifest every output file is registered in.
+        governor is the ResourceGovernor of the run, heavy reads draw from it.
+        journal is the RunJournal of the run, used to resume it if interrupted.
+        output_budget is the OutputBudget bounding the rows queued by all
+        data_writers of the run.
+        output_database is the OutputDatabase of a run with -fmt sqlite.
+        hasher is the FileHasher for hash_alg and hash_size_limit, shared by
+        the modules that hash files. It looks up digests in hash_cache, the
+        HashCache of earlier runs, if given.
+        compress_outputs writes csv and json outputs as BGZF (-zo).
+        dirlist_min_workers and dirlist_max_workers bound the number of
+        dirlist parse threads, which is tuned in between. 0 caps it at the
+        number of CPU cores.
+        shard_rows and shard_size (in bytes) rotate csv and json outputs to a
+        new shard once reached, 0 for no limit.
+        """
+        self.inputdir = inputdir
+        self.inputsysdir = inputsysdir
+        self.outputdir = outputdir
+        self.forensic_mode = forensic_mode
+        self.no_tarball = no_tarball
+        self.output_format = output_format
+        self.quiet = quiet
+        self.rtr = rtr
+        self.verbose = verbose
+        self.debug = debug
+        self.startTime = startTime if startTime is not None else datetime.utcnow()
+        self.full_prefix = full_prefix
+        self.filename_prefix = filename_prefix
+        self.serial = serial
+        self.OSVersion = OSVersion
+        self.runID = runID
+        self.archive = archive
+        self.manifest = manifest if manifest is not None else OutputManifest(runID)
+        self.governor = governor if governor is not None else _governor.current()
+        self.journal = journal if journal is not None else NullJournal()
+        self.output_budget = output_budget if output_budget is not None else OutputBudget()
+        self.output_database = output_database
+        self.compress_outputs = compress_outputs
+        self.shard_rows = shard_rows
+        self.shard_size = shard_size
+        self.module = 'automactc'
+
+        self.dirlist_include_dirs = list(dirlist_include_dirs or [''])
+        self.dirlist_exclude_dirs = list(dirlist_exclude_dirs or [''])
+        if isinstance(hash_alg, list):
+            self.hash_alg = [i.lower() for i in hash_alg]
+        else:
+            self.hash_alg = [hash_alg.lower()]
+        self.hash_size_limit = hash_size_limit
+        self.hasher = FileHasher(self.hash_alg, hash_size_limit, self.governor, cache=hash_cache)
+        self.no_code_signatures = no_code_signatures
+        self.recurse_bundles = recurse_bundles
+        self.dirlist_no_multithreading = dirlist_no_multithreading
+        self.dirlist_min_workers = dirlist_min_workers
+        self.dirlist_max_workers = dirlist_max_workers
+
+    def for_module(self, module):
+        """Return a copy of the context for running module. Outputs created
+        through the copy are registered under that module in the manifest.
+        """
+        mod_ctx = copy.copy(self)
+        mod_ctx.module = module
+        return mod_ctx
+
+    def register_file(self, path, writer='', datatype='file'):
+        """Register a raw output file not produced by a data_writer, so that
+        it is archived along with the outputs of the current module.
+        path is absolute or relative to outputdir.
+        """
+        return self.manifest.register(os.path.join(self.outputdir, path), self.module, writer, datatype)
+
+    def data_writer(self, name, headers, datatype=None, resume=False, buffer_size=WRITE_BUFFER_SIZE,
+                    async_write=False, compress=None):
+        """Return a data_writer for this run.
+        name is the output name of the writer, usually the module name.
+        headers is the list of output columns or a Schema, or None for a
+        wrapper only.
+        datatype defaults to the output format of the run.
+        resume continues the output from its last checkpoint in the journal.
+        buffer_size is the number of bytes buffered per open output file.
+        async_write writes full buffers from a background thread.
+        compress writes BGZF outputs, defaults to compress_outputs.
+        """
+        return data_writer(self, name, headers, datatype, resume, buffer_size, async_write, compress)
@@ -13,11 +13,11 @@ import glob
 import io
 import logging
 import os
-import shutil
 import signal
 import sqlite3
 import subprocess
 import sys
+import threading
 import time
 import traceback
 from collections import OrderedDict
@@ -28,11 +28,19 @@ from pwd import getpwuid
 from stat import *
 
 from . import ccl_bplist as bplist
+from . import governor
 from .codesign import CodeSignChecker
 from .dateutil import parser
 
+if sys.version_info[0] < 3:
+	import Queue as queue
+else:
+	import queue
+
 log = logging.getLogger('functions')
 
+_owner_names = {}  # uid to user name, or None if the uid is unknown
+
 
 # Borrowed from https://stackoverflow.com/questions/2281850/timeout-function-if-it-takes-too-long-to-finish
 class TimeoutError(Exception):
@@ -164,7 +172,7 @@ class SQLiteDB(object):
 				# copy to temp location
 				curr_db_filepath = self._db_filepath
 				temp_db_filepath = os.path.join(outputdir, str(os.path.basename(db_filepath)) + '-tmp_amtc')
-				shutil.copyfile(curr_db_filepath, temp_db_filepath)  # blocking
+				governor.current().copyfile(curr_db_filepath, temp_db_filepath)  # blocking
 
 				# open in temp location
 				try:
@@ -195,7 +203,7 @@ class SQLiteDB(object):
 				# copy to temp location
 				curr_db_filepath = self._db_filepath
 				temp_db_filepath = os.path.join(outputdir, str(os.path.basename(db_filepath)) + '-tmp_amtc')
-				shutil.copyfile(curr_db_filepath, temp_db_filepath)  # blocking
+				governor.current().copyfile(curr_db_filepath, temp_db_filepath)  # blocking
 
 				# open in temp location
 				try:
@@ -330,7 +338,7 @@ def query_db(db_file, query, outputdir):
 
 		# clone to temp location
 		db_tmp = os.path.join(outputdir, str(os.path.basename(db_file)) + '-tmp_amtc')
-		shutil.copyfile(db_file, db_tmp)
+		governor.current().copyfile(db_file, db_tmp)
 		time.sleep(3)
 		try:
 			conn = sqlite3.connect(db_tmp)
@@ -471,6 +479,20 @@ def read_stream_bplist(string):
 	return plist_array
 
 
+def _owner_name(uid):
+	"""Get the user name of uid. The user database is queried once per uid.
+	"""
+	if uid not in _owner_names:
+		try:
+			_owner_names[uid] = getpwuid(uid).pw_name
+		except KeyError:
+			_owner_names[uid] = None
+	name = _owner_names[uid]
+	if name is None:
+		raise KeyError('getpwuid(): uid not found: {0}'.format(uid))
+	return name
+
+
 def stats2(file, oMACB=False, stat=None):
 	"""Get file metadata.
 	"""
@@ -503,7 +525,7 @@ def stats2(file, oMACB=False, stat=None):
 			statrecord['gid'] = "ERROR"
 
 		try:
-			statrecord['owner'] = getpwuid(stat.st_uid).pw_name
+			statrecord['owner'] = _owner_name(stat.st_uid)
 		except Exception:
 			log.debug("Failed to get file owner info: {0}: {1}".format(file, [traceback.format_exc()]))
 			statrecord['owner'] = "ERROR"
@@ -601,3 +623,108 @@ class MultiprocessingPool():
 		except Exception as e:
 			log.error("Unhandled Exception in worker: {0} - {1}".format(str(e), [traceback.format_exc()]))
 		return
+
+
+class WorkerQueue():
+	"""
+	Bounded queue of work items drained by worker threads while the producer
+	keeps adding to it
+	"""
+	__STOP = object()
+
+	def __init__(self, func, workers, maxsize):
+		"""
+		Args:
+			func - method to run, called with the arguments of each put
+			workers - integer number of threads, 0 to run func in the calling thread
+			maxsize - number of items queued before put blocks
+		"""
+		if workers < 0:
+			raise ValueError("WorkerQueue - Workers must be >= 0: Got value '{0}'".format(workers))
+		self.__func = func
+		self.__queue = queue.Queue(maxsize)
+		self.__threads = []
+		self.__active = 0  # threads beyond this number wait before taking the next item
+		self.__gate = threading.Condition()
+		self.resize(workers)
+
+	@property
+	def workers(self):
+		"""Number of threads draining the queue
+		"""
+		return self.__active
+
+	def resize(self, workers):
+		"""Change the number of threads draining the queue. Threads beyond workers finish
+		their current item, or put back the item they were waiting for, and wait until the
+		queue is resized again. A queue started with 0 workers keeps running func in the
+		calling thread.
+		"""
+		if workers < 1:
+			return
+		with self.__gate:
+			for i in range(len(self.__threads), workers):
+				thread = threading.Thread(target=self.__work, args=(i,), name='worker-{0}'.format(i))
+				thread.daemon = True
+				thread.start()
+				self.__threads.append(thread)
+			self.__active = workers
+			self.__gate.notify_all()
+
+	def queued(self):
+		"""Approximate number of items waiting in the queue
+		"""
+		return self.__queue.qsize()
+
+	def put(self, *args):
+		"""Queue a call of func with args, blocking while the queue is full
+		"""
+		if self.__threads:
+			self.__queue.put(args)
+		else:
+			self.__run_func(args)
+
+	def join(self):
+		"""Block until every item queued so far has been processed
+		"""
+		self.__queue.join()
+
+	def close(self):
+		"""Process the remaining items and stop the workers
+		"""
+		self.resize(len(self.__threads))  # wake the waiting threads to stop them
+		for thread in self.__threads:
+			self.__queue.put(self.__STOP)
+		for thread in self.__threads:
+			thread.join()
+		self.__threads = []
+		self.__active = 0
+
+	def __work(self, index):
+		"""Worker thread loop, runs queued items until stopped
+		"""
+		while True:
+			with self.__gate:
+				while index >= self.__active:
+					self.__gate.wait()
+			args = self.__queue.get()
+			try:
+				if args is self.__STOP:
+					return
+				if index >= self.__active:  # resized while waiting for the item, leave it to the active threads
+					self.__queue.put(args)
+					continue
+				self.__run_func(args)
+			finally:
+				self.__queue.task_done()
+
+	def __run_func(self, args):
+		"""Wrapper for worker functions
+
+		Args:
+			args - tuple of arguments to pass into function
+		"""
+		try:
+			self.__func(*args)
+		except Exception as e:
+			log.error("Unhandled Exception in worker: {0} - {1}".format(str(e), [traceback.format_exc()]))
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+
+'''
+
+@ purpose:
+
+Resource governor shared by all modules and worker threads of a run, to
+put a predictable ceiling on the impact of a collection on the endpoint.
+
+The governor enforces:
+    read_rate   - a token bucket of bytes read per second
+    cpu_share   - a target share of one CPU core used by the process
+and, when one of them is set, backs off further on its own (multiplicative
+decrease, additive recovery) while the load average per core exceeds
+load_limit, or while the latency of governed reads rises well above its
+recent average. Without a limit, the governor does not slow down the run:
+the load of a busy host, or of the collection's own threads, must not
+throttle a default run.
+
+Work drawing from the budget reads through iter_read() or copyfile(), or
+calls charge_read() and checkpoint() itself. Threads that exceed the
+budget are put to sleep at their next checkpoint.
+
+automactc.py installs a single governor per run, available to modules as
+ctx.governor and to common helpers via current().
+
+'''
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import resource
+import shutil
+import sys
+import time
+from multiprocessing import cpu_count
+from threading import Lock
+
+log = logging.getLogger('governor')
+
+# Seconds between two evaluations of the CPU share and the backoff factor.
+INTERVAL = 0.1
+ADAPT_INTERVAL = 1.0
+MIN_FACTOR = 0.05
+
+# setiopolicy_np(3) on macOS, to throttle disk I/O of the whole process.
+IOPOL_TYPE_DISK = 0
+IOPOL_SCOPE_PROCESS = 0
+IOPOL_THROTTLE = 3
+
+
+def _cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class ResourceGovernor(object):
+    """
+    Token bucket for read bytes plus a CPU share target, with automatic
+    backoff. A disabled governor does not limit anything.
+    """
+
+    def __init__(self, enabled=True, read_rate=0, cpu_share=0, load_limit=1.0, backoff=None):
+        """
+        Args:
+            enabled - False disables all limits and the backoff
+            read_rate - bytes per second, 0 for no limit
+            cpu_share - share of one CPU core, e.g. 0.5, 0 for no limit
+            load_limit - load average per CPU core above which to back off
+            backoff - back off under load or slow reads, defaults to only
+                      when read_rate or cpu_share is set
+        """
+        if read_rate < 0:
+            raise ValueError("ResourceGovernor - read_rate must be >= 0: Got value '{0}'".format(read_rate))
+        if cpu_share < 0:
+            raise ValueError("ResourceGovernor - cpu_share must be >= 0: Got value '{0}'".format(cpu_share))
+        self.enabled = enabled
+        self.read_rate = read_rate
+        self.cpu_share = cpu_share
+        self.load_limit = load_limit
+        self.backoff = bool(read_rate or cpu_share) if backoff is None else backoff
+        self.factor = 1.0
+        self.paused = 0.0
+        self.bytes_read = 0
+        self.__mux = Lock()
+        self.__tokens = float(read_rate)
+        self.__refilled = time.time()
+        self.__window_start = time.time()
+        self.__window_cpu = _cpu_time()
+        self.__pause_until = 0.0
+        self.__adapted = time.time()
+        self.__latency_fast = None
+        self.__latency_slow = None
+        self.__ncpu = cpu_count()
+
+    def apply_priority(self):
+        """
+        Lower the CPU priority of the process, and on macOS its disk I/O
+        priority as well.
+        """
+        if not self.enabled:
+            return
+        os.nice(19)
+        if sys.platform == 'darwin':
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+                if libc.setiopolicy_np(IOPOL_TYPE_DISK, IOPOL_SCOPE_PROCESS, IOPOL_THROTTLE) != 0:
+                    log.debug("Could not set I/O policy: errno {0}".format(ctypes.get_errno()))
+            except (OSError, AttributeError) as e:
+                log.debug("Could not set I/O policy: {0}".format(str(e)))
+
+    def charge_read(self, nbytes, latency=None):
+        """
+        Draw nbytes from the read budget, sleeping until the token bucket
+        allows it. latency is the time the read took in seconds, if known.
+        """
+        if not self.enabled:
+            return
+        wait = 0.0
+        with self.__mux:
+            self.bytes_read += nbytes
+            if latency is not None and nbytes > 0:
+                self.__observe_latency(latency * 65536.0 / nbytes)
+            if self.read_rate:
+                rate = self.read_rate * self.factor
+                now = time.time()
+                self.__tokens = min(rate, self.__tokens + (now - self.__refilled) * rate)
+                self.__refilled = now
+                self.__tokens -= nbytes
+                if self.__tokens < 0:
+                    wait = -self.__tokens / rate
+        if wait > 0:
+            self.__sleep(wait)
+        self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Pause the calling thread if the process is over its CPU share or
+        the governor is backing off.
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        if now < self.__window_start + INTERVAL and now >= self.__pause_until:
+            return
+        with self.__mux:
+            if now >= self.__window_start + INTERVAL and now >= self.__pause_until:
+                cpu = _cpu_time()
+                used = cpu - self.__window_cpu
+                elapsed = now - self.__window_start
+                if self.backoff and now >= self.__adapted + ADAPT_INTERVAL:
+                    self.__adapt(now)
+                owed = 0.0
+                if self.cpu_share:
+                    owed = used / (self.cpu_share * self.factor) - elapsed
+                elif self.factor < 1.0:
+                    # No explicit share, back off as a duty cycle of the work done.
+                    owed = elapsed * (1.0 / self.factor - 1.0)
+                if owed > 0:
+                    self.__pause_until = now + owed
+                self.__window_start = max(now, self.__pause_until)
+                self.__window_cpu = cpu
+            wait = self.__pause_until - now
+        if wait > 0:
+            self.__sleep(wait)
+
+    def iter_read(self, f, block_size=65536):
+        """
+        Yield the blocks read from the file object f, drawing every block
+        from the read budget.
+        """
+        while True:
+            start = time.time()
+            block = f.read(block_size)
+            if not block:
+                return
+            self.charge_read(len(block), time.time() - start)
+            yield block
+
+    def copyfile(self, src, dst, block_size=1048576):
+        """
+        shutil.copyfile drawing from the read budget.
+        """
+        if not self.enabled:
+            return shutil.copyfile(src, dst)
+        with open(src, 'rb') as fsrc:
+            with open(dst, 'wb') as fdst:
+                for block in self.iter_read(fsrc, block_size):
+                    fdst.write(block)
+        return dst
+
+    def __sleep(self, seconds):
+        with self.__mux:
+            self.paused += seconds
+        time.sleep(seconds)
+
+    def __observe_latency(self, latency):
+        """
+        Track a fast and a slow moving average of the read latency, scaled
+        to a 64k block. Called with the lock held.
+        """
+        if self.__latency_fast is None:
+            self.__latency_fast = self.__latency_slow = latency
+            return
+        self.__latency_fast += 0.3 * (latency - self.__latency_fast)
+        self.__latency_slow += 0.01 * (latency - self.__latency_slow)
+
+    def __adapt(self, now):
+        """
+        Back off while the system is loaded or reads slow down, recover
+        otherwise. Called with the lock held.
+        """
+        self.__adapted = now
+        reasons = []
+        try:
+            load = os.getloadavg()[0] / self.__ncpu
+            if load > self.load_limit:
+                reasons.append('load {0:.2f} per core'.format(load))
+        except OSError:
+            pass
+        if self.__latency_fast is not None and self.__latency_fast > 0.002 and self.__latency_fast > 4 * self.__latency_slow:
+            reasons.append('read latency {0:.1f}ms'.format(self.__latency_fast * 1000))
+
+        if reasons:
+            factor = max(MIN_FACTOR, self.factor * 0.5)
+            if factor != self.factor:
+                log.debug("Backing off to {0:.0%} ({1}).".format(factor, ', '.join(reasons)))
+            self.factor = factor
+        elif self.factor < 1.0:
+            self.factor = min(1.0, self.factor + 0.1)
+
+
+_current = ResourceGovernor(enabled=False)
+
+
+def install(governor):
+    """Make governor the governor of the run, returned by current().
+    """
+    global _current
+    _current = governor
+    return governor
+
+
+def current():
+    """Returns the governor of the run, a disabled one if none was installed.
+    """
+    return _current
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+'''
+
+@ purpose:
+
+File hashing engine shared by the modules that hash files on disk
+(dirlist, autoruns). Each file is read once, through the resource governor,
+and every requested digest is fed from the same read loop, so hashing with
+-H sha256 md5 reads a file from disk once instead of once per algorithm.
+
+Algorithms are registered by name in ALGORITHMS. sha256, md5 and sha1 are
+always available, blake2b where hashlib provides it (python 3.6+).
+
+Digests are looked up by inode identity (st_dev, st_ino, size, mtime and
+ctime in ns) before a file is read:
+    - within a run, files with several hardlinks are hashed once per inode
+    - across runs, a HashCache (-HC) keeps the digests of the files hashed
+      before in an SQLite database, so unchanged files are not read again
+Only regular files are looked up. Entries older than MAX_AGE days are
+removed from the cache when it is closed, so every file is read again from
+time to time.
+
+'''
+
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import traceback
+from collections import OrderedDict
+from stat import S_ISREG
+from threading import Lock
+
+from . import governor as _governor
+
+log = logging.getLogger('hashing')
+
+BLOCK_SIZE = 65536
+COMMIT_ENTRIES = 10000  # digests inserted per transaction of the hash cache
+MAX_AGE = 90  # days after which cached digests are hashed again
+
+# name to hashlib constructor of every supported algorithm
+ALGORITHMS = OrderedDict([
+    ('sha256', hashlib.sha256),
+    ('md5', hashlib.md5),
+    ('sha1', hashlib.sha1),
+])
+if hasattr(hashlib, 'blake2b'):
+    ALGORITHMS['blake2b'] = hashlib.blake2b
+
+
+def register_algorithm(name, constructor):
+    """Make the algorithm available to file hashers under name.
+    constructor returns a new hash object with update() and hexdigest().
+    """
+    ALGORITHMS[name.lower()] = constructor
+
+
+class HashResult(object):
+    """
+    Digests of a single file, by algorithm name. A digest is '' if the file
+    was not hashed (size out of bounds, not a regular file, algorithm not
+    requested) and 'ERROR' if reading the file failed.
+    """
+
+    __slots__ = ('digests', 'size')
+
+    def __init__(self, algorithms, size=0, value=''):
+        self.digests = OrderedDict((name, value) for name in algorithms)
+        self.size = size
+
+    def __getitem__(self, name):
+        return self.digests.get(name, '')
+
+    def get(self, name, default=''):
+        return self.digests.get(name, default)
+
+    def __repr__(self):
+        return 'HashResult({0})'.format(dict(self.digests))
+
+
+def _signed(value):
+    """st_dev and st_ino are unsigned 64 bit, SQLite integers are signed.
+    """
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def inode_key(stat):
+    """Returns the identity of the contents of a file from its stat result,
+    (st_dev, st_ino, size, mtime_ns, ctime_ns).
+    """
+    mtime_ns = getattr(stat, 'st_mtime_ns', None)
+    if mtime_ns is None:  # python 2
+        mtime_ns = int(stat.st_mtime * 1000000000)
+        ctime_ns = int(stat.st_ctime * 1000000000)
+    else:
+        ctime_ns = stat.st_ctime_ns
+    return (_signed(stat.st_dev), _signed(stat.st_ino), stat.st_size, mtime_ns, ctime_ns)
+
+
+class HashCache(object):
+    """
+    Digests of the files hashed by earlier runs, by inode_key, kept in an
+    SQLite database. Lookups and inserts are serialized on one connection.
+    """
+
+    def __init__(self, path, max_age=MAX_AGE):
+        """
+        Args:
+            path - path of the database, created if needed
+            max_age - days after which entries are removed on close
+        """
+        self.path = path
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.__pending = 0  # entries inserted in the current transaction
+        self.__mux = Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.__conn.execute('PRAGMA synchronous=NORMAL')
+        self.__conn.execute('CREATE TABLE IF NOT EXISTS hashes ('
+                            'dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, ctime_ns INTEGER, '
+                            'alg TEXT, digest TEXT, added INTEGER, '
+                            'PRIMARY KEY (dev, ino, size, mtime_ns, ctime_ns, alg)) WITHOUT ROWID')
+        self.__conn.execute('BEGIN')
+
+    def get(self, key, algorithms):
+        """Returns the cached digests of key by algorithm, or None unless
+        every algorithm is cached.
+        """
+        with self.__mux:
+            if self.__conn is None:
+                return None
+            rows = self.__conn.execute(
+                'SELECT alg, digest FROM hashes WHERE dev=? AND ino=? AND size=? AND mtime_ns=? AND ctime_ns=?',
+                key).fetchall()
+            digests = dict(rows)
+            if all(name in digests for name in algorithms):
+                self.hits += 1
+                return digests
+            self.misses += 1
+            return None
+
+    def put(self, key, digests):
+        """Cache the digests (algorithm: hex digest) of key.
+        """
+        added = int(time.time())
+        with self.__mux:
+            if self.__conn is None:
+                return
+            self.__conn.executemany(
+                'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [key + (name, digest, added) for name, digest in digests.items()])
+            self.__pending += 1
+            if self.__pending >= COMMIT_ENTRIES:
+                self.__conn.execute('COMMIT')
+                self.__conn.execute('BEGIN')
+                self.__pending = 0
+
+    def close(self):
+        """Commit, remove the entries older than max_age and close the cache.
+        """
+        with self.__mux:
+            if self.__conn is None:
+                return
+            conn, self.__conn = self.__conn, None
+            try:
+                if self.max_age > 0:
+                    conn.execute('DELETE FROM hashes WHERE added < ?', (int(time.time()) - self.max_age * 86400,))
+                conn.execute('COMMIT')
+            finally:
+                conn.close()
+
+
+def open_cache(cachedir):
+    """Returns the HashCache in cachedir, creating the directory if needed,
+    or None if it cannot be opened.
+    """
+    try:
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        return HashCache(os.path.join(cachedir, 'hashcache.sqlite'))
+    except Exception:
+        log.error("Could not open the hash cache in {0}, files will all be hashed: {1}".format(cachedir, [traceback.format_exc()]))
+        return None
+
+
+class FileHasher(object):
+    """
+    Hashes files with a fixed set of algorithms in a single read per file,
+    looking up their digests by inode first. Instances are shared by worker
+    threads.
+    """
+
+    def __init__(self, algorithms, size_limit, governor=None, block_size=BLOCK_SIZE, cache=None):
+        """
+        Args:
+            algorithms - list of algorithm names, e.g. ctx.hash_alg. 'none'
+                         disables hashing, names not in ALGORITHMS are ignored.
+            size_limit - files larger than this, in bytes, are not hashed
+            governor - ResourceGovernor the reads draw from, defaults to the
+                       governor of the run
+            block_size - bytes read per block
+            cache - HashCache of the digests of earlier runs, or None
+        """
+        algorithms = [name.lower() for name in algorithms]
+        if 'none' in algorithms:
+            algorithms = []
+        unknown = [name for name in algorithms if name not in ALGORITHMS]
+        if unknown:
+            log.warning("Unsupported hash algorithms will not be computed: {0}".format(', '.join(unknown)))
+        self.algorithms = [name for name in algorithms if name in ALGORITHMS]
+        self.size_limit = size_limit
+        self.governor = governor if governor is not None else _governor.current()
+        self.block_size = block_size
+        self.cache = cache
+        self.bytes_read = 0  # bytes of the files read and hashed by this run
+        self.__links = {}  # inode_key: HashResult of the hardlinked files hashed by this run
+        self.__mux = Lock()
+
+    def __bool__(self):
+        return len(self.algorithms) > 0
+
+    __nonzero__ = __bool__
+
+    def hash(self, path, stat=None):
+        """Returns the HashResult of the file at path.
+        stat is the lstat result of path if the caller has it already.
+        Only files with 0 < size <= size_limit are read.
+        """
+        if not self.algorithms:
+            return HashResult(())
+        if stat is None:
+            try:
+                stat = os.lstat(path)
+            except OSError:
+                return HashResult(self.algorithms)
+        size = stat.st_size
+        if size <= 0 or size > self.size_limit:
+            return HashResult(self.algorithms, size)
+        if not S_ISREG(stat.st_mode):  # e.g. autoruns programs behind a symlink, the key is the link's
+            return self._read(path, size)
+
+        key = inode_key(stat)
+        hardlinked = stat.st_nlink > 1
+        if hardlinked:
+            with self.__mux:
+                result = self.__links.get(key)
+            if result is not None:
+                return result
+        if self.cache is not None:
+            digests = self.cache.get(key, self.algorithms)
+            if digests is not None:
+                result = HashResult((), size)
+                for name in self.algorithms:
+                    result.digests[name] = digests[name]
+                return result
+
+        result = self._read(path, size)
+        if result[self.algorithms[0]] != 'ERROR':
+            if hardlinked:
+                with self.__mux:
+                    self.__links[key] = result
+            if self.cache is not None:
+                self.cache.put(key, result.digests)
+        return result
+
+    def close(self):
+        """Close the hash cache, keeping the digests of this run.
+        """
+        if self.cache is not None:
+            log.debug("Hash cache: {0} files found, {1} files hashed.".format(self.cache.hits, self.cache.misses))
+            self.cache.close()
+
+    def _read(self, path, size):
+        """Feed every algorithm from a single read of the file at path.
+        """
+        hashes = [(name, ALGORITHMS[name]()) for name in self.algorithms]
+        updates = [h.update for _, h in hashes]
+        try:
+            with open(path, 'rb') as f:
+                for block in self.governor.iter_read(f, self.block_size):
+                    for update in updates:
+                        update(block)
+        except Exception:
+            log.debug("Could not hash {0}: {1}".format(path, [traceback.format_exc()]))
+            return HashResult(self.algorithms, size, 'ERROR')
+        with self.__mux:
+            self.bytes_read += size
+        result = HashResult((), size)
+        for name, h in hashes:
+            result.digests[name] = h.hexdigest()
+        return result
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+'''
+
+@ purpose:
+
+Append-only journal of a collection run, used to resume an interrupted
+run with --resume <runID>.
+
+The journal is a JSON lines file in outputdir. Every event is flushed as
+soon as it is recorded:
+    start       - the identity of the run (runID, prefixes, start time)
+    checkpoint  - a data_writer flush, with the offset and rows of each of
+                  its files and any state of the module (e.g. the
+                  directories dirlist fully processed)
+    module      - a module whose outputs are durably in the tarball, with
+                  its manifest entries and metrics, and the tarball offsets
+                  to truncate to when resuming
+
+A truncated last line (the run was killed while writing it) is ignored.
+The journal is removed once the tarball of the run has been finished.
+
+'''
+
+import glob
+import io
+import json
+import logging
+import os
+import sys
+from collections import OrderedDict
+from threading import Lock
+
+log = logging.getLogger('journal')
+
+
+def find_journal(outputdir, runID):
+    """Returns the path of the journal of runID in outputdir, or None.
+    runID is given with or without its leading '-'.
+    """
+    matches = glob.glob(os.path.join(outputdir, '*,journal-' + runID.lstrip('-') + '.jsonl'))
+    return matches[0] if matches else None
+
+
+class RunJournal(object):
+    """
+    Append-only journal of a run, and the state loaded from it on resume.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+        self.__mux = Lock()
+        partial = False
+        if os.path.exists(path):
+            partial = self.__load()
+        self.__file = io.open(path, 'a', encoding='utf-8')
+        if partial:
+            self.__file.write(u'\n')
+
+    def __load(self):
+        """Load the events of an earlier attempt. Returns True if the last
+        line was cut off.
+        """
+        line = u'\n'
+        with io.open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self.events.append(json.loads(line))
+                except ValueError:
+                    log.debug("Ignoring incomplete journal line: {0}".format(line.rstrip()))
+        return not line.endswith(u'\n')
+
+    def record(self, event, sync=False, **fields):
+        """Append an event to the journal. sync forces it to disk.
+        """
+        entry = OrderedDict([('event', event)])
+        entry.update(fields)
+        data = json.dumps(entry) + '\n'
+        if sys.version_info[0] < 3:
+            data = unicode(data)
+        with self.__mux:
+            self.__file.write(data)
+            self.__file.flush()
+            if sync:
+                os.fsync(self.__file.fileno())
+
+    def close(self, remove=False):
+        with self.__mux:
+            self.__file.close()
+        if remove:
+            os.remove(self.path)
+
+    def start(self):
+        """Returns the start event of the run, or None.
+        """
+        for e in self.events:
+            if e['event'] == 'start':
+                return e
+        return None
+
+    def completed_modules(self):
+        """Returns the modules that completed in earlier attempts, in order.
+        """
+        return [e['module'] for e in self.events if e['event'] == 'module']
+
+    def last_module(self):
+        """Returns the last module event, holding the tarball offsets, or None.
+        """
+        modules = [e for e in self.events if e['event'] == 'module']
+        return modules[-1] if modules else None
+
+    def checkpoints(self, filename):
+        """Returns the checkpoint events of the output file filename.
+        """
+        return [e for e in self.events if e['event'] == 'checkpoint' and filename in e['files']]
+
+
+class NullJournal(object):
+    """
+    Journal of a run that cannot be resumed. Records nothing.
+    """
+
+    path = None
+    events = []
+
+    def record(self, event, sync=False, **fields):
+        pass
+
+    def close(self, remove=False):
+        pass
+
+    def start(self):
+        return None
+
+    def completed_modules(self):
+        return []
+
+    def last_module(self):
+        return None
+
+    def checkpoints(self, filename):
+        return []
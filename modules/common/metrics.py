@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+'''
+
+@ purpose:
+
+Per-module performance metrics of an AutoMacTC run. automactc.py measures
+every module it runs and writes the results as the metrics output of the
+run, which is archived with the other outputs.
+
+CPU time, peak RSS and files opened are sampled process-wide at the start
+and end of each module (resource.getrusage only reports the whole process
+and its children portably). They are exact when modules run one after the
+other; with -b they include the work of modules running at the same time.
+
+Files opened are counted with an audit hook, which requires python 3.8+.
+On older interpreters the column is left empty. Audit hooks cannot be
+removed, so a single hook is installed with the first MetricsRecorder and
+counts for the most recent one, which also takes over the error counting.
+
+'''
+
+import logging
+import resource
+import sys
+import time
+from datetime import datetime
+from threading import Lock
+
+from .output import Schema
+from .scheduler import module_class
+
+METRICS_HEADERS = [
+    'module', 'class', 'status', 'os_version', 'start_time', 'wall_time',
+    'cpu_user', 'cpu_system', 'peak_rss_delta', 'records', 'bytes',
+    'writer_records', 'files_opened', 'exceptions'
+]
+METRICS_SCHEMA = Schema(METRICS_HEADERS, types={
+    'wall_time': float, 'cpu_user': float, 'cpu_system': float, 'peak_rss_delta': int,
+    'records': int, 'bytes': int, 'files_opened': int, 'exceptions': int
+})
+
+# ru_maxrss is in bytes on macOS and kilobytes on Linux.
+_RSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+
+_active = None  # MetricsRecorder the audit hook and error counter report to
+_hooked = False
+_active_mux = Lock()
+
+
+def _rusage():
+    """Returns (user, system, maxrss) of this process and its reaped children.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (own.ru_utime + children.ru_utime,
+            own.ru_stime + children.ru_stime,
+            own.ru_maxrss * _RSS_SCALE)
+
+
+class _ErrorCounter(logging.Handler):
+    """
+    Logging handler counting the errors logged per logger name. Modules log
+    the exceptions they catch and carry on, so this counts the exceptions a
+    module swallowed.
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self, logging.ERROR)
+        self.counts = {}
+        self.__mux = Lock()
+
+    def emit(self, record):
+        with self.__mux:
+            self.counts[record.name] = self.counts.get(record.name, 0) + 1
+
+    def snapshot(self):
+        with self.__mux:
+            return dict(self.counts)
+
+
+def module_loggers(module):
+    """Returns the names of the loggers module logs to, the Logger objects
+    among the globals of modules.<module> once it is imported. Most modules
+    log to their short name, some to their name and version (users_v111).
+    """
+    mod = sys.modules.get('modules.' + module)
+    if mod is None:
+        return set()
+    return set(v.name for v in vars(mod).values() if isinstance(v, logging.Logger))
+
+
+def _audit(event, args):
+    if event == 'open':
+        recorder = _active
+        if recorder is not None:
+            recorder._opened_file()
+
+
+def _activate(recorder):
+    """Make recorder the one counting files opened and errors logged,
+    installing the audit hook on first use.
+    """
+    global _active, _hooked
+    with _active_mux:
+        root = logging.getLogger('')
+        if _active is not None:
+            root.removeHandler(_active._error_counter)
+        root.addHandler(recorder._error_counter)
+        _active = recorder
+        if not _hooked and hasattr(sys, 'addaudithook'):
+            sys.addaudithook(_audit)
+            _hooked = True
+
+
+class ModuleMetrics(object):
+    """
+    Measurements of a single module run.
+    """
+
+    def __init__(self, module, recorder):
+        self.module = module
+        self.name = module.split('_')[-1]
+        self.cls = module_class(module)
+        self.status = 'running'
+        self.wall_time = 0.0
+        self.cpu_user = 0.0
+        self.cpu_system = 0.0
+        self.peak_rss_delta = 0
+        self.files_opened = None
+        self.exceptions = 0
+        self.__recorder = recorder
+        self.__start = None
+
+    def start(self):
+        self.start_time = datetime.utcnow()
+        self.__errors = self.__recorder.errors()
+        self.__opened = self.__recorder.files_opened()
+        self.__usage = _rusage()
+        self.__start = time.time()
+        return self
+
+    def stop(self, success):
+        self.wall_time = time.time() - self.__start
+        usage = _rusage()
+        self.cpu_user = usage[0] - self.__usage[0]
+        self.cpu_system = usage[1] - self.__usage[1]
+        self.peak_rss_delta = usage[2] - self.__usage[2]
+        opened = self.__recorder.files_opened()
+        if opened is not None:
+            self.files_opened = opened - self.__opened
+        errors = self.__recorder.errors()
+        self.exceptions = sum(errors.get(name, 0) - self.__errors.get(name, 0) for name in module_loggers(self.module))
+        self.status = 'finished' if success else 'failed'
+        return self
+
+    def to_dict(self):
+        return {
+            'status': self.status,
+            'start_time': self.start_time.strftime('%Y-%m-%dT%H:%M:%S.%f'),
+            'wall_time': self.wall_time,
+            'cpu_user': self.cpu_user,
+            'cpu_system': self.cpu_system,
+            'peak_rss_delta': self.peak_rss_delta,
+            'files_opened': self.files_opened,
+            'exceptions': self.exceptions,
+        }
+
+    def restore(self, d):
+        """Take over the measurements of an earlier attempt of the run.
+        """
+        for key, value in d.items():
+            setattr(self, key, value)
+        self.start_time = datetime.strptime(d['start_time'], '%Y-%m-%dT%H:%M:%S.%f')
+        return self
+
+
+class MetricsRecorder(object):
+    """
+    Collects the ModuleMetrics of every module run.
+    """
+
+    def __init__(self):
+        self.modules = []
+        self._error_counter = _ErrorCounter()
+        self.__opened = 0 if hasattr(sys, 'addaudithook') else None
+        self.__mux = Lock()
+        _activate(self)
+
+    def _opened_file(self):
+        with self.__mux:
+            self.__opened += 1
+
+    def errors(self):
+        """Returns the number of errors logged so far, by logger name.
+        """
+        return self._error_counter.snapshot()
+
+    def files_opened(self):
+        """Returns the number of files opened by the process so far, or None
+        if it cannot be counted on this interpreter.
+        """
+        with self.__mux:
+            return self.__opened
+
+    def measure(self, module):
+        """Returns the started ModuleMetrics of module.
+        """
+        metrics = ModuleMetrics(module, self)
+        self.modules.append(metrics)
+        return metrics.start()
+
+    def restore(self, module, d):
+        """Add the metrics of module measured by an earlier attempt of the
+        run, as recorded in its journal.
+        """
+        metrics = ModuleMetrics(module, self).restore(d)
+        self.modules.append(metrics)
+        return metrics
+
+    def write(self, ctx):
+        """Write the metrics of all modules run so far as the metrics output
+        of the run. Records and bytes are taken from the output manifest, so
+        this must be called after the module outputs were archived.
+        """
+        output = ctx.data_writer('metrics', METRICS_SCHEMA)
+        for m in self.modules:
+            entries = ctx.manifest.entries(m.module)
+            writers = []
+            for e in entries:
+                if e.writer not in writers:
+                    writers.append(e.writer)
+            # 'all' registers one entry per format, count each writer's records once.
+            records = dict((e.writer, e.rows) for e in entries)
+            output.write_row((
+                m.name, m.cls, m.status, ctx.OSVersion or '', m.start_time.isoformat() + 'Z',
+                round(m.wall_time, 3), round(m.cpu_user, 3), round(m.cpu_system, 3),
+                m.peak_rss_delta, sum(records.values()), sum(e.bytes for e in entries),
+                ' '.join('{0}={1}'.format(w, records[w]) for w in writers),
+                m.files_opened if m.files_opened is not None else '', m.exceptions
+            ))
+        output.flush_record(final=True)
+        return output
@@ -0,0 +1,1149 @@
+#!/usr/bin/env python
+
+'''
+
+@ purpose:
+
+Output writers used by every module. A data_writer is obtained from the
+CollectionContext of the current run (ctx.data_writer) and handles output
+file format and naming.
+
+Every output file of a run is registered in the OutputManifest of the run,
+which the archiver consumes instead of searching outputdir for files.
+
+The rows queued by all writers of a run are bounded by an OutputBudget.
+Writers estimate the memory held by their queue from a sample of its rows,
+and once the total is over the budget the largest queues are written out
+first.
+
+With -zo, csv and json outputs are compressed as they are written, as
+BGZF with a block index (see BlockGzipWriter in modules/common/archive.py).
+
+With -fmt sqlite, every writer fills a table of a single OutputDatabase
+per run instead of a file of its own. The database is archived after all
+modules have finished, once its indexes have been built.
+
+Writers can checkpoint their output files in the journal of the run, so
+that a resumed run continues them from the last checkpoint (see
+modules/common/journal.py).
+
+'''
+
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import sys
+import traceback
+from collections import OrderedDict
+from json.encoder import encode_basestring_ascii
+from threading import Condition, Lock, Thread, current_thread, local
+
+from .archive import BlockGzipWriter
+
+if sys.version_info[0] < 3:
+    import codecs
+    import cStringIO
+
+log = logging.getLogger('data_writer')
+
+WRITE_BUFFER_SIZE = 1048576  # bytes buffered per open output file
+SAMPLE_INTERVAL = 64  # rows queued between two estimates of the queue size
+COMMIT_ROWS = 500000  # rows inserted per transaction of the output database
+INDEX_COLUMNS = ('path', 'user', 'timestamp')  # indexed in the output database, when present
+BLOCK_MARK_ROWS = 64  # rows written between two record boundaries of compressed outputs
+SHARD_CHECK_ROWS = 256  # rows written between two checks of the size of a sharded output
+
+
+class ManifestEntry(object):
+    """
+    A single output file registered in the OutputManifest, or a table of
+    the output database if table is set.
+    """
+
+    def __init__(self, path, module='', writer='', datatype='', runID='', table=None):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.archive_name = self.filename.replace(runID, '') if runID else self.filename
+        self.module = module
+        self.writer = writer
+        self.datatype = datatype
+        self.table = table  # archived with the database, not as a file of its own
+        self.rows = 0
+        self.bytes = 0
+        self.archived = False
+        self.closer = None  # closes the open writer of the output, if any
+
+    def update_size(self):
+        """Record the current on-disk size of the output. The size of a
+        table is the text written to it.
+        """
+        if self.table is not None:
+            return self.bytes
+        try:
+            if os.path.isdir(self.path):
+                self.bytes = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(self.path) for f in files)
+            else:
+                self.bytes = os.path.getsize(self.path)
+        except OSError:
+            pass
+        return self.bytes
+
+    def to_dict(self):
+        d = OrderedDict([
+            ('file', self.archive_name),
+            ('module', self.module),
+            ('writer', self.writer),
+            ('datatype', self.datatype),
+            ('rows', self.rows),
+            ('bytes', self.bytes),
+        ])
+        if self.table is not None:
+            d['table'] = self.table
+        return d
+
+
+class OutputManifest(object):
+    """
+    In-memory registry of the output files produced during a run.
+    """
+
+    def __init__(self, runID=''):
+        self.runID = runID
+        self.__entries = OrderedDict()
+        self.__closers = []  # (module, closer) of writers without files of their own
+        self.__mux = Lock()
+
+    def register(self, path, module='', writer='', datatype='file', table=None):
+        """
+        Register the output file at path, produced by module, or the table
+        of the output database at path.
+        Returns the ManifestEntry, registering the same path (and table)
+        twice returns the existing entry.
+        """
+        key = path if table is None else (path, table)
+        with self.__mux:
+            entry = self.__entries.get(key)
+            if entry is None:
+                entry = ManifestEntry(path, module, writer, datatype, self.runID, table)
+                self.__entries[key] = entry
+            return entry
+
+    def restore(self, outputdir, module, outputs):
+        """
+        Register the outputs of module archived by an earlier attempt of the
+        run, as recorded in its journal. outputs are to_dict() results with
+        the filename in outputdir added.
+        """
+        with self.__mux:
+            for o in outputs:
+                path = os.path.join(outputdir, o['filename'])
+                table = o.get('table')
+                entry = ManifestEntry(path, module, o['writer'], o['datatype'], self.runID, table)
+                entry.rows = o['rows']
+                entry.bytes = o['bytes']
+                entry.archived = True
+                self.__entries[path if table is None else (path, table)] = entry
+
+    def add_closer(self, module, closer):
+        """
+        Register closer to be called when the outputs of module are taken,
+        for writers that have no output file of their own.
+        """
+        with self.__mux:
+            self.__closers.append((module, closer))
+
+    def release(self, entry):
+        """
+        Mark entry as handed to the archiver ahead of its module, e.g. a
+        full shard, and record its size.
+        """
+        with self.__mux:
+            entry.archived = True
+        entry.update_size()
+        return entry
+
+    def entries(self, module=None):
+        """
+        Returns the registered entries, optionally only those of module.
+        """
+        with self.__mux:
+            return [e for e in self.__entries.values() if module is None or e.module == module]
+
+    def take(self, module=None):
+        """
+        Returns the entries (of module, if provided) that have not been handed
+        to the archiver yet, and marks them as archived. Writers still open
+        are closed, and sizes are recorded before the archiver removes the
+        files.
+        """
+        with self.__mux:
+            taken = [e for e in self.__entries.values() if not e.archived and (module is None or e.module == module)]
+            for e in taken:
+                e.archived = True
+            closers = [c for m, c in self.__closers if module is None or m == module]
+            self.__closers = [(m, c) for m, c in self.__closers if module is not None and m != module]
+        for closer in closers:
+            closer()
+        for e in taken:
+            if e.closer is not None:
+                e.closer()
+            e.update_size()
+        return taken
+
+    def to_dict(self):
+        entries = self.entries()
+        return OrderedDict([
+            ('runID', self.runID.lstrip('-')),
+            ('outputs', [e.to_dict() for e in entries]),
+            ('total_rows', sum(e.rows for e in entries)),
+            ('total_bytes', sum(e.bytes for e in entries)),
+        ])
+
+    def write(self, path):
+        """
+        Write the manifest as JSON to path.
+        """
+        with io.open(path, 'w', encoding='utf-8') as f:
+            data = json.dumps(self.to_dict(), indent=2)
+            if sys.version_info[0] < 3:
+                data = unicode(data)
+            f.write(data)
+        return path
+
+
+if sys.version_info[0] < 3:
+    def _text(value):
+        return value if isinstance(value, unicode) else str(value).decode('utf-8')
+else:
+    def _text(value):
+        if type(value) is str:
+            return value
+        return value.decode('utf-8') if isinstance(value, bytes) else str(value)
+
+
+def _row_size(row):
+    """Approximate memory held by a queued row, in bytes.
+    """
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+
+
+class OutputBudget(object):
+    """
+    Budget of the memory held by the queues of all data_writers of a run.
+    """
+
+    def __init__(self, limit=0):
+        """
+        Args:
+            limit - bytes, 0 for no limit
+        """
+        if limit < 0:
+            raise ValueError("OutputBudget - limit must be >= 0: Got value '{0}'".format(limit))
+        self.limit = limit
+        self.total = 0
+        self.peak = 0
+        self.__sizes = {}
+        self.__mux = Lock()
+
+    def update(self, writer, nbytes):
+        """
+        Record the bytes queued by writer.
+        Returns the writers to spill, largest first, to get back under the
+        limit.
+        """
+        with self.__mux:
+            self.total += nbytes - self.__sizes.get(writer, 0)
+            if nbytes:
+                self.__sizes[writer] = nbytes
+            else:
+                self.__sizes.pop(writer, None)
+            self.peak = max(self.peak, self.total)
+            if not self.limit or self.total <= self.limit:
+                return []
+            excess = self.total - self.limit
+            spill = []
+            for w, size in sorted(self.__sizes.items(), key=lambda i: -i[1]):
+                if excess <= 0:
+                    break
+                spill.append(w)
+                excess -= size
+            return spill
+
+
+class Schema(object):
+    """
+    Columns of a data_writer output, with optional column types.
+
+    Untyped columns are written as text. Typed columns (int, float or bool)
+    are written as JSON numbers and booleans when the value has that type,
+    and as text otherwise.
+    """
+
+    def __init__(self, columns, types=None):
+        """
+        Args:
+            columns - list of column names, in output order
+            types - dict of column name to int, float or bool
+        """
+        types = types or {}
+        unknown = [c for c in types if c not in columns]
+        if unknown:
+            raise ValueError("Schema - types given for unknown columns: {0}".format(unknown))
+        self.columns = list(columns)
+        self.types = tuple(types.get(c) for c in self.columns)
+        self.typed = any(self.types)
+        self.index = dict((c, i) for i, c in enumerate(self.columns))
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def new_row(self):
+        """Returns an empty row to be filled by column index.
+        """
+        return [''] * len(self.columns)
+
+    def row(self, values):
+        """Returns the row tuple of a mapping of column names to values.
+        Missing columns are left empty.
+        """
+        return tuple(values.get(c, '') for c in self.columns)
+
+
+def del_none(d):
+    """Utility to recursively delete keys with no value.
+    """
+    for key, value in list(d.items()):
+        if value is None or value == "":
+            del d[key]
+        elif isinstance(value, dict):
+            del_none(value)
+    return d
+
+
+class UnicodeWriter:
+    """
+    A CSV writer which will write rows to CSV file "f",
+    which is encoded in the given encoding.
+
+    Adopted from the Python documentation
+    Source: https://docs.python.org/2.7/library/csv.html
+    """
+
+    def __init__(self, f, dialect=csv.excel, encoding="utf-8", **kwds):
+        self.queue = cStringIO.StringIO()
+        self.writer = csv.writer(self.queue, dialect=dialect, **kwds)
+        self.stream = f
+        self.encoder = codecs.getincrementalencoder(encoding)()
+
+    def writerow(self, row):
+        self.writer.writerow([s.encode("utf-8") for s in row])
+        data = self.queue.getvalue()  # Fetch UTF-8 output from the queue ...
+        data = data.decode("utf-8")
+
+        self.stream.write(data)  # write to the target stream
+        self.queue.truncate(0)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+
+class _FileSink(object):
+    """
+    Output file of a data_writer, kept open between flushes. Compressed
+    outputs are written as BGZF, with their block index next to them.
+    Sharded outputs are rotated to <name>.part0002.<ext> and so on once a
+    shard holds shard_rows rows or shard_size bytes, and every full shard
+    is handed to the archiver right away.
+    """
+
+    datatype = None
+    shared = False  # the entry is shared with other writers
+
+    def __init__(self, ctx, writer):
+        self.headers = writer.headers
+        self.schema = writer.schema
+        self.buffer_size = writer.buffer_size
+        self.shard_rows = ctx.shard_rows
+        self.shard_size = ctx.shard_size
+        self.sharded = bool(self.shard_rows or self.shard_size)
+        self.part = 1
+        self.__ctx = ctx
+        self.__writer = writer
+        self.__compress = writer.compress
+        self._file = None
+        self.__gzip = None
+        self.__records = 0
+        self.__register(writer.path(self.datatype))
+
+    def __register(self, path):
+        """Register the output file (and its index) at path in the manifest.
+        """
+        self.path = path
+        self.index_path = None
+        if self.__compress:
+            self.path += '.gz'
+            self.index_path = self.path + '.idx'
+        module, name = self.__ctx.module, self.__writer.mod
+        self.entry = self.__ctx.manifest.register(self.path, module, name, self.datatype)
+        self.entry.closer = self.__writer.close
+        self.index_entry = None
+        if self.index_path is not None:
+            self.index_entry = self.__ctx.manifest.register(self.index_path, module, name, 'index')
+            self.index_entry.closer = self.__writer.close
+
+    def _open(self, mode='a'):
+        """Returns the open text file, opening it with mode if it is not
+        open yet.
+        """
+        if self._file is None:
+            if self.index_path is None:
+                self._file = io.open(self.path, mode, encoding='utf-8', buffering=self.buffer_size)
+            else:
+                self.__gzip = BlockGzipWriter(open(self.path, mode + 'b'),
+                                              io.open(self.index_path, mode, encoding='utf-8'))
+                self._file = io.TextIOWrapper(io.BufferedWriter(self.__gzip, self.buffer_size), encoding='utf-8')
+            self._opened()
+        return self._file
+
+    def _opened(self):
+        pass
+
+    def __mark(self, records):
+        """Count records written, and mark the record boundary for the
+        blocks of a compressed output.
+        """
+        self.entry.rows += records
+        if self.__gzip is not None:
+            self._file.flush()
+            self.__records += records
+            self.__gzip.mark(self.__records)
+
+    def __full(self):
+        """Returns True if the current shard is full.
+        """
+        if self.shard_rows and self.entry.rows >= self.shard_rows:
+            return True
+        if self.shard_size:
+            size = self.__gzip.fileobj.tell() if self.__gzip is not None else self._file.tell()
+            return size >= self.shard_size
+        return False
+
+    def __rotate(self):
+        """Close the current shard, hand it to the archiver and continue in
+        the next one.
+        """
+        self.close()
+        shard = [e for e in (self.entry, self.index_entry) if e is not None]
+        for entry in shard:
+            self.__ctx.manifest.release(entry)
+        if self.__ctx.archive is not None:
+            self.__ctx.archive.add_files([e.filename for e in shard])
+        self.part += 1
+        self.__records = 0
+        self.__register(self.__writer.path('part{0:04d}.{1}'.format(self.part, self.datatype)))
+        self.start()
+
+    def start(self):
+        """Start the file over.
+        """
+        self._open('w')
+        self._start()
+        self.__mark(0)
+
+    def _start(self):
+        pass
+
+    def write(self, rows, texts):
+        """Write rows, given as raw values and as their text.
+        """
+        self._open()
+        if self.__gzip is not None:
+            step = BLOCK_MARK_ROWS
+        elif self.sharded:
+            step = SHARD_CHECK_ROWS
+        else:
+            step = len(rows) or 1
+        i = 0
+        while i < len(rows):
+            n = step
+            if self.sharded:
+                if self.__full():
+                    self.__rotate()
+                if self.shard_rows:
+                    n = min(n, self.shard_rows - self.entry.rows)
+            self._write(rows[i:i + n], texts[i:i + n])
+            self.__mark(len(rows[i:i + n]))
+            i += n
+
+    def write_entry(self, data):
+        self._open()
+        if self.sharded and self.__full():
+            self.__rotate()
+        self._write_entry(data)
+        self.__mark(1)
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception as e:
+                log.error("data_writer: Failed to close {0}: {1}".format(self.path, str(e)))
+            self._file = None
+            self.__gzip = None
+
+
+class CsvSink(_FileSink):
+    """
+    CSV output file of a data_writer.
+    """
+
+    datatype = 'csv'
+
+    def _opened(self):
+        if sys.version_info[0] < 3:
+            self.__writer = UnicodeWriter(self._file)
+        else:
+            self.__writer = csv.writer(self._file)
+
+    def _start(self):
+        self.__writer.writerow(self.headers)
+
+    def _write(self, rows, texts):
+        self.__writer.writerows(texts)
+
+    def _write_entry(self, data):
+        self.__writer.writerow(data)
+
+
+def _json_encoder(headers, types):
+    """
+    Returns a function encoding a row, given as raw values and as their
+    text, as the line json.dumps writes for the dict of its non-empty
+    values, without building the dict. Returns None when the dict is still
+    needed: headers with repeated names, or python 2 where dicts have no
+    insertion order.
+    """
+    if sys.version_info[0] < 3 or len(set(headers)) != len(headers):
+        return None
+    keys = [encode_basestring_ascii(h) + ': ' for h in headers]
+    encode = encode_basestring_ascii
+
+    if not any(types):
+        def encoder(row, text):
+            return '{' + ', '.join([k + encode(v) for k, v in zip(keys, text) if v != '']) + '}\n'
+        return encoder
+
+    def typed_encoder(row, text):
+        fields = []
+        for k, t, v, tv in zip(keys, types, row, text):
+            if t is not None and isinstance(v, t):
+                fields.append(k + json.dumps(v))
+            elif tv != '':
+                fields.append(k + encode(tv))
+        return '{' + ', '.join(fields) + '}\n'
+    return typed_encoder
+
+
+class JsonSink(_FileSink):
+    """
+    JSON lines output file of a data_writer.
+    Empty values are left out of the records.
+    """
+
+    datatype = 'json'
+
+    def __init__(self, ctx, writer):
+        _FileSink.__init__(self, ctx, writer)
+        self.__encoder = _json_encoder(self.headers, self.schema.types)
+
+    def _write(self, rows, texts):
+        if self.__encoder is not None:
+            encoder = self.__encoder
+            self._file.write(''.join([encoder(row, text) for row, text in zip(rows, texts)]))
+            return
+        for row, text in zip(rows, texts):
+            self.__write_line(self.__record(row, text))
+
+    def _write_entry(self, data):
+        self.__write_line(del_none(dict(zip(self.headers, data))))
+
+    def __write_line(self, record):
+        if sys.version_info[0] < 3:
+            self._file.write(unicode(json.dumps(record, indent=None)))
+            self._file.write('\n'.decode('utf-8'))
+        else:
+            self._file.write(json.dumps(record, indent=None))
+            self._file.write('\n')
+
+    def __record(self, row, text):
+        """
+        Returns the dict of a row to be serialized, without empty values.
+        Values of typed columns are kept if they have the type of the column.
+        """
+        if not self.schema.typed:
+            return dict((h, v) for h, v in zip(self.headers, text) if v != '')
+        record = {}
+        for h, t, v, tv in zip(self.headers, self.schema.types, row, text):
+            if t is not None and isinstance(v, t):
+                record[h] = v
+            elif tv != '':
+                record[h] = tv
+        return record
+
+
+class OutputDatabase(object):
+    """
+    SQLite database holding the outputs of a run, one table per data_writer.
+
+    Rows are inserted in large transactions, without a rollback journal and
+    without syncing to disk, so the database is only consistent once it has
+    been closed. Indexes are built on close.
+    """
+
+    def __init__(self, path, indexes=True):
+        """
+        Args:
+            path - path of the database, created on the first table
+            indexes - build indexes on the INDEX_COLUMNS of every table on close
+        """
+        self.path = path
+        self.indexes = indexes
+        self.entry = None  # ManifestEntry of the database
+        self.__conn = None
+        self.__tables = OrderedDict()  # table name: columns
+        self.__pending = 0  # rows inserted in the current transaction
+        self.__mux = Lock()
+
+    def __connect(self):
+        if self.__conn is None:
+            self.__conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.__conn.execute('PRAGMA journal_mode=OFF')
+            self.__conn.execute('PRAGMA synchronous=OFF')
+            self.__conn.execute('BEGIN')
+        return self.__conn
+
+    def create_table(self, name, columns, types):
+        """
+        Create the table name with columns, replacing any table of that name.
+        Runs with -fmt sqlite are never resumed (automactc.py rejects
+        --resume), so there are no rows of an earlier attempt to keep.
+        Columns typed int or bool are INTEGER and float REAL, others TEXT.
+        """
+        affinity = {int: 'INTEGER', bool: 'INTEGER', float: 'REAL'}
+        names = []
+        for c in columns:  # column names repeated in the headers get a suffix
+            n, i = c, 1
+            while n in names:
+                i += 1
+                n = '{0}_{1}'.format(c, i)
+            names.append(n)
+        definition = ', '.join('{0} {1}'.format(_quote(c), affinity.get(t, 'TEXT')) for c, t in zip(names, types))
+        with self.__mux:
+            conn = self.__connect()
+            conn.execute('DROP TABLE IF EXISTS {0}'.format(_quote(name)))
+            conn.execute('CREATE TABLE {0} ({1})'.format(_quote(name), definition))
+            self.__tables[name] = names
+
+    def insert(self, name, rows):
+        """
+        Insert rows into the table name, committing every COMMIT_ROWS rows.
+        """
+        sql = 'INSERT INTO {0} VALUES ({1})'.format(_quote(name), ', '.join('?' * len(self.__tables[name])))
+        with self.__mux:
+            conn = self.__connect()
+            conn.executemany(sql, rows)
+            self.__pending += len(rows)
+            if self.__pending >= COMMIT_ROWS:
+                self.__commit()
+
+    def commit(self):
+        with self.__mux:
+            if self.__conn is not None:
+                self.__commit()
+
+    def __commit(self):
+        self.__conn.execute('COMMIT')
+        self.__conn.execute('BEGIN')
+        self.__pending = 0
+
+    def close(self):
+        """
+        Commit, build the indexes and close the database.
+        """
+        with self.__mux:
+            if self.__conn is None:
+                return
+            conn, self.__conn = self.__conn, None
+            try:
+                if self.indexes:
+                    for name, columns in self.__tables.items():
+                        for c in columns:
+                            if c in INDEX_COLUMNS:
+                                conn.execute('CREATE INDEX {0} ON {1} ({2})'.format(
+                                    _quote('{0}_{1}'.format(name, c)), _quote(name), _quote(c)))
+                conn.execute('COMMIT')
+            finally:
+                conn.close()
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class SqliteSink(object):
+    """
+    Table of a data_writer in the OutputDatabase of the run.
+    """
+
+    datatype = 'sqlite'
+    shared = True  # the database file is shared by all tables
+    sharded = False
+
+    def __init__(self, ctx, writer):
+        if ctx.output_database is None:
+            raise ValueError('Unable to instantiate data_writer for datatype sqlite without an output database')
+        self.database = ctx.output_database
+        self.path = self.database.path
+        self.table = writer.mod
+        self.headers = writer.headers
+        self.schema = writer.schema
+        # rows and text written to the table, counted for the module
+        self.entry = ctx.manifest.register(self.path, ctx.module, writer.mod, self.datatype, table=self.table)
+
+    def start(self):
+        """Start the table over.
+        """
+        self.database.create_table(self.table, self.headers, self.schema.types)
+
+    def write(self, rows, texts):
+        """Write rows, given as raw values and as their text.
+        """
+        nbytes = sum(len(tv) for text in texts for tv in text)
+        if self.schema.typed:
+            types = self.schema.types
+            texts = [[v if t is not None and isinstance(v, t) else tv for t, v, tv in zip(types, row, text)]
+                     for row, text in zip(rows, texts)]
+        width = len(self.headers)
+        if any(len(text) != width for text in texts):  # records of headers with repeated names are shorter
+            texts = [self.__fit(text) for text in texts]
+        self.database.insert(self.table, texts)
+        self.entry.rows += len(rows)
+        self.entry.bytes += nbytes
+
+    def write_entry(self, data):
+        data = [_text(v) for v in data]
+        self.database.insert(self.table, [self.__fit(data)])
+        self.entry.rows += 1
+        self.entry.bytes += sum(len(v) for v in data)
+
+    def __fit(self, text):
+        """Pad or truncate a row to the columns of the table.
+        """
+        width = len(self.headers)
+        return (list(text) + [None] * width)[:width]
+
+    def flush(self):
+        self.database.commit()
+
+    def close(self):
+        self.database.commit()
+
+
+# Output formats of data_writer. 'all' writes every one of ALL_FORMATS.
+SINKS = OrderedDict([
+    ('csv', CsvSink),
+    ('json', JsonSink),
+    ('sqlite', SqliteSink),
+])
+ALL_FORMATS = ('csv', 'json')
+
+
+class _ThreadBuffer(object):
+    """
+    Rows queued by a single thread, and the number of rows it has written.
+    Only the owning thread appends to rows, flushes take them from the front.
+    """
+
+    def __init__(self):
+        self.thread = current_thread()
+        self.rows = []
+        self.count = 0
+
+
+class data_writer:
+    """
+    Establish data_writer class to handle output file format and naming scheme.
+    """
+
+    def __init__(self, ctx, name, headers, datatype=None, resume=False, buffer_size=WRITE_BUFFER_SIZE,
+                 async_write=False, compress=None):
+        """
+        Initialize the data_writer.
+        ctx is the CollectionContext of the current run.
+        headers is a list of column names or a Schema.
+        If headers is None, treats as just a wrapper.
+        If datatype is None, uses the output format of the run.
+        If datatype is 'all', writes in all formats of ALL_FORMATS.
+        Rows are converted to text once and written to the file of every
+        format in the same pass.
+        If resume is True and the journal of the run holds checkpoints of
+        this output, the output files are truncated to the last checkpoint
+        and appended to. The checkpoint events are available as resumed.
+        buffer_size is the number of bytes buffered per open output file.
+        The queue is written out once it holds buffer_cap rows, or earlier
+        when the queues of all writers are over the OutputBudget of the run.
+        If async_write is True, full queues are serialized and written by a
+        background thread while the module keeps filling the next queue.
+        Producers only wait when the thread is still busy with the previous
+        queue.
+        If compress is True, csv and json outputs are written as BGZF
+        (.gz) with a block index (.gz.idx), and are started over rather
+        than resumed. If None, follows the -zo flag of the run.
+
+        Output files stay open for the lifetime of the writer. Caller must
+        call flush_record(final=True) or close() at the close of the module,
+        or use the writer as a context manager, to ensure all contents of
+        queue that were < buffer_cap at the end are written to the file.
+        Outputs of writers left open are closed before they are archived.
+        """
+        if datatype is None:
+            datatype = ctx.output_format
+        if datatype not in SINKS and datatype not in ('file', 'all'):
+            raise ValueError('Unable to instantiate data_writer for datatype {0}'.format(datatype))
+
+        if headers is not None and not isinstance(headers, Schema):
+            headers = Schema(headers)
+        self.schema = headers
+        if sys.version_info[0] < 3 and headers is not None:
+            self.headers = [str(h).decode('utf-8') for h in headers]
+        else:
+            self.headers = headers.columns if headers is not None else None
+        self.name = ctx.filename_prefix + ',' + name + ctx.runID
+        self.mod = name
+        self.datatype = datatype
+        self._log = logging.getLogger(self.mod)
+        self.__local = local()  # _ThreadBuffer of the current thread
+        self.__buffers = []  # _ThreadBuffer of every thread writing rows
+        self.__buffers_mux = Lock()
+        self.__retired = 0  # rows written by threads that have exited
+        self.buffer_size = buffer_size
+        self.async_write = async_write
+        self.compress = ctx.compress_outputs if compress is None else compress
+        self.__mux = Lock()  # make thread-safe for concurrent modules
+        self.__turn = Condition()  # hands queues over to the writer thread
+        self.__writing = None  # queue being written by the writer thread
+        self.__thread = None
+        self.__stopping = False
+        self.__budget = ctx.output_budget
+        self.__row_bytes = 0  # estimated bytes per queued row
+        self.__writing_bytes = 0  # estimated bytes of the queue being written
+        self.__journal = ctx.journal
+        self.resumed = []
+
+        self.__outputdir = ctx.outputdir
+        self.output_filename = self.name + '.' + self.datatype
+        self.data_file_name = self.path(self.datatype)
+
+        self.__sinks = []
+        if headers is None or self.datatype == 'file':  # no file generated here. simply to manage file name for output to be captured.
+            return
+        formats = ALL_FORMATS if self.datatype == 'all' else [self.datatype]
+        self.__sinks = [SINKS[fmt](ctx, self) for fmt in formats]
+        if all(sink.shared for sink in self.__sinks):
+            ctx.manifest.add_closer(ctx.module, self.close)
+        if resume and not self.compress and not any(sink.sharded for sink in self.__sinks):
+            self.resumed = self.__resume()
+            if self.resumed:
+                return
+        for sink in self.__sinks:
+            sink.start()
+
+    def path(self, fmt):
+        """
+        Returns the path of the output file of the writer in format fmt.
+        """
+        return os.path.join(self.__outputdir, self.name + '.' + fmt)
+
+    def __resume(self):
+        """
+        Truncate the output files to their last checkpoint in the journal.
+        Returns the checkpoint events, or an empty list if the output has to
+        be started over.
+        """
+        entries = self.__entries()
+        if not entries:
+            return []
+        checkpoints = self.__journal.checkpoints(entries[0].filename)
+        if not checkpoints:
+            return []
+        last = checkpoints[-1]['files']
+        for entry in entries:
+            state = last.get(entry.filename)
+            if state is None or not os.path.isfile(entry.path) or os.path.getsize(entry.path) < state['offset']:
+                log.debug("Cannot resume {0}, starting over.".format(entry.filename))
+                return []
+        for entry in entries:
+            with open(entry.path, 'r+b') as f:
+                f.truncate(last[entry.filename]['offset'])
+            entry.rows = last[entry.filename]['rows']
+        log.debug("Resuming {0} at {1} rows.".format(self.output_filename, entries[0].rows))
+        return checkpoints
+
+    def __entries(self):
+        """
+        Returns the manifest entries of the files of the writer.
+        """
+        return [sink.entry for sink in self.__sinks if not sink.shared]
+
+    def resumed_state(self, key):
+        """
+        Returns the set of the items recorded under key by all checkpoints
+        of the interrupted run, e.g. the directories dirlist parsed.
+        """
+        items = set()
+        for checkpoint in self.resumed:
+            items.update(checkpoint.get(key, ()))
+        return items
+
+    def checkpoint(self, **state):
+        """
+        Flush the queue and record the size and rows of the output files in
+        the journal of the run, along with state of the module as keyword
+        arguments. State is recorded as lists of the work done since the
+        previous checkpoint (e.g. the directories parsed), so that the
+        journal grows with the work done rather than with the number of
+        checkpoints. resumed_state() merges it back on resume.
+        """
+        self.flush_record()
+        with self.__mux:
+            for sink in self.__sinks:
+                sink.flush()
+        files = dict((e.filename, {'offset': os.path.getsize(e.path), 'rows': e.rows}) for e in self.__entries())
+        self.__journal.record('checkpoint', files=files, **state)
+
+    def write_entry(self, data):
+        """
+        Writes output entry to output file.
+        data is a list of strings.
+        """
+        log.warn("write_entry will be deprecated in future versions, use write_record instead :) ")
+        with self.__mux:
+            for sink in self.__sinks:
+                sink.write_entry(data)
+        return ""
+
+    def write_record(self, record, buffer_cap=10000):
+        """
+        Writes output entry to buffer.
+        Record is a list object or dict like object.
+        Once buffer_cap entries are stored in the queue, it is flushed to file.
+
+        Caller must call the flush method at the close of the module to ensure
+        all contents of queue that were < buffer_size at the end are written
+        to the file.
+        """
+        if record is not None:
+            if isinstance(record, list):
+                self.write_row(tuple(record), buffer_cap)
+            else:
+                self.write_row(tuple(record.values()), buffer_cap)
+        return ""
+
+    def write_row(self, row, buffer_cap=10000):
+        """
+        Writes a row to buffer, without building a record.
+        Row is a tuple of values in the order of the columns of the schema,
+        or a list which is not modified afterwards. Values are converted to
+        text when the buffer is flushed.
+        Every thread queues rows in a buffer of its own, and the queue is
+        written out once the buffer of a thread holds buffer_cap rows.
+        """
+        try:
+            buf = self.__local.buffer
+        except AttributeError:
+            buf = self.__new_buffer()
+        buf.rows.append(row)
+        buf.count += 1
+        queued = len(buf.rows)
+        if queued > buffer_cap:
+            self.__flush_full()
+        elif queued % SAMPLE_INTERVAL == 0:
+            self.__account(row)
+        return ""
+
+    def __new_buffer(self):
+        buf = self.__local.buffer = _ThreadBuffer()
+        with self.__buffers_mux:
+            self.__buffers = self.__buffers + [buf]
+        return buf
+
+    def __take(self):
+        """
+        Take the rows queued by all threads, under a short lock. Rows
+        appended meanwhile stay in the buffers. Buffers of threads that
+        have exited are dropped once empty.
+        """
+        rows = []
+        with self.__buffers_mux:
+            for buf in self.__buffers:
+                taken = buf.rows[:]
+                del buf.rows[:len(taken)]
+                rows.extend(taken)
+            retired = [b for b in self.__buffers if not b.rows and not b.thread.is_alive()]
+            if retired:
+                self.__retired += sum(b.count for b in retired)
+                self.__buffers = [b for b in self.__buffers if b not in retired]
+        return rows
+
+    def __queued(self):
+        return sum(len(b.rows) for b in self.__buffers)
+
+    def count(self):
+        """
+        Returns the number of rows written to the writer so far, by all
+        threads.
+        """
+        return self.__retired + sum(b.count for b in self.__buffers)
+
+    def __account(self, row):
+        """
+        Update the estimated size of the queue from a sample row, and spill
+        the largest queues of the run if they are over budget.
+        """
+        size = _row_size(row)
+        self.__row_bytes = size if not self.__row_bytes else (self.__row_bytes * 7 + size) // 8
+        for writer in self.__budget.update(self, self.__queued() * self.__row_bytes + self.__writing_bytes):
+            writer.spill()
+
+    def spill(self):
+        """
+        Write out the queue to free the memory it holds.
+        """
+        self.__flush_full()
+
+    def __flush_full(self):
+        if self.async_write:
+            self.__handoff()
+        else:
+            self.flush_record()
+
+    def __handoff(self):
+        """
+        Hand the queue over to the writer thread. Waits while the thread is
+        still writing the previous queue.
+        """
+        with self.__turn:
+            while self.__writing is not None:
+                self.__turn.wait()
+            rows = self.__take()
+            if not rows:
+                return
+            self.__writing = rows
+            self.__writing_bytes = len(self.__writing) * self.__row_bytes
+            if self.__thread is None:
+                self.__thread = Thread(target=self.__writer, name='writer-' + self.mod)
+                self.__thread.daemon = True
+                self.__thread.start()
+            self.__turn.notify_all()
+
+    def __drain(self, stop=False):
+        """
+        Wait for the writer thread to finish writing, and stop it if stop.
+        """
+        with self.__turn:
+            while self.__writing is not None:
+                self.__turn.wait()
+            thread = self.__thread
+            if not stop or thread is None:
+                return
+            self.__stopping = True
+            self.__turn.notify_all()
+        thread.join()
+        with self.__turn:
+            self.__thread = None
+            self.__stopping = False
+
+    def __writer(self):
+        """
+        Background thread writing the queues handed over to it.
+        """
+        while True:
+            with self.__turn:
+                while self.__writing is None and not self.__stopping:
+                    self.__turn.wait()
+                if self.__writing is None:
+                    return
+                rows = self.__writing
+            self.__write_rows(rows)
+            with self.__turn:
+                self.__writing = None
+                self.__writing_bytes = 0
+                self.__turn.notify_all()
+            self.__budget.update(self, self.__queued() * self.__row_bytes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        """
+        Flush the queue and close the output files.
+        """
+        self.flush_record(final=True)
+
+    def flush_record(self, final=False):
+        """
+        Flush the queue to the output file.
+        Blocking method.
+        This method should be called with final=True at the close of the
+        module to handle straggling entries in the buffer and close the
+        output files.
+        """
+        if self.async_write:
+            self.__handoff()
+            self.__drain(stop=final)
+        else:
+            # take and write the batch under one lock, so that batches taken by a spill and by
+            # the owner's flush are written in the order they were taken
+            with self.__mux:
+                self.__serialize(self.__take())
+            self.__budget.update(self, self.__queued() * self.__row_bytes)
+        if final:
+            with self.__mux:
+                for sink in self.__sinks:
+                    sink.close()
+
+    def __write_rows(self, rows):
+        """
+        Serialize rows to the output files.
+        """
+        if not rows:
+            return
+        with self.__mux:
+            self.__serialize(rows)
+
+    def __serialize(self, rows):
+        """
+        Serialize rows to the output files. Called with the lock held.
+        """
+        if not rows:
+            return
+        try:
+            texts = [[_text(v) for v in row] for row in rows]
+            for sink in self.__sinks:
+                sink.write(rows, texts)
+        except Exception as e:
+            log.debug("data_writer: Failed to flush queue: {0}: {1}".format(str(e), [traceback.format_exc()]))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+
+'''
+
+@ purpose:
+
+Dependency-aware scheduler used by automactc.py to run modules, either one
+after the other or concurrently on a small set of worker threads.
+
+Every module is assigned a class:
+    live    - volatile state (processes, open files, connections) that must
+              be captured before anything else perturbs the host
+    disk    - modules that walk or hash large parts of the filesystem
+    sqlite  - modules that stage temporary database copies in outputdir
+    light   - everything else, mostly small plist and log parsers
+
+Each class has its own concurrency limit on top of the global worker count,
+so that e.g. only one disk walker runs at a time while the cheap parsers
+fill up the remaining workers.
+
+'''
+
+import logging
+import threading
+import time
+import traceback
+
+log = logging.getLogger('scheduler')
+
+MODULE_CLASSES = {
+    'mod_dirlist': 'disk',
+    'mod_autoruns': 'disk',
+    'mod_chrome': 'sqlite',
+    'mod_cookies': 'sqlite',
+    'mod_firefox': 'sqlite',
+    'mod_quarantines': 'sqlite',
+    'mod_quicklook': 'sqlite',
+    'mod_safari': 'sqlite',
+}
+
+# Lower value is dispatched first. Long running disk walkers start as early
+# as possible so the short modules are scheduled around them.
+CLASS_PRIORITY = {'live': 0, 'disk': 1, 'sqlite': 2, 'light': 3}
+
+# None means the class is only bound by the global worker count.
+DEFAULT_CLASS_LIMITS = {'live': 1, 'disk': 1, 'sqlite': 1, 'light': None}
+
+
+def module_class(module):
+    """Return the scheduling class of the module file name provided.
+    """
+    if module.startswith('mod_live_'):
+        return 'live'
+    return MODULE_CLASSES.get(module, 'light')
+
+
+def parse_class_limits(limits):
+    """Parse a list of CLASS=N strings (as passed on the command line) into
+    a dictionary of class limits, starting from DEFAULT_CLASS_LIMITS.
+    """
+    parsed = dict(DEFAULT_CLASS_LIMITS)
+    for item in limits or []:
+        if item == '':
+            continue
+        try:
+            cls, value = item.split('=', 1)
+            value = int(value)
+        except ValueError:
+            raise ValueError("Class limit must be provided as CLASS=N, got '{0}'".format(item))
+        if cls not in parsed:
+            raise ValueError("Unknown module class '{0}', expected one of {1}".format(cls, sorted(parsed)))
+        if value < 1:
+            raise ValueError("Class limit for '{0}' must be >= 1: got '{1}'".format(cls, value))
+        parsed[cls] = value
+    return parsed
+
+
+class ModuleTask(object):
+    """
+    A single module queued in the ModuleScheduler.
+    """
+
+    def __init__(self, module, index, deps=None):
+        self.module = module
+        self.index = index
+        self.cls = module_class(module)
+        self.deps = set(deps or [])
+        self.result = None
+        self.runtime = None
+
+
+class ModuleScheduler(object):
+    """
+    Run a list of modules through runner, honouring dependencies, per-class
+    concurrency limits and a global worker count.
+    """
+
+    def __init__(self, runner, workers=1, class_limits=None, on_complete=None):
+        """
+        Args:
+            runner - callable taking the module name, its return value is
+                     stored as the task result
+            workers - integer number of modules to run at the same time,
+                      1 runs every module in the calling thread
+            class_limits - dict of class name to max concurrent modules
+            on_complete - optional callable(task, done_count, total_count)
+                          called as soon as each module finishes
+        """
+        if workers < 1:
+            raise ValueError("ModuleScheduler - Workers must be >= 1: Got value '{0}'".format(workers))
+        self.runner = runner
+        self.workers = workers
+        self.class_limits = dict(DEFAULT_CLASS_LIMITS)
+        self.class_limits.update(class_limits or {})
+        self.on_complete = on_complete
+        self.tasks = []
+        self.__cond = threading.Condition()
+        self.__done = set()
+        self.__running = {}
+        self.__stopped = False
+
+    def add_modules(self, modules):
+        """Queue modules in the order provided. Every non-live module depends
+        on all live modules in the same list, so volatile state is collected
+        before the disk heavy modules start.
+        """
+        live = [m for m in modules if module_class(m) == 'live']
+        for module in modules:
+            deps = live if module_class(module) != 'live' else []
+            self.tasks.append(ModuleTask(module, len(self.tasks), deps))
+        return self.tasks
+
+    def run(self):
+        """Run every queued module and block until all of them finished.
+
+        Returns:
+            list of ModuleTask objects in queue order
+        """
+        known = set(t.module for t in self.tasks)
+        for task in self.tasks:
+            task.deps &= known
+
+        if self.workers == 1:
+            self.__run_serial()
+        else:
+            self.__run_concurrent()
+        return self.tasks
+
+    def __ready(self, pending):
+        """Return the next task that may start now, or None.
+        """
+        running_total = sum(self.__running.values())
+        if running_total >= self.workers:
+            return None
+        candidates = [t for t in pending if t.deps <= self.__done]
+        if self.workers > 1:
+            candidates.sort(key=lambda t: (CLASS_PRIORITY.get(t.cls, 99), t.index))
+        for task in candidates:
+            limit = self.class_limits.get(task.cls)
+            if limit is None or self.__running.get(task.cls, 0) < limit:
+                return task
+        return None
+
+    def __run_serial(self):
+        pending = list(self.tasks)
+        while pending:
+            task = self.__ready(pending)
+            if task is None:  # unsatisfiable dependency, run in queue order
+                task = pending[0]
+            pending.remove(task)
+            self.__execute(task)
+            self.__finish(task)
+
+    def __run_concurrent(self):
+        pending = list(self.tasks)
+        threads = []
+        try:
+            with self.__cond:
+                while pending or sum(self.__running.values()) > 0:
+                    task = self.__ready(pending) if not self.__stopped else None
+                    if task is None:
+                        if self.__stopped and sum(self.__running.values()) == 0:
+                            break
+                        self.__cond.wait(0.5)
+                        continue
+                    pending.remove(task)
+                    self.__running[task.cls] = self.__running.get(task.cls, 0) + 1
+                    log.debug("Dispatching {0} ({1}).".format(task.module, task.cls))
+                    t = threading.Thread(target=self.__worker, args=(task,), name=task.module)
+                    t.daemon = True
+                    t.start()
+                    threads.append(t)
+        except KeyboardInterrupt:
+            with self.__cond:
+                self.__stopped = True
+            log.error("Scheduler interrupted, not starting {0} queued module(s).".format(len(pending)))
+            for t in threads:
+                t.join()
+
+    def __worker(self, task):
+        self.__execute(task)
+        with self.__cond:
+            self.__running[task.cls] -= 1
+            self.__finish(task)
+            self.__cond.notify_all()
+
+    def __execute(self, task):
+        start = time.time()
+        try:
+            task.result = self.runner(task.module)
+        except Exception:
+            log.error("Unhandled exception while running {0}: {1}".format(task.module, [traceback.format_exc()]))
+            task.result = False
+        task.runtime = time.time() - start
+
+    def __finish(self, task):
+        self.__done.add(task.module)
+        if self.on_complete is not None:
+            try:
+                self.on_complete(task, len(self.__done), len(self.tasks))
+            except Exception:
+                log.debug("on_complete callback failed: {0}".format([traceback.format_exc()]))
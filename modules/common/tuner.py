@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+'''
+
+@ purpose:
+
+Worker count tuner for a WorkerQueue, used by dirlist to pick the number
+of parse and hash threads for the storage it walks instead of a fixed count.
+
+The tuner measures the throughput of the queue in short windows, as items
+per second (files & dirs) and MB per second hashed:
+    calibration - at the start, one window at each count from the start
+                  count up to max_workers, doubling, e.g. 5, 10, 16
+    evaluation  - every PERIOD seconds, one window each at the current
+                  count, a step below and a step above it
+After each round the queue keeps the best count. A higher count must beat
+a lower one by MARGIN to be kept, so that threads are only added while
+they help (fast SSDs) and removed when they thrash (spinning disks,
+network-backed images).
+
+Both rates of a round are scaled to their best window and added up, so a
+hash-bound and a stat-bound walk are scored alike.
+
+A round ends early once the queue runs dry during a window: the walker,
+not the workers, is the bottleneck then, and more threads cannot help.
+
+The tuner has no thread of its own. The producer calls tick() as it queues
+items, and reset() after waiting for the queue to drain.
+
+'''
+
+import logging
+import time
+
+log = logging.getLogger('tuner')
+
+WINDOW = 2.0  # seconds measured per worker count
+PERIOD = 60.0  # seconds between two evaluations
+MARGIN = 0.05  # improvement needed to keep a higher worker count
+
+
+class WorkerTuner(object):
+    """
+    Settles a WorkerQueue on the worker count with the best throughput,
+    between min_workers and max_workers.
+    """
+
+    def __init__(self, pool, min_workers, max_workers, items, nbytes, start=None, window=WINDOW, period=PERIOD):
+        """
+        Args:
+            pool - WorkerQueue to resize
+            min_workers, max_workers - bounds of the worker count, >= 1
+            items - callable returning the number of items processed so far
+            nbytes - callable returning the number of bytes read so far
+            start - worker count calibration starts from, defaults to min_workers
+            window - seconds measured per worker count
+            period - seconds between two evaluations
+        """
+        if min_workers < 1 or max_workers < min_workers:
+            raise ValueError("WorkerTuner - Need 1 <= min_workers <= max_workers: Got values '{0}', '{1}'".format(min_workers, max_workers))
+        self.pool = pool
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.items = items
+        self.nbytes = nbytes
+        self.window = window
+        self.period = period
+        self.start = min(max(start or min_workers, min_workers), max_workers)
+        self.best = None  # worker count settled on by the last round
+        self.__round = []  # worker counts left to measure in this round
+        self.__rates = []  # (workers, items/s, bytes/s) measured in this round
+        self.__start = None  # time, items and bytes at the start of the window
+        self.__ticks = 0  # ticks of the current window
+        self.__starved = 0  # ticks of the current window with fewer items queued than workers
+        self.__next_round = None
+        self.__begin(self.__calibration())
+
+    def tick(self):
+        """Close the current window if it is over. Called often by the producer,
+        before it queues more items.
+        """
+        now = time.time()
+        if self.__start is not None:
+            self.__ticks += 1
+            if self.pool.queued() < self.pool.workers:
+                self.__starved += 1
+            if now - self.__start[0] >= self.window:
+                self.__measure(now)
+        elif now >= self.__next_round:
+            self.__begin(self.__evaluation())
+
+    def reset(self):
+        """Restart the current window, e.g. after the queue was drained.
+        """
+        if self.__start is not None:
+            self.__restart(time.time())
+
+    def __calibration(self):
+        counts = []
+        workers = self.start
+        while workers < self.max_workers:
+            counts.append(workers)
+            workers *= 2
+        counts.append(self.max_workers)
+        return counts
+
+    def __evaluation(self):
+        step = max(1, self.best // 4)
+        lower = max(self.min_workers, self.best - step)
+        higher = min(self.max_workers, self.best + step)
+        counts = [self.best]  # the current count first, to stop early if the queue runs dry
+        counts.extend(c for c in (lower, higher) if c not in counts)
+        return counts
+
+    def __sample(self, now):
+        return (now, self.items(), self.nbytes())
+
+    def __restart(self, now):
+        self.__start = self.__sample(now)
+        self.__ticks = 0
+        self.__starved = 0
+
+    def __begin(self, counts):
+        self.__round = counts
+        self.__rates = []
+        self.pool.resize(self.__round.pop(0))
+        self.__restart(time.time())
+
+    def __measure(self, now):
+        start, items, nbytes = self.__start
+        elapsed = now - start
+        _, items_now, nbytes_now = self.__sample(now)
+        rate = (self.pool.workers, (items_now - items) / elapsed, (nbytes_now - nbytes) / elapsed)
+        self.__rates.append(rate)
+        log.debug("{0} workers: {1:.0f} files & dirs/s, {2:.1f} MB/s hashed".format(rate[0], rate[1], rate[2] / 1048576.0))
+
+        if self.__round and self.__starved * 2 > self.__ticks:
+            log.debug("Queue ran dry with {0} workers, the walk is the bottleneck.".format(rate[0]))
+            self.__round = []
+        if self.__round:
+            self.pool.resize(self.__round.pop(0))
+            self.__restart(now)
+            return
+
+        self.__start = None
+        self.__next_round = now + self.period
+        best = self.__choose()
+        if best != self.best:
+            log.debug("Settled on {0} workers.".format(best))
+        self.best = best
+        self.pool.resize(best)
+
+    def __choose(self):
+        """Returns the worker count with the best scaled throughput of the round.
+        """
+        top_items = max(r[1] for r in self.__rates) or 1.0
+        top_bytes = max(r[2] for r in self.__rates) or 1.0
+        best, best_score = None, None
+        for workers, items, nbytes in sorted(self.__rates):
+            score = items / top_items + nbytes / top_bytes
+            if best is None or score > best_score * (1 + MARGIN):
+                best, best_score = workers, score
+        return best
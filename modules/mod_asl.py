@@ -10,9 +10,6 @@ import subprocess
 import sys
 from collections import OrderedDict
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import data_writer, forensic_mode, inputdir, quiet
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import stats2
 from .common.xmltodict import xmltodict
@@ -99,16 +96,16 @@ def asl_parse(logfile, logdata, headers, output):
             output.write_record(record)
 
 
-def module():
+def module(ctx):
     os.environ['TZ'] = 'UTC0'
 
     headers = ["ASLMessageID", "Time", "TimeNanoSec", "Level", "PID", "UID", 
         "GID", "ReadGID", "Host", "Sender", "Facility", "Message", "ut_user", "ut_id"
         "ut_line", "ut_pid", "ut_type", "ut_tv.tv_sec", "ut_tv.tv_usec"
         "SenderMachUUID", "ASLExpireTime"]
-    output = data_writer(_modName, headers)
+    output = ctx.data_writer(_modName, headers)
 
-    asl_loc = os.path.join(inputdir, 'private/var/log/asl/*.asl')
+    asl_loc = os.path.join(ctx.inputdir, 'private/var/log/asl/*.asl')
     varlogasl_inputdir = glob.glob(asl_loc)
 
     if len(varlogasl_inputdir) == 0:
@@ -144,5 +141,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
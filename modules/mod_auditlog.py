@@ -11,25 +11,22 @@ import xml.etree.ElementTree as ET
 from collections import OrderedDict
 from datetime import datetime
 
-# KEEP THIS - IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import data_writer, forensic_mode, inputdir, outputdir, quiet
-
 _modName = __name__.split('_')[-1]
 _modVers = '1.0.1'
 log = logging.getLogger(_modName)
 
 
-def module():
+def module(ctx):
 
     _headers = ['src_file', 'timestamp', 'version', 'event', 'modifier',
                 'msec', 'audit_uid', 'uid', 'gid', 'ruid', 'rgid',
                 'pid', 'sid', 'tid', 'errval', 'retval', 'text_fields']
-    _output = data_writer(_modName, _headers)
+    _output = ctx.data_writer(_modName, _headers)
 
     os.environ['TZ'] = 'UTC0'
 
     auditlog_loc = 'private/var/audit/*'
-    auditlog_inputdir = glob.glob(os.path.join(inputdir, auditlog_loc))
+    auditlog_inputdir = glob.glob(os.path.join(ctx.inputdir, auditlog_loc))
 
     if len(auditlog_inputdir) == 0:
         log.debug("Files not found in: {0}".format(auditlog_loc))
@@ -115,5 +112,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
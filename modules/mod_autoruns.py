@@ -4,7 +4,6 @@ programs that are ultimate run on login or system startup.
 """
 
 import ast
-import hashlib
 import logging
 import os
 import plistlib
@@ -12,11 +11,6 @@ import sys
 import traceback
 from collections import OrderedDict
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-                      hash_alg, hash_size_limit, inputdir, no_code_signatures,
-                      no_tarball, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import (get_codesignatures, multiglob, read_bplist,
                                stats2)
@@ -26,78 +20,12 @@ _modName = __name__.split('_')[-1]
 _modVers = '1.0.3'
 log = logging.getLogger(_modName)
 
-ncs = no_code_signatures
-
-# determine which hashing algorithms to run
-if type(hash_alg) is list:
-    hash_alg = [''.join([x.lower() for x in i]) for i in hash_alg]
-elif type(hash_alg) is str:
-    hash_alg = [hash_alg]
-
 
 class BplistError(Exception):
     pass
 
-def shasum(filename, filesize, block_size=65536):
-    """
-    Returns the string representation of the sha256 of a file. Assumes file exists.
-    """
-    if filesize <= hash_size_limit and filesize > 0:
-        sha256 = hashlib.sha256()
-        try:
-            with open(filename, 'rb') as f:
-                for block in iter(lambda: f.read(block_size), b''):
-                    sha256.update(block)
-            sha256 = sha256.hexdigest()
-        except Exception:
-            sha256 = 'ERROR'
-    else:
-        sha256 = ''
-    return sha256
-
-
-def md5sum(filename, filesize, block_size=65536):
-    """
-    Returns the string representation of the md5 of a file. Assumes file exists.
-    """
-    if filesize <= hash_size_limit and filesize > 0:
-        md5 = hashlib.md5()
-        try:
-            with open(filename, 'rb') as f:
-                for block in iter(lambda: f.read(block_size), b''):
-                    md5.update(block)
-            md5 = md5.hexdigest()
-        except Exception:
-            md5 = 'ERROR'
-    else:
-        md5 = ''
-    return md5
-
-def get_hashes(filepath, hash_alg):
-    """
-    Returns the hashes specified in the list hash_alg for the file at filepath.
-    """
-    hashes = {'sha256': '', 'md5': ''}
-    if "none" not in hash_alg:
-        size = stats2(filepath)['size']
-        if size == "ERROR":
-            return hashes
-        if 'sha256' in hash_alg:
-            try:
-                hashes['sha256'] = shasum(filepath, size)
-            except Exception:
-                log.debug("Could not hash {0}: {1}".format(filepath, [traceback.format_exc()]))
-                hashes['sha256'] = 'ERROR'
-        if 'md5' in hash_alg:
-            try:
-                hashes['md5'] = md5sum(filepath, size)
-            except Exception:
-                log.debug("Could not hash {0}: {1}".format(filepath, [traceback.format_exc()]))
-                hashes['md5'] = 'ERROR'
-    return hashes
-
-def parse_sandboxed_loginitems(headers, output):
-    sandboxed_loginitems = multiglob(inputdir, ['var/db/com.apple.xpc.launchd/disabled.*.plist'])
+def parse_sandboxed_loginitems(ctx, headers, output):
+    sandboxed_loginitems = multiglob(ctx.inputdir, ['var/db/com.apple.xpc.launchd/disabled.*.plist'])
 
     for i in sandboxed_loginitems:
         record = OrderedDict((h, '') for h in headers)
@@ -129,8 +57,8 @@ def parse_sandboxed_loginitems(headers, output):
             record.update(errors)
 
 
-def parse_cron(headers, output):
-    cron = multiglob(inputdir, ['private/var/at/tabs/*'])
+def parse_cron(ctx, headers, output):
+    cron = multiglob(ctx.inputdir, ['private/var/at/tabs/*'])
 
     for i in cron:
         record = OrderedDict((h, '') for h in headers)
@@ -146,10 +74,10 @@ def parse_cron(headers, output):
                 output.write_record(record)
 
 
-def parse_LaunchAgentsDaemons(headers, output):
-    LaunchAgents = multiglob(inputdir, ['System/Library/LaunchAgents/*.plist', 'Library/LaunchAgents/*.plist', 'Users/*/Library/LaunchAgents/*.plist', 'private/var/*/Library/LaunchAgents/*.plist',
+def parse_LaunchAgentsDaemons(ctx, headers, output):
+    LaunchAgents = multiglob(ctx.inputdir, ['System/Library/LaunchAgents/*.plist', 'Library/LaunchAgents/*.plist', 'Users/*/Library/LaunchAgents/*.plist', 'private/var/*/Library/LaunchAgents/*.plist',
                                         'System/Library/LaunchAgents/.*.plist', 'Library/LaunchAgents/.*.plist', 'Users/*/Library/LaunchAgents/.*.plist', 'private/var/*/Library/LaunchAgents/.*.plist'])
-    LaunchDaemons = multiglob(inputdir, ['System/Library/LaunchDaemons/*.plist', 'Library/LaunchDaemons/*.plist',
+    LaunchDaemons = multiglob(ctx.inputdir, ['System/Library/LaunchDaemons/*.plist', 'Library/LaunchDaemons/*.plist',
                                          'System/Library/LaunchDaemons/.*.plist', 'Library/LaunchDaemons/.*.plist'])
 
     for i in LaunchDaemons + LaunchAgents:
@@ -215,10 +143,10 @@ def parse_LaunchAgentsDaemons(headers, output):
 
             # If program is ID'd, run additional checks.
             if program:
-                cs_check_path = os.path.join(inputdir, program.lstrip('/'))
-                record['code_signatures'] = str(get_codesignatures(cs_check_path, ncs))
+                cs_check_path = os.path.join(ctx.inputdir, program.lstrip('/'))
+                record['code_signatures'] = str(get_codesignatures(cs_check_path, ctx.no_code_signatures))
 
-                hashset = get_hashes(program, hash_alg)
+                hashset = ctx.hasher.hash(program)
                 record['sha256'] = hashset['sha256']
                 record['md5'] = hashset['md5']
 
@@ -229,8 +157,8 @@ def parse_LaunchAgentsDaemons(headers, output):
         output.write_record(record)
 
 
-def parse_ScriptingAdditions(headers, output):
-    ScriptingAdditions = multiglob(inputdir, ['System/Library/ScriptingAdditions/*.osax', 'Library/ScriptingAdditions/*.osax',
+def parse_ScriptingAdditions(ctx, headers, output):
+    ScriptingAdditions = multiglob(ctx.inputdir, ['System/Library/ScriptingAdditions/*.osax', 'Library/ScriptingAdditions/*.osax',
                                               'System/Library/ScriptingAdditions/.*.osax', 'Library/ScriptingAdditions/.*.osax'])
 
     for i in ScriptingAdditions:
@@ -239,12 +167,12 @@ def parse_ScriptingAdditions(headers, output):
         record.update(metadata)
         record['src_file'] = i
         record['src_name'] = "scripting_additions"
-        record['code_signatures'] = str(get_codesignatures(i, ncs))
+        record['code_signatures'] = str(get_codesignatures(i, ctx.no_code_signatures))
         output.write_record(record)
 
 
-def parse_StartupItems(headers, output):
-    StartupItems = multiglob(inputdir, ['System/Library/StartupItems/*/*', 'Library/StartupItems/*/*'])
+def parse_StartupItems(ctx, headers, output):
+    StartupItems = multiglob(ctx.inputdir, ['System/Library/StartupItems/*/*', 'Library/StartupItems/*/*'])
 
     for i in StartupItems:
         record = OrderedDict((h, '') for h in headers)
@@ -256,10 +184,10 @@ def parse_StartupItems(headers, output):
         output.write_record(record)
 
 
-def parse_PeriodicItems_rcItems_emondItems(headers, output):
-    PeriodicItems = multiglob(inputdir, ['private/etc/periodic.conf', 'private/etc/periodic/*/*', 'private/etc/*.local'])
-    rcItems = multiglob(inputdir, ['private/etc/rc.common'])
-    emondItems = multiglob(inputdir, ['private/etc/emond.d/*', 'private/etc/emond.d/*/*'])
+def parse_PeriodicItems_rcItems_emondItems(ctx, headers, output):
+    PeriodicItems = multiglob(ctx.inputdir, ['private/etc/periodic.conf', 'private/etc/periodic/*/*', 'private/etc/*.local'])
+    rcItems = multiglob(ctx.inputdir, ['private/etc/rc.common'])
+    emondItems = multiglob(ctx.inputdir, ['private/etc/emond.d/*', 'private/etc/emond.d/*/*'])
 
     for i in PeriodicItems + rcItems + emondItems:
         record = OrderedDict((h, '') for h in headers)
@@ -271,8 +199,8 @@ def parse_PeriodicItems_rcItems_emondItems(headers, output):
         output.write_record(record)
 
 
-def parse_loginitems(headers, output):
-    user_loginitems_plist = multiglob(inputdir, ['Users/*/Library/Preferences/com.apple.loginitems.plist', 'private/var/*/Library/Preferences/com.apple.loginitems.plist'])
+def parse_loginitems(ctx, headers, output):
+    user_loginitems_plist = multiglob(ctx.inputdir, ['Users/*/Library/Preferences/com.apple.loginitems.plist', 'private/var/*/Library/Preferences/com.apple.loginitems.plist'])
 
     for i in user_loginitems_plist:
         record = OrderedDict((h, '') for h in headers)
@@ -309,14 +237,14 @@ def parse_loginitems(headers, output):
                         for i in range(len(c)):
                             l = int(c[i], 16)
                             if l < len(c) and l > 2:
-                                test = os.path.join(inputdir, (''.join(c[i + 1:i + l + 1])).decode('hex'))
+                                test = os.path.join(ctx.inputdir, (''.join(c[i + 1:i + l + 1])).decode('hex'))
                                 try:
                                     if not os.path.exists(test):
                                         continue
                                     else:
                                         record['program'] = test
-                                        cs_check_path = os.path.join(inputdir, test.lstrip('/'))
-                                        record['code_signatures'] = str(get_codesignatures(cs_check_path, ncs))
+                                        cs_check_path = os.path.join(ctx.inputdir, test.lstrip('/'))
+                                        record['code_signatures'] = str(get_codesignatures(cs_check_path, ctx.no_code_signatures))
 
                                 except Exception:
                                     record['program'] = 'ERROR'
@@ -337,8 +265,8 @@ def parse_loginitems(headers, output):
                         if d is not None:
                             prog = d.split(';')[-1].replace('\x00', '')
                             record['program'] = prog
-                            cs_check_path = os.path.join(inputdir, prog.lstrip('/'))
-                            record['code_signatures'] = str(get_codesignatures(cs_check_path, ncs))
+                            cs_check_path = os.path.join(ctx.inputdir, prog.lstrip('/'))
+                            record['code_signatures'] = str(get_codesignatures(cs_check_path, ctx.no_code_signatures))
 
                 output.write_record(record)
         else:
@@ -346,22 +274,20 @@ def parse_loginitems(headers, output):
             record.update(errors)
 
 
-def module():
+def module(ctx):
     headers = ['mtime', 'atime', 'ctime', 'btime', 'src_name', 'src_file', 'prog_name', 'program', 'args', 'code_signatures', 'sha256', 'md5']
-    output = data_writer(_modName, headers)
-
-    parse_sandboxed_loginitems(headers, output)
-    parse_loginitems(headers, output)
-    parse_cron(headers, output)
-    parse_LaunchAgentsDaemons(headers, output)
-    parse_StartupItems(headers, output)
-    parse_ScriptingAdditions(headers, output)
-    parse_PeriodicItems_rcItems_emondItems(headers, output)
+    output = ctx.data_writer(_modName, headers)
+
+    parse_sandboxed_loginitems(ctx, headers, output)
+    parse_loginitems(ctx, headers, output)
+    parse_cron(ctx, headers, output)
+    parse_LaunchAgentsDaemons(ctx, headers, output)
+    parse_StartupItems(ctx, headers, output)
+    parse_ScriptingAdditions(ctx, headers, output)
+    parse_PeriodicItems_rcItems_emondItems(ctx, headers, output)
     output.flush_record()
 
 if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
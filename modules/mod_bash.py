@@ -7,10 +7,6 @@ import io
 import sys
 from collections import OrderedDict
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-                      inputdir, no_tarball, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import multiglob, stats2
 
@@ -19,12 +15,12 @@ _modVers = '1.0.3'
 log = logging.getLogger(_modName)
 
 
-def module():
+def module(ctx):
     _headers = ['mtime', 'atime', 'ctime', 'btime',
                 'src_file', 'user', 'item_index', 'cmd']
-    output = data_writer(_modName, _headers)
+    output = ctx.data_writer(_modName, _headers)
 
-    user_inputdir = multiglob(inputdir, ['Users/*/.*_history', 'Users/*/.bash_sessions/*',
+    user_inputdir = multiglob(ctx.inputdir, ['Users/*/.*_history', 'Users/*/.bash_sessions/*',
                                'private/var/*/.*_history', 'private/var/*/.bash_sessions/*',])
 
     # Generate debug messages indicating users with history files to be parsed.
@@ -78,5 +74,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
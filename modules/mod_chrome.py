@@ -14,10 +14,6 @@ import traceback
 from collections import OrderedDict
 from string import printable
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-                      inputdir, no_tarball, outputdir, quiet, startTime)
-
 from .common.dateutil import parser
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import (SQLiteDB, chrome_time, finditem, firefox_time, multiglob,
@@ -41,10 +37,10 @@ def get_chrome_version(history_db):
     return ver
 
 
-def parse_visit_history(db_filepath, user, profile, urls_output, urls_headers):
+def parse_visit_history(ctx, db_filepath, user, profile, urls_output, urls_headers):
     # instantiate db wrapper
     db_wrapper = SQLiteDB()
-    if db_wrapper.open(db_filepath, outputdir) is False:
+    if db_wrapper.open(db_filepath, ctx.outputdir) is False:
         log.debug('Unable to open db {0}'.format(db_filepath))
         return
 
@@ -67,7 +63,7 @@ def parse_visit_history(db_filepath, user, profile, urls_output, urls_headers):
             'SELECT visit_time, urls.url, title, visit_duration, visit_count, \
             typed_count, urls.last_visit_time, term \
             from visits left join urls on visits.url = urls.id \
-                        left join keyword_search_terms on keyword_search_terms.url_id = urls.id', outputdir)
+                        left join keyword_search_terms on keyword_search_terms.url_id = urls.id', ctx.outputdir)
 
         log.debug("[Chrome visit history for - {0}] Found {1} lines of data.".format(profile, len(urls_data)))
 
@@ -88,32 +84,24 @@ def parse_visit_history(db_filepath, user, profile, urls_output, urls_headers):
     log.debug("Parsing and writing visits data...")
 
     for item in urls_data:
-        record = OrderedDict((h, '') for h in urls_headers)
-        item = list(item)
-        record['user'] = user
-        record['profile'] = profile
-        record['visit_time'] = chrome_time(item[0])
-        record['url'] = item[1]
-        record['title'] = "".join(filter(lambda char: char in printable, item[2]))
-        record['visit_duration'] = time.strftime("%H:%M:%S", time.gmtime(item[3] / 1000000))
-        record['visit_count'] = item[4]
-        record['typed_count'] = item[5]
-        record['last_visit_time'] = chrome_time(item[6])
         search_term = item[7]
-
-        if search_term is not None:
-            record['search_term'] = item[7]
-        else:
-            record['search_term'] = ''
-
-        urls_output.write_record(record)
+        if search_term is None:
+            search_term = ''
+
+        # columns in the order of urls_headers
+        urls_output.write_row((
+            user, profile, chrome_time(item[0]),
+            "".join(filter(lambda char: char in printable, item[2])), item[1], item[4],
+            chrome_time(item[6]), item[5], time.strftime("%H:%M:%S", time.gmtime(item[3] / 1000000)),
+            search_term
+        ))
     log.debug('[End] Finished executing Visit History query against {0} for user {1}'.format(db_filepath, user))
 
 
-def parse_download_history(db_filepath, user, profile, downloads_output, downloads_headers):
+def parse_download_history(ctx, db_filepath, user, profile, downloads_output, downloads_headers):
     # instantiate db wrapper
     db_wrapper = SQLiteDB()
-    if db_wrapper.open(db_filepath, outputdir) is False:
+    if db_wrapper.open(db_filepath, ctx.outputdir) is False:
         log.debug('Unable to open db {0}'.format(db_filepath))
         return
 
@@ -130,7 +118,7 @@ def parse_download_history(db_filepath, user, profile, downloads_output, downloa
         downloads_data = db_wrapper.query_db(db_filepath,
             'SELECT current_path, target_path, start_time, end_time, danger_type, opened, \
             last_modified, referrer, tab_url, tab_referrer_url, site_url, url from downloads \
-            left join downloads_url_chains on downloads_url_chains.id = downloads.id', outputdir)
+            left join downloads_url_chains on downloads_url_chains.id = downloads.id', ctx.outputdir)
 
         log.debug("[Chrome download history for - {0}] Found {1} lines of data.".format(profile, len(downloads_data)))
 
@@ -218,9 +206,9 @@ def get_extensions(extlist, user, prof, extensions_output, extensions_headers):
     log.debug("Completed writing extension data.")
 
 
-def module():
+def module(ctx):
     chrome_locations = glob.glob(
-        os.path.join(inputdir, 'Users/*/Library/Application Support/Google/Chrome/'))
+        os.path.join(ctx.inputdir, 'Users/*/Library/Application Support/Google/Chrome/'))
 
     # for all chrome dirs on disk, parse their local state files
 
@@ -228,7 +216,7 @@ def module():
                        'name', 'gaia_picture_file_name', 'user_name', 'managed_user_id', 'gaia_name',
                        'avatar_icon', 'gaia_id', 'local_auth_credentials', 'gaia_given_name',
                        'is_using_default_name', 'background_apps', 'is_ephemeral']
-    profile_output = data_writer('browser_chrome_profiles', profile_headers)
+    profile_output = ctx.data_writer('browser_chrome_profiles', profile_headers)
 
     for location in chrome_locations:
 
@@ -256,15 +244,15 @@ def module():
 
     urls_headers = ['user', 'profile', 'visit_time', 'title', 'url', 'visit_count', 'last_visit_time',
                     'typed_count', 'visit_duration', 'search_term']
-    urls_output = data_writer('browser_chrome_history', urls_headers)
+    urls_output = ctx.data_writer('browser_chrome_history', urls_headers, async_write=True)
 
     downloads_headers = ['user', 'profile', 'download_path', 'current_path', 'download_started', 'download_finished',
                          'danger_type', 'opened', 'last_modified', 'referrer', 'tab_url', 'tab_referrer_url',
                          'download_url', 'url']
-    downloads_output = data_writer('browser_chrome_downloads', downloads_headers)
+    downloads_output = ctx.data_writer('browser_chrome_downloads', downloads_headers)
 
     extensions_headers = ['user', 'profile', 'name', 'permissions', 'author', 'description', 'scripts', 'persistent', 'version']
-    extensions_output = data_writer('browser_chrome_extensions', extensions_headers)
+    extensions_output = ctx.data_writer('browser_chrome_extensions', extensions_headers)
 
     for prof in full_list:
 
@@ -280,11 +268,11 @@ def module():
         history_db_filepath = os.path.join(prof, 'History')
         if SQLiteDB.db_exists(history_db_filepath):
             try:
-                parse_visit_history(history_db_filepath, user, profile, urls_output, urls_headers)
+                parse_visit_history(ctx, history_db_filepath, user, profile, urls_output, urls_headers)
             except Exception:
                 log.error('Unable to parse visit history for user {0}, profile {1}: {2}'.format(user, profile, [traceback.format_exc()]))
             try:
-                parse_download_history(history_db_filepath, user, profile, downloads_output, downloads_headers)
+                parse_download_history(ctx, history_db_filepath, user, profile, downloads_output, downloads_headers)
             except Exception:
                 log.error('Unable to parse download history for user {0}, profile {1}: {2}'.format(user, profile, [traceback.format_exc()]))
 
@@ -297,16 +285,14 @@ def module():
     urls_output.flush_record()
 
     # clean up
-    if os.path.exists(os.path.join(outputdir, 'History-tmp_amtc')):
+    if os.path.exists(os.path.join(ctx.outputdir, 'History-tmp_amtc')):
         try:
-            os.remove(os.path.join(outputdir, 'History-tmp_amtc'))
+            os.remove(os.path.join(ctx.outputdir, 'History-tmp_amtc'))
         except OSError as e:
-            log.debug('Unable to clean up temp file {0}: '.format(os.path.join(outputdir, 'History-tmp_amtc')) + str(e))
+            log.debug('Unable to clean up temp file {0}: '.format(os.path.join(ctx.outputdir, 'History-tmp_amtc')) + str(e))
 
 
 if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
@@ -18,9 +18,6 @@ if sys.version_info[0] < 3:
 else:
     import configparser
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import data_writer, inputdir, outputdir
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.dateutil import parser
 from .common.functions import SQLiteDB, chrome_time, firefox_time, multiglob
@@ -66,7 +63,7 @@ def get_firefox_version(firefox_location, user, profile):
     return ver
 
 
-def pull_chrome_cookies(db_wrapper, db_filepath, user, profile, cookies_output, cookies_headers):
+def pull_chrome_cookies(ctx, db_wrapper, db_filepath, user, profile, cookies_output, cookies_headers):
     log.debug("[START] querying chrome cookies for user {0} profile {1}.".format(user, profile))
 
     cookies_data = []
@@ -74,7 +71,7 @@ def pull_chrome_cookies(db_wrapper, db_filepath, user, profile, cookies_output,
             is_httponly, has_expires, is_persistent, priority, encrypted_value, samesite, source_scheme \
             from cookies'
     try:
-        cookies_data = db_wrapper.query_db(db_filepath, query, outputdir)
+        cookies_data = db_wrapper.query_db(db_filepath, query, ctx.outputdir)
         log.debug("[Cookies - Chrome for {0}] Found {1} lines of data.".format(user, len(cookies_data)))
     except Exception:
         log.error("[Cookies - Chrome for {0}] Unable to query {1}: {2}".format(user, db_filepath, [traceback.format_exc()]))
@@ -116,7 +113,7 @@ def pull_chrome_cookies(db_wrapper, db_filepath, user, profile, cookies_output,
     log.debug("[END] querying chrome cookies for user {0} profile {1}.".format(user, profile))
 
 
-def pull_firefox_cookies(db_wrapper, db_filepath, user, profile, cookies_output, cookies_headers):
+def pull_firefox_cookies(ctx, db_wrapper, db_filepath, user, profile, cookies_output, cookies_headers):
     log.debug("[START] querying firefox cookies for user {0} profile {1}.".format(user, profile))
 
     cookies_data = []
@@ -124,7 +121,7 @@ def pull_firefox_cookies(db_wrapper, db_filepath, user, profile, cookies_output,
             isHttpOnly, inBrowserElement, sameSite \
             from moz_cookies'
     try:
-        cookies_data = db_wrapper.query_db(db_filepath, query, outputdir)
+        cookies_data = db_wrapper.query_db(db_filepath, query, ctx.outputdir)
         log.debug("[Cookies - Firefox for {0}] Found {1} lines of data.".format(user, len(cookies_data)))
     except Exception:
         log.error("[Cookies - Firefox for {0}] Unable to query {1}: {2}".format(user, db_filepath, [traceback.format_exc()]))
@@ -154,13 +151,13 @@ def pull_firefox_cookies(db_wrapper, db_filepath, user, profile, cookies_output,
     log.debug("[END] querying firefox cookies for user {0} profile {1}.".format(user, profile))
 
 
-def moduleFirefox(firefox_cookies_location):
+def moduleFirefox(ctx, firefox_cookies_location):
     log.debug("[START] Firefox cookies parsing")
 
     cookies_headers = ['user', 'profile', 'host_key', 'name', 'value', 'path',
                        'creation_utc', 'expires_utc', 'last_access_utc', 'is_secure',
                        'is_httponly', 'browser_element', "same_site"]
-    cookies_output = data_writer('browser_firefox_cookies', cookies_headers)
+    cookies_output = ctx.data_writer('browser_firefox_cookies', cookies_headers)
 
     for c in firefox_cookies_location:
         userpath = c.split('/')
@@ -175,14 +172,14 @@ def moduleFirefox(firefox_cookies_location):
         # cookies_db = connect_to_db(os.path.join(c, 'cookies.sqlite'))
         db_filepath = os.path.join(c, 'cookies.sqlite')
         db_wrapper = SQLiteDB()
-        db_wrapper.open(db_filepath, outputdir)
+        db_wrapper.open(db_filepath, ctx.outputdir)
 
         if db_wrapper.table_exists('moz_cookies') is False:
             log.debug("Firefox cookies required table 'moz_cookies' not found.")
         else:
-            pull_firefox_cookies(db_wrapper, db_filepath, user, profile, cookies_output, cookies_headers)
+            pull_firefox_cookies(ctx, db_wrapper, db_filepath, user, profile, cookies_output, cookies_headers)
 
-        for file in glob.glob(os.path.join(outputdir, '*cookies.sqlite*')):
+        for file in glob.glob(os.path.join(ctx.outputdir, '*cookies.sqlite*')):
             try:
                 os.remove(file)
             except OSError as e:
@@ -195,7 +192,7 @@ def moduleFirefox(firefox_cookies_location):
     log.debug("[END] Firefox cookies parsing")
 
 
-def moduleChrome(chrome_cookies_location):
+def moduleChrome(ctx, chrome_cookies_location):
     log.debug("[START] Chrome cookies parsing")
 
     # Generate list of all chrome profiles under all chrome directories
@@ -207,7 +204,7 @@ def moduleChrome(chrome_cookies_location):
                        'creation_utc', 'expires_utc', 'last_access_utc', 'is_secure',
                        'is_httponly', 'has_expires', 'is_persistent', 'priority',
                        'encrypted_value', 'samesite', 'source_scheme']
-    cookies_output = data_writer('browser_cookies_chrome', cookies_headers)
+    cookies_output = ctx.data_writer('browser_cookies_chrome', cookies_headers)
 
     for profile in full_list:
         userpath = profile.split('/')
@@ -221,14 +218,14 @@ def moduleChrome(chrome_cookies_location):
 
         db_filepath = os.path.join(profile, 'Cookies')
         db_wrapper = SQLiteDB()
-        db_wrapper.open(db_filepath, outputdir)
+        db_wrapper.open(db_filepath, ctx.outputdir)
 
         # Check if required table exists
         if db_wrapper.table_exists('cookies') is False:
             log.debug("Chrome Cookies required table '{0}' not found.".format('cookies'))
         else:
             get_chrome_version(db_filepath)
-            pull_chrome_cookies(db_wrapper, db_filepath, user, profile, cookies_output, cookies_headers)
+            pull_chrome_cookies(ctx, db_wrapper, db_filepath, user, profile, cookies_output, cookies_headers)
 
     # flush output
     cookies_output.flush_record()
@@ -244,20 +241,18 @@ def moduleChrome(chrome_cookies_location):
     log.debug("[END] Chrome cookies parsing")
 
 
-def module():
+def module(ctx):
     chrome_cookies_location = glob.glob(
-        os.path.join(inputdir, 'Users/*/Library/Application Support/Google/Chrome/')
+        os.path.join(ctx.inputdir, 'Users/*/Library/Application Support/Google/Chrome/')
     )
     firefox_cookies_location = glob.glob(
-        os.path.join(inputdir, 'Users/*/Library/Application Support/Firefox/Profiles/*.*')
+        os.path.join(ctx.inputdir, 'Users/*/Library/Application Support/Firefox/Profiles/*.*')
     )
-    moduleChrome(chrome_cookies_location)
-    moduleFirefox(firefox_cookies_location)
+    moduleChrome(ctx, chrome_cookies_location)
+    moduleFirefox(ctx, firefox_cookies_location)
 
 
 if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
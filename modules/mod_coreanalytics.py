@@ -7,19 +7,6 @@ from .common.functions import stats2
 from .common.functions import finditem
 from .common.functions import multiglob
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import inputdir
-from __main__ import outputdir
-from __main__ import forensic_mode
-from __main__ import no_tarball
-from __main__ import quiet
-
-from __main__ import archive
-from __main__ import startTime
-from __main__ import full_prefix
-from __main__ import OSVersion
-from __main__ import data_writer
-
 # MODULE-SPECIFIC IMPORTS
 import json
 import glob
@@ -46,10 +33,10 @@ _modVers = '1.0.4'
 log = logging.getLogger(_modName)
 
 
-def module():
+def module(ctx):
 
-    if OSVersion is not None:
-        ver = float('.'.join(OSVersion.split('.')[1:]))
+    if ctx.OSVersion is not None:
+        ver = float('.'.join(ctx.OSVersion.split('.')[1:]))
         if ver < 13:
             log.error("Artifact is not present below OS version 10.13.")
             return
@@ -67,9 +54,9 @@ def module():
                'activations', 'launches', 'activityPeriods', 'idleTimeouts', 'Uptime',
                'Count', 'version', 'identifier', 'overflow']
 
-    output = data_writer(_modName, headers)
+    output = ctx.data_writer(_modName, headers)
 
-    analytics_location = multiglob(inputdir, ['Library/Logs/DiagnosticReports/Analytics*.core_analytics',
+    analytics_location = multiglob(ctx.inputdir, ['Library/Logs/DiagnosticReports/Analytics*.core_analytics',
     								          'Library/Logs/DiagnosticReports/Retired/Analytics*.core_analytics'])
 
     if len(analytics_location) < 1:
@@ -138,7 +125,7 @@ def module():
             counter += 1
 
     # Parse aggregate files either from their directory on disk.
-    agg_location = glob.glob(os.path.join(inputdir,'private/var/db/analyticsd/aggregates/4d7c9e4a-8c8c-4971-bce3-09d38d078849'))
+    agg_location = glob.glob(os.path.join(ctx.inputdir,'private/var/db/analyticsd/aggregates/4d7c9e4a-8c8c-4971-bce3-09d38d078849'))
 
     if ver > 13.6:
         log.debug("Cannot currently parse aggregate file above OS version 10.13.6.")
@@ -229,7 +216,7 @@ def module():
 
 """EXPERIMENTAL"""
 # Artifact data changed from OS10.14 - 10.15
-def parseCatalina():
+def parseCatalina(ctx):
     crashreporter_headers = [
     'crashreporter_key',
     'crashreporter_timestamp',
@@ -268,10 +255,10 @@ def parseCatalina():
     'event-message-uuid',
     'EXTRA',
     ]
-    crashreporter_output = data_writer("EXPERIMENTAL_"+ _modName+"crashreporter", crashreporter_headers)
-    message_output = data_writer("EXPERIMENTAL_"+ _modName+"messages", message_headers)
-    event_output = data_writer("EXPERIMENTAL_"+ _modName+"events", event_headers)
-    analytics_files = multiglob(inputdir, ['Library/Logs/DiagnosticReports/Analytics*.core_analytics',
+    crashreporter_output = ctx.data_writer("EXPERIMENTAL_"+ _modName+"crashreporter", crashreporter_headers)
+    message_output = ctx.data_writer("EXPERIMENTAL_"+ _modName+"messages", message_headers)
+    event_output = ctx.data_writer("EXPERIMENTAL_"+ _modName+"events", event_headers)
+    analytics_files = multiglob(ctx.inputdir, ['Library/Logs/DiagnosticReports/Analytics*.core_analytics',
     								          'Library/Logs/DiagnosticReports/Retired/Analytics*.core_analytics'])
 
     if len(analytics_files) < 1:
@@ -345,5 +332,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
@@ -14,7 +14,9 @@ from __future__ import print_function
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import (get_codesignatures, multiglob,
 								read_stream_bplist, stats2,
-								MultiprocessingPool)
+								WorkerQueue)
+from .common.output import Schema
+from .common.tuner import WorkerTuner
 
 try:
 	from xattr import getxattr, listxattr
@@ -22,10 +24,8 @@ except Exception:
 	from .common.dep.xattr import getxattr, listxattr
 
 
-# IMPORT STATIC VARIABLES FROM MAIN
 import errno
 import glob
-import hashlib
 import itertools
 import logging
 import os
@@ -33,12 +33,16 @@ import sys
 import traceback
 from collections import OrderedDict
 from datetime import datetime
+from multiprocessing import cpu_count
+from stat import S_ISDIR, S_ISLNK
 
-from __main__ import (archive, data_writer, debug, dirlist_exclude_dirs,
-						dirlist_include_dirs, dirlist_no_multithreading,
-						forensic_mode, full_prefix, hash_alg, hash_size_limit,
-						inputdir, inputsysdir, no_code_signatures, no_tarball,
-						outputdir, quiet, rtr, recurse_bundles, startTime, verbose)
+try:
+	from os import scandir
+except ImportError:
+	try:
+		from scandir import scandir
+	except ImportError:
+		scandir = None
 
 if sys.version_info[0] < 3:
 	import Foundation
@@ -60,46 +64,12 @@ FORENSIC_DIR_EXCLUDE = [  	# must be file paths glob format from root (not simpl
 	'.fseventsd', '.DocumentRevisions-V100', '.Spotlight-V100'
 ]
 OUTPUT_BUFFER_CAP = 100000  # cap num entries to keep in output buffer
-WORKERS = 5  				# number of parallel threads to run when multithreading
+CHECKPOINT_ENTRIES = 20000  # files & dirs parsed between two checkpoints of the output
+QUEUE_ENTRIES = 10000  		# cap num files & dirs walked ahead of the parse workers
+WORKERS = 5  				# number of parallel threads the worker tuner starts from
 HEADERS = ['mode', 'size', 'owner', 'uid', 'gid', 'mtime', 'atime', 'ctime', 'btime', 'path', 'name', 'sha256', 'md5', 'quarantine', 'wherefrom_1', 'wherefrom_2', 'downloaddate', 'code_signatures']
-counter = 0
-output = None
-
-
-def _shasum(filename, filesize, block_size=65536):
-	"""
-	Returns the string representation of the sha256 of a file. Assumes file exists.
-	"""
-	if filesize <= hash_size_limit and filesize > 0:
-		sha256 = hashlib.sha256()
-		try:
-			with open(filename, 'rb') as f:
-				for block in iter(lambda: f.read(block_size), b''):
-					sha256.update(block)
-			sha256 = sha256.hexdigest()
-		except Exception:
-			sha256 = 'ERROR'
-	else:
-		sha256 = ''
-	return sha256
-
-
-def _md5sum(filename, filesize, block_size=65536):
-	"""
-	Returns the string representation of the md5 of a file. Assumes file exists.
-	"""
-	if filesize <= hash_size_limit and filesize > 0:
-		md5 = hashlib.md5()
-		try:
-			with open(filename, 'rb') as f:
-				for block in iter(lambda: f.read(block_size), b''):
-					md5.update(block)
-			md5 = md5.hexdigest()
-		except Exception:
-			md5 = 'ERROR'
-	else:
-		md5 = ''
-	return md5
+SCHEMA = Schema(HEADERS)
+COLUMN = SCHEMA.index
 
 
 def _xattr_get(fullpath, attr_name):
@@ -140,6 +110,79 @@ def _xattr_get(fullpath, attr_name):
 	return None  # caller must handle
 
 
+class _ListdirEntry(object):
+	"""
+	Stand-in for os.DirEntry on python 2 without the scandir package
+	"""
+	def __init__(self, dirpath, name):
+		self.name = name
+		self.path = os.path.join(dirpath, name)
+		self.__lstat = None
+
+	def stat(self, follow_symlinks=True):
+		if follow_symlinks:
+			return os.stat(self.path)
+		if self.__lstat is None:
+			self.__lstat = os.lstat(self.path)
+		return self.__lstat
+
+	def is_dir(self, follow_symlinks=True):
+		try:
+			mode = self.stat(follow_symlinks=False).st_mode
+			if follow_symlinks and S_ISLNK(mode):
+				mode = os.stat(self.path).st_mode
+			return S_ISDIR(mode)
+		except OSError:
+			return False
+
+	def is_symlink(self):
+		try:
+			return S_ISLNK(self.stat(follow_symlinks=False).st_mode)
+		except OSError:
+			return False
+
+
+def _listdir(dirpath):
+	"""
+	Returns the entries of dirpath, as os.DirEntry objects where scandir is available
+	"""
+	if scandir is not None:
+		return list(scandir(dirpath))
+	return [_ListdirEntry(dirpath, name) for name in os.listdir(dirpath)]
+
+
+def _walk(top):
+	"""
+	Walks the tree under top like os.walk(top, topdown=True), yielding (dirpath, dirs, files)
+	with dirs and files as lists of directory entries. Entries removed from dirs are not walked.
+	Symlinks to directories are listed in dirs but not walked, unreadable directories are skipped.
+	"""
+	stack = [top]
+	while stack:
+		dirpath = stack.pop()
+		try:
+			entries = _listdir(dirpath)
+		except OSError:
+			continue
+
+		dirs = []
+		files = []
+		for entry in entries:
+			try:
+				is_dir = entry.is_dir()
+			except OSError:
+				is_dir = False
+			if is_dir:
+				dirs.append(entry)
+			else:
+				files.append(entry)
+
+		yield dirpath, dirs, files
+
+		# walk the subdirs depth first, in listing order
+		stack.extend(reversed([entry.path for entry in dirs if not entry.is_symlink()]))
+
+
 def _is_valid_dir(dir):
 	"""
 	Returns True if directory should be included in parse set.
@@ -210,39 +253,37 @@ def _get_downloaddate_xattr(fullpath):
 	return ''
 
 
-def parse_file(file):
+def parse_file(ctx, output, entry):
 	"""
-	Parses a file (filepath) and writes output
+	Parses a file (directory entry from the walker) and writes output
 	"""
+	file = entry.path
 	try:
-		global counter
-		counter += 1
-
-		record = OrderedDict((h, '') for h in HEADERS)
-		stat = os.lstat(file)  # one os.stat call
+		record = SCHEMA.new_row()
+		stat = entry.stat(follow_symlinks=False)  # one os.lstat call, cached by the entry
 
 		# get timestamps and metadata for each file
 		stat_data = stats2(file, stat=stat)
-		record.update(stat_data)
+		for key, value in stat_data.items():
+			record[COLUMN[key]] = value
 
 		# get quarantine extended attribute for each file, if available
 		if stat_data['mode'] != "Other":
-			record['quarantine'] = _get_quarantine_xattr(file)
+			record[COLUMN['quarantine']] = _get_quarantine_xattr(file)
 
 		# get wherefrom extended attribute for each file, if available
 		wf1, wf2 = _get_wherefrom_xattr(file)
-		record['wherefrom_1'] = wf1
-		record['wherefrom_2'] = wf2
+		record[COLUMN['wherefrom_1']] = wf1
+		record[COLUMN['wherefrom_2']] = wf2
 
 		# get downloaddate extended attribute for each file, if available
-		record['downloaddate'] = _get_downloaddate_xattr(file)
+		record[COLUMN['downloaddate']] = _get_downloaddate_xattr(file)
 
 		# if hash alg is specified 'none' at amtc runtime, do not hash files. else do sha256 and md5 as specified (sha256 is default at runtime, md5 is user-specified)
-		if "none" not in hash_alg and stat_data['mode'] == "Regular File":
-			if 'sha256' in hash_alg:
-				record['sha256'] = _shasum(file, record['size'])
-			if 'md5' in hash_alg:
-				record['md5'] = _md5sum(file, record['size'])
+		if ctx.hasher and stat_data['mode'] == "Regular File":
+			hashes = ctx.hasher.hash(file, stat)  # one read of the file for all digests
+			record[COLUMN['sha256']] = hashes['sha256']
+			record[COLUMN['md5']] = hashes['md5']
 
 	except EnvironmentError as e:  # Optionally log this
 		if e.errno == errno.ENOENT:
@@ -259,40 +300,38 @@ def parse_file(file):
 			'Unhandled exception in worker process: {0} - {1}'.format(str(e), [traceback.format_exc()])
 		)
 	finally:
-		if quiet is False and rtr is False:
-			if debug:
-				sys.stdout.write('dirlist        : INFO     Parsed %d files & dirs in %s | FileName: %s \033[K\r' % (counter, datetime.utcnow() - startTime, file))
+		if ctx.quiet is False and ctx.rtr is False:
+			if ctx.debug:
+				sys.stdout.write('dirlist        : INFO     Parsed %d files & dirs in %s | FileName: %s \033[K\r' % (output.count() + 1, datetime.utcnow() - ctx.startTime, file))
 			else:
-				sys.stdout.write('dirlist        : INFO     Parsed %d files & dirs in %s \r' % (counter, datetime.utcnow() - startTime))
+				sys.stdout.write('dirlist        : INFO     Parsed %d files & dirs in %s \r' % (output.count() + 1, datetime.utcnow() - ctx.startTime))
 			sys.stdout.flush()
 
-		global output
-		output.write_record(record, buffer_cap=OUTPUT_BUFFER_CAP)
+		output.write_row(record, buffer_cap=OUTPUT_BUFFER_CAP)
 
 
-def parse_dir(dir):
+def parse_dir(ctx, output, entry):
 	"""
-	Parses a directory (full filepath) and writes output
+	Parses a directory (directory entry from the walker) and writes output
 	"""
+	dir = entry.path
 	try:
-		global counter
-		counter += 1
-
-		record = OrderedDict((h, '') for h in HEADERS)
-		stat = os.lstat(dir)  # one os.stat call
+		record = SCHEMA.new_row()
+		stat = entry.stat(follow_symlinks=False)  # one os.lstat call, cached by the entry
 
 		# get timestamps and metadata for each dir
 		stat_data = stats2(dir, stat=stat)
-		record.update(stat_data)
+		for key, value in stat_data.items():
+			record[COLUMN[key]] = value
 
 		# bundles that will be code-sig checked
-		if no_code_signatures is False and os.path.splitext(dir)[1].lower() in CHECK_SIGNATURE_BUNDLES and not dir.startswith('.'):
+		if ctx.no_code_signatures is False and os.path.splitext(dir)[1].lower() in CHECK_SIGNATURE_BUNDLES and not dir.startswith('.'):
 			print("\nSTART Code Sig: {0}\n".format(dir))
 			try:
-				record['code_signatures'] = str(get_codesignatures(dir))
+				record[COLUMN['code_signatures']] = str(get_codesignatures(dir))
 			except Exception as e:
 				log.error("Dirlist Codesig: {0}".format(str(e)))
-				record['code_signatures'] = 'ERROR'
+				record[COLUMN['code_signatures']] = 'ERROR'
 			print("\nEND Code Sig: {0}\n".format(dir))
 
 	except EnvironmentError as e:    # TODO: Do we log this?
@@ -305,19 +344,28 @@ def parse_dir(dir):
 			'Unhandled exception in worker process: {0} - {1}'.format(str(e), [traceback.format_exc()])
 		)
 	finally:
-		if quiet is False and rtr is False:
-			if debug:
-				sys.stdout.write('dirlist        : INFO     Parsed %d files & dirs in %s | FileName: %s \033[K\r' % (counter, datetime.utcnow() - startTime, dir))
+		if ctx.quiet is False and ctx.rtr is False:
+			if ctx.debug:
+				sys.stdout.write('dirlist        : INFO     Parsed %d files & dirs in %s | FileName: %s \033[K\r' % (output.count() + 1, datetime.utcnow() - ctx.startTime, dir))
 			else:
-				sys.stdout.write('dirlist        : INFO     Parsed %d files & dirs in %s \r' % (counter, datetime.utcnow() - startTime))
+				sys.stdout.write('dirlist        : INFO     Parsed %d files & dirs in %s \r' % (output.count() + 1, datetime.utcnow() - ctx.startTime))
 			sys.stdout.flush()
 
-		global output
-		output.write_record(record, buffer_cap=OUTPUT_BUFFER_CAP)
+		output.write_row(record, buffer_cap=OUTPUT_BUFFER_CAP)
 
 
-if __name__ != "__main__":
-	output = data_writer(_modName, HEADERS)
+def module(ctx):
+	output = ctx.data_writer(_modName, SCHEMA, resume=True, async_write=True)
+	inputdir = ctx.inputdir
+	inputsysdir = ctx.inputsysdir
+	forensic_mode = ctx.forensic_mode
+	dirlist_include_dirs = ctx.dirlist_include_dirs
+	dirlist_exclude_dirs = list(ctx.dirlist_exclude_dirs)
+	hash_alg = ctx.hash_alg
+	quiet = ctx.quiet
+	rtr = ctx.rtr
+	debug = ctx.debug
+	verbose = ctx.verbose
 
 	inputdir_list = [inputdir, inputsysdir]  	# 10.15+ style fs roots
 	root_list = []  							# these are the 'roots' we will recurse
@@ -335,6 +383,8 @@ if __name__ != "__main__":
 			if idir == '':
 				continue
 			root_list += glob.glob(idir)
+			if output.resumed:
+				continue
 			record = OrderedDict((h, '') for h in HEADERS)
 			stat_data = stats2(idir)
 			record.update(stat_data)
@@ -372,12 +422,6 @@ if __name__ != "__main__":
 	dir_exclude_set = set(dir_exclude_list)
 	log.debug("The following directories will be excluded from dirlist enumeration: {0}".format(dir_exclude_list))
 
-	# determine which hashing algorithms to run
-	if type(hash_alg) is list:
-		hash_alg = [''.join([x.lower() for x in i]) for i in hash_alg]
-	elif type(hash_alg) is str:
-		hash_alg = [hash_alg]
-
 	if debug or verbose:
 		log.debug("inputdir_list: %s", inputdir_list)
 		log.debug("root_list: %s", root_list)
@@ -387,63 +431,80 @@ if __name__ != "__main__":
 		log.debug("default_exclude: %s", default_exclude)
 		log.debug("hash_alg: %s", hash_alg)
 
+	# directories whose files and subdirs were written by an interrupted run,
+	# each checkpoint holds the directories walked since the previous one
+	done = output.resumed_state('dirs')
+	if done:
+		log.info("Resuming after {0} directories parsed before.".format(len(done)))
+
+	# the walker queues files & dirs as it finds them, parse workers drain the queue concurrently.
+	# entries are parsed with the stat data of the walker's directory entries
+	# the number of parse workers is tuned to the throughput measured while walking, within -WN and -WX.
+	# -WX is capped at the number of CPU cores, but never below the WORKERS the tuner starts from
+	max_workers = max(WORKERS, cpu_count())
+	if ctx.dirlist_max_workers:
+		max_workers = min(ctx.dirlist_max_workers, max_workers)
+	min_workers = min(ctx.dirlist_min_workers, max_workers)
+	workers = 0 if ctx.dirlist_no_multithreading else min(max(WORKERS, min_workers), max_workers)
+	pipeline = WorkerQueue(lambda parse, entry: parse(ctx, output, entry), workers, QUEUE_ENTRIES)
+	tuner = None
+	if workers and max_workers > min_workers:
+		tuner = WorkerTuner(pipeline, min_workers, max_workers, output.count, lambda: ctx.hasher.bytes_read, start=workers)
 	file_count = 0
 	dir_count = 0
-	filepaths = []
-	dirpaths = []
+	queued = 0
+	walked = []
 	start = datetime.now()
-	for root in root_list:
-		for dirpath, dirnames, filenames in os.walk(root, topdown=True):
-			# exclude directories and files, must use topdown=True
-			dirnames[:] = list(filter(lambda x: x not in dir_exclude_set, dirnames))
-			dirnames[:] = list(filter(lambda x: _is_valid_dir(x), dirnames))
-			filenames[:] = list(filter(lambda x: _is_valid_file(x), filenames))
-
-			# Convert filenames to full paths
-			full_path_fnames = map(lambda fn: os.path.join(dirpath, fn), filenames)
-			filepaths.extend(list(full_path_fnames))
-			file_count += len(filenames)
-
-			full_path_dirnames = map(lambda dr: os.path.join(dirpath, dr), dirnames)
-			dirpaths.extend(list(full_path_dirnames))
-			dir_count += len(dirnames)
-
-			if quiet is False and rtr is False:
-				sys.stdout.write('dirlist        : INFO	 Found %d files & dirs in %s \r' % (file_count + dir_count, datetime.utcnow() - startTime))
-				sys.stdout.flush()
+	try:
+		for root in root_list:
+			for dirpath, dirs, files in _walk(root):
+				# exclude directories and files before they are walked
+				dirs[:] = [d for d in dirs if d.path not in dir_exclude_set and _is_valid_dir(d.name)]
+				files = [f for f in files if _is_valid_file(f.name)]
+
+				file_count += len(files)
+				dir_count += len(dirs)
+				if dirpath in done:
+					continue
+
+				# measure before queueing, an empty queue means the workers wait for the walker
+				if tuner is not None:
+					tuner.tick()
+
+				# each subdir is written along with the files of its parent, before it is walked
+				for entry in files:
+					pipeline.put(parse_file, entry)
+				for entry in dirs:
+					pipeline.put(parse_dir, entry)
+				queued += len(files) + len(dirs)
+				walked.append(dirpath)
+
+				# wait for the parsed entries and checkpoint the output, so that an interrupted run resumes from here
+				if queued >= CHECKPOINT_ENTRIES:
+					pipeline.join()
+					output.checkpoint(dirs=walked)
+					queued = 0
+					walked = []
+					if tuner is not None:
+						tuner.reset()  # the workers idled while the queue drained
+	finally:
+		pipeline.close()
 
 	if debug or verbose:
-		log.debug("time to walk: %s", (datetime.now() - start))
 		log.info("found {0} files/folders                   ".format(file_count + dir_count))
-		log.info("filepaths: {0} | dirpaths: {1} | total: {2}".format(len(filepaths), len(dirpaths), len(filepaths) + len(dirpaths)))
+		log.debug("time to walk and parse: %s", datetime.now() - start)
+		if tuner is not None and tuner.best is not None:
+			log.debug("parse workers at the end of the walk: %d", tuner.best)
+		log.debug("processsed files & dirs: %d", output.count())
 
-	# parse files
-	start = datetime.now()
-	counter = 0
-	if dirlist_no_multithreading:
-		file_results = [parse_file(file) for file in filepaths]
-	else:
-		file_results = MultiprocessingPool(parse_file, filepaths, WORKERS).run()
-
-	if debug or verbose:
-		log.debug("time to parse files: %s", datetime.now() - start)
-		log.debug("processsed files: %d", counter)
-		log.debug("file_results: %d", len(list(file_results)))
-
-	# parse dirs
-	start = datetime.now()
-	if dirlist_no_multithreading:
-		dir_results = [parse_dir(dir) for dir in dirpaths]
-	else:
-		dir_results = MultiprocessingPool(parse_dir, dirpaths, WORKERS).run()
-
-	if debug or verbose:
-		log.debug("time to parse dirs: %s", datetime.now() - start)
-		log.debug("processsed dirs: %d", counter)
-		log.debug("dir_results: %d", len(list(dir_results)))
-
-	output.flush_record()  # flush output writer buffer for entries < buffer_cap
+	output.flush_record(final=True)  # flush output writer buffer for entries < buffer_cap and close the output
 
 	if quiet is False and rtr is False:  # Final flush to account for filecount status printer
 		print('\n', end='\x1b[1K\r')
 		sys.stdout.flush()
+
+
+if __name__ == "__main__":
+	print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
+	print("Exiting.")
+	sys.exit(0)
@@ -12,10 +12,6 @@ from collections import OrderedDict
 from datetime import datetime
 from string import printable
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-                      inputdir, no_tarball, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.dateutil import parser
 from .common.dep.six.moves import configparser
@@ -51,14 +47,14 @@ def get_firefox_version(firefox_location, user, profile):
     return ver
 
 
-def parse_download_history(firefox_location, user, profile, downloads_output, downloads_headers):
+def parse_download_history(ctx, firefox_location, user, profile, downloads_output, downloads_headers):
     """
     Parses the Firefox download history form the places.sqlite sqlite3 db file
     Requires the moz_places table and the moz_annos table
     """
     db_filepath = os.path.join(firefox_location, 'places.sqlite')
     db_wrapper = SQLiteDB()
-    db_wrapper.open(db_filepath, outputdir)
+    db_wrapper.open(db_filepath, ctx.outputdir)
 
     if db_wrapper.table_exists('moz_places') is False:
         log.debug("Visit History required table 'moz_places' not found.")
@@ -84,7 +80,7 @@ def parse_download_history(firefox_location, user, profile, downloads_output, do
 
     log.debug("[Start] Finished executing SQLite query for Firefox download history.")
     try:
-        downloads_data = db_wrapper.query_db(db_filepath, query, outputdir)
+        downloads_data = db_wrapper.query_db(db_filepath, query, ctx.outputdir)
         log.debug("[Firefox download history for - {0}] Found {1} lines of data.".format(profile, len(downloads_data)))
     except Exception:
         log.error("Unable to query {0}: {1}".format(db_filepath, [traceback.format_exc()]))
@@ -110,7 +106,7 @@ def parse_download_history(firefox_location, user, profile, downloads_output, do
         log.debug("Successfully closed {0}".format(db_filepath))
 
 
-def parse_visit_history(firefox_location, user, profile, urls_output, urls_headers):
+def parse_visit_history(ctx, firefox_location, user, profile, urls_output, urls_headers):
     """
     Parses the Firefox visit history form the places.sqlite sqlite3 db file
     Requires the moz_places table and the moz_historyvisits table
@@ -118,7 +114,7 @@ def parse_visit_history(firefox_location, user, profile, urls_output, urls_heade
 
     db_filepath = os.path.join(firefox_location, 'places.sqlite')
     db_wrapper = SQLiteDB()
-    db_wrapper.open(db_filepath, outputdir)
+    db_wrapper.open(db_filepath, ctx.outputdir)
 
     if db_wrapper.table_exists('moz_places') is False:
         log.debug("Visit History required table 'moz_places' not found.")
@@ -144,7 +140,7 @@ def parse_visit_history(firefox_location, user, profile, urls_output, urls_heade
 
     log.debug("[Start] Executing SQLite query for Firefox visit history.")
     try:
-        urls_data = db_wrapper.query_db(db_filepath, query, outputdir)
+        urls_data = db_wrapper.query_db(db_filepath, query, ctx.outputdir)
         log.debug("[Firefox visit history for - {0}] Found {1} lines of data.".format(profile, len(urls_data)))
     except Exception:
         log.error("Unable to query {0}: {1}".format(db_filepath, [traceback.format_exc()]))
@@ -153,24 +149,21 @@ def parse_visit_history(firefox_location, user, profile, urls_output, urls_heade
     nondict = dict.fromkeys(desired_columns)
 
     for item in urls_data:
-        record = OrderedDict((h, '') for h in urls_headers)
-        item_dict = dict(zip(query_columns_list, item))
-
-        nondict.update(item_dict)
+        nondict.update(zip(query_columns_list, item))
 
-        record['user'] = user
-        record['profile'] = profile
-        record['visit_time'] = firefox_time(nondict['visit_date']).split('.')[0] + 'Z'
+        title = ''
         if nondict['title']:
-            record['title'] = "".join(filter(lambda char: char in printable, nondict['title']))
-        record['url'] = nondict['url']
-        record['visit_count'] = nondict['visit_count']
-        record['typed'] = nondict['typed']
-        record['last_visit_time'] = firefox_time(nondict['last_visit_date']).split('.')[0] + 'Z'
+            title = "".join(filter(lambda char: char in printable, nondict['title']))
+        description = ''
         if nondict['description']:
-            record['description'] = nondict['description']
+            description = nondict['description']
 
-        urls_output.write_record(record)
+        # columns in the order of urls_headers
+        urls_output.write_row((
+            user, profile, firefox_time(nondict['visit_date']).split('.')[0] + 'Z',
+            title, nondict['url'], nondict['visit_count'],
+            firefox_time(nondict['last_visit_date']).split('.')[0] + 'Z', nondict['typed'], description
+        ))
 
     log.debug("[End] Finished executing SQLite query for Firefox visit history.")
 
@@ -212,18 +205,18 @@ def get_extensions(extfile, user, prof, extensions_output, extensions_headers):
     log.debug("Completed writing extension data.")
 
 
-def module():
+def module(ctx):
     firefox_locations = glob.glob(
-        os.path.join(inputdir, 'Users/*/Library/Application Support/Firefox/Profiles/*.*'))
+        os.path.join(ctx.inputdir, 'Users/*/Library/Application Support/Firefox/Profiles/*.*'))
 
     urls_headers = ['user', 'profile', 'visit_time', 'title', 'url', 'visit_count', 'last_visit_time', 'typed', 'description']
-    urls_output = data_writer('browser_firefox_history', urls_headers)
+    urls_output = ctx.data_writer('browser_firefox_history', urls_headers, async_write=True)
 
     downloads_headers = ['user', 'profile', 'download_url', 'download_path', 'download_started', 'download_finished', 'download_totalbytes']
-    downloads_output = data_writer('browser_firefox_downloads', downloads_headers)
+    downloads_output = ctx.data_writer('browser_firefox_downloads', downloads_headers)
 
     extensions_headers = ['user', 'profile', 'name', 'id', 'creator', 'description', 'update_url', 'install_date', 'last_updated', 'source_uri', 'homepage_url']
-    extensions_output = data_writer('browser_firefox_extensions', extensions_headers)
+    extensions_output = ctx.data_writer('browser_firefox_extensions', extensions_headers)
 
     for location in firefox_locations:
         user_path = location.split('/')
@@ -240,8 +233,8 @@ def module():
         history_db_filepath = os.path.join(location, 'places.sqlite')
         if SQLiteDB.db_table_exists(history_db_filepath, 'moz_places'):
             try:
-                parse_visit_history(location, user, profile, urls_output, urls_headers)
-                parse_download_history(location, user, profile, downloads_output, downloads_headers)
+                parse_visit_history(ctx, location, user, profile, urls_output, urls_headers)
+                parse_download_history(ctx, location, user, profile, downloads_output, downloads_headers)
             except Exception:
                 log.error([traceback.format_exc()])
         else:
@@ -258,7 +251,7 @@ def module():
             log.debug("Did not find any Firefox extensions for Firefox under {0} user at {1}.".format(user, profile))
 
         # clean up
-        for file in glob.glob(os.path.join(outputdir, '*places.sqlite*')):
+        for file in glob.glob(os.path.join(ctx.outputdir, '*places.sqlite*')):
             try:
                 os.remove(file)
             except OSError as e:
@@ -273,5 +266,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
@@ -4,18 +4,6 @@
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import stats2
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import inputdir
-from __main__ import outputdir
-from __main__ import forensic_mode
-from __main__ import no_tarball
-from __main__ import quiet
-
-from __main__ import archive
-from __main__ import startTime
-from __main__ import full_prefix
-from __main__ import data_writer
-
 import plistlib
 import logging
 import os
@@ -28,12 +16,12 @@ _modVers = '1.0.2'
 log = logging.getLogger(_modName)
 
 
-def module():
+def module(ctx):
     headers = ['src_name', 'timestamp', 'display_name', 'display_version',
                'package_identifiers', 'process_name']
-    output = data_writer(_modName, headers)
+    output = ctx.data_writer(_modName, headers)
 
-    installhistory_loc = os.path.join(inputdir, 'Library/Receipts/InstallHistory.plist')
+    installhistory_loc = os.path.join(ctx.inputdir, 'Library/Receipts/InstallHistory.plist')
     installhistory_list = glob.glob(installhistory_loc)
 
     if len(installhistory_list) == 0:
@@ -80,5 +68,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
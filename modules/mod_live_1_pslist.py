@@ -7,10 +7,6 @@ import os
 import subprocess
 import sys
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-						inputdir, no_tarball, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.dateutil import parser
 from .common.functions import stats2
@@ -20,10 +16,10 @@ _modVers = '1.1.0'
 log = logging.getLogger(_modName)
 
 
-def module():
-	if ("Volumes" not in inputdir and forensic_mode is False):
+def module(ctx):
+	if ("Volumes" not in ctx.inputdir and ctx.forensic_mode is False):
 		headers = ['pid', 'ppid', 'user', 'state', 'proc_start', 'runtime', 'cmd']
-		output = data_writer(_modName, headers)
+		output = ctx.data_writer(_modName, headers)
 
 		os.environ['TZ'] = 'UTC0'
 		ps_out, e = subprocess.Popen(["ps", "-Ao", "pid,ppid,user,stat,lstart,time,command"], stdout=subprocess.PIPE).communicate()
@@ -54,5 +50,3 @@ if __name__ == "__main__":
 	print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
 	print("Exiting.")
 	sys.exit(0)
-else:
-	module()
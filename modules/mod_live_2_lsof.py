@@ -7,10 +7,6 @@ import sys
 from collections import OrderedDict
 from subprocess import PIPE, Popen
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-						inputdir, no_tarball, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import stats2
 
@@ -19,10 +15,10 @@ _modVers = '1.1.0'
 log = logging.getLogger(_modName)
 
 
-def module():
-	if ("Volumes" not in inputdir and forensic_mode is False):
+def module(ctx):
+	if ("Volumes" not in ctx.inputdir and ctx.forensic_mode is False):
 		headers = ['cmd', 'pid', 'ppid', 'user', 'file_descriptor', 'type', 'device', 'size', 'node', 'access', 'name']
-		output = data_writer(_modName, headers)
+		output = ctx.data_writer(_modName, headers)
 
 		# encoding = locale.getpreferredencoding(True)
 		names = OrderedDict(zip('cpRLftDsian', 'command pid ppid user fd type device_no size inode access name'.split()))
@@ -46,11 +42,9 @@ def module():
 		lsof.communicate()
 	else:
 		log.error("Module did not run: input is not a live system!")
-	output.flush_record()
+	output.flush_record(final=True)
 
 if __name__ == "__main__":
 	print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
 	print("Exiting.")
 	sys.exit(0)
-else:
-	module()
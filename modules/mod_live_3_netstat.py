@@ -6,10 +6,6 @@ import logging
 import subprocess
 import sys
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-					inputdir, no_tarball, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import stats2
 
@@ -18,11 +14,11 @@ _modVers = '1.1.0'
 log = logging.getLogger(_modName)
 
 
-def module():
-	if ("Volumes" not in inputdir and forensic_mode is False):
+def module(ctx):
+	if ("Volumes" not in ctx.inputdir and ctx.forensic_mode is False):
 
 		headers = ['protocol', 'recv_q', 'send_q', 'src_ip', 'src_port', 'dst_ip', 'dst_port', 'state']
-		output = data_writer(_modName, headers)
+		output = ctx.data_writer(_modName, headers)
 
 		netstat_out, e = subprocess.Popen(["netstat", "-f", "inet", "-n"], stdout=subprocess.PIPE).communicate()
 
@@ -71,5 +67,3 @@ if __name__ == "__main__":
 	print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
 	print("Exiting.")
 	sys.exit(0)
-else:
-	module()
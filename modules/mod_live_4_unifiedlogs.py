@@ -7,21 +7,17 @@ import os
 import subprocess
 import sys
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-                      inputdir, no_tarball, outputdir, quiet, startTime)
-
 _modName = __name__.split('_')[-1]
 _modVers = '1.0.3'
 log = logging.getLogger(_modName)
 
 
-def module():
-    if forensic_mode:
+def module(ctx):
+    if ctx.forensic_mode:
         log.error("Module did not run: input is not a live system!")
         return
 
-    output = data_writer("unifiedlogs_live", None)
+    output = ctx.data_writer("unifiedlogs_live", None)
 
     predicates = [
         'process == "sudo" && eventMessage CONTAINS[c] "User=root" && (NOT eventMessage CONTAINS[c] "root : PWD=/ ; USER=root") && (NOT eventMessage CONTAINS[c] "    root : PWD=")',    # Captures command line activity run with elevated privileges
@@ -37,7 +33,7 @@ def module():
     predicate = "'" + predicate + "'"
 
     cmd = 'log show --info --backtrace --debug --loss --signpost --style ndjson --force --timezone UTC --predicate'
-    outcmd = '> {0}'.format(output.data_file_name.split(output.datatype)[0] + 'json')
+    outcmd = '> {0}'.format(output.path('json'))
 
     cmd = cmd + " " + predicate + " " + outcmd
 
@@ -56,17 +52,20 @@ def module():
     if output.datatype == "csv":
         log.debug('converting unified logs output to csv')
         from .common import json_to_csv
-        json_to_csv.json_file_to_csv(output.data_file_name.split(output.datatype)[0] + 'json')
-        os.remove(output.data_file_name.split(output.datatype)[0] + 'json')
+        json_to_csv.json_file_to_csv(output.path('json'))
+        os.remove(output.path('json'))
+        ctx.register_file(output.path('csv'), output.mod, 'csv')
     elif output.datatype == "all":
         log.debug('converting unified logs output to csv')
         from .common import json_to_csv
-        json_to_csv.json_file_to_csv(output.data_file_name.split(output.datatype)[0] + 'json')
+        json_to_csv.json_file_to_csv(output.path('json'))
+        ctx.register_file(output.path('json'), output.mod, 'json')
+        ctx.register_file(output.path('csv'), output.mod, 'csv')
+    else:
+        ctx.register_file(output.path('json'), output.mod, 'json')
 
 
 if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
@@ -16,10 +16,6 @@ import sys
 import traceback
 from collections import OrderedDict
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-                      inputdir, no_tarball, outputdir, quiet, startTime)
-
 
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common import ccl_bplist as ccl_bplist
@@ -30,9 +26,9 @@ _modVers = '1.0.3'
 log = logging.getLogger(_modName)
 
 
-def parse_sfls(headers, output):
+def parse_sfls(ctx, headers, output):
 
-    sfl_list = multiglob(inputdir, ['Users/*/Library/Application Support/com.apple.sharedfilelist/*.sfl',
+    sfl_list = multiglob(ctx.inputdir, ['Users/*/Library/Application Support/com.apple.sharedfilelist/*.sfl',
                                     'Users/*/Library/Application Support/com.apple.sharedfilelist/*/*.sfl',
                                     'private/var/*/Library/Application Support/com.apple.sharedfilelist/*/*.sfl'])
 
@@ -79,8 +75,8 @@ def parse_sfls(headers, output):
                 output.write_record(record)
 
 
-def parse_sfl2s(headers, output):
-    sfl2_list = multiglob(inputdir, ['Users/*/Library/Application Support/com.apple.sharedfilelist/*.sfl2',
+def parse_sfl2s(ctx, headers, output):
+    sfl2_list = multiglob(ctx.inputdir, ['Users/*/Library/Application Support/com.apple.sharedfilelist/*.sfl2',
                                      'Users/*/Library/Application Support/com.apple.sharedfilelist/*/*.sfl2'
                                      'private/var/*/Library/Application Support/com.apple.sharedfilelist/*/*.sfl2'])
 
@@ -157,8 +153,8 @@ def parse_sfl2s(headers, output):
                 output.write_record(record)
 
 
-def parse_securebookmarks(headers, output):
-    secure_bookmarks = multiglob(inputdir, ['Users/*/Library/Containers/*/Data/Library/Preferences/*.securebookmarks.plist',
+def parse_securebookmarks(ctx, headers, output):
+    secure_bookmarks = multiglob(ctx.inputdir, ['Users/*/Library/Containers/*/Data/Library/Preferences/*.securebookmarks.plist',
                                             'private/var/*/Library/Containers/*/Data/Library/Preferences/*.securebookmarks.plist'])
 
     for secure_bookmark_file in secure_bookmarks:
@@ -190,8 +186,8 @@ def parse_securebookmarks(headers, output):
                 output.write_record(record)
 
 
-def parse_finderplists(headers, output):
-    finder_plists = multiglob(inputdir, ['Users/*/Library/Preferences/com.apple.finder.plist', 'private/var/*/Library/Preferences/com.apple.finder.plist'])
+def parse_finderplists(ctx, headers, output):
+    finder_plists = multiglob(ctx.inputdir, ['Users/*/Library/Preferences/com.apple.finder.plist', 'private/var/*/Library/Preferences/com.apple.finder.plist'])
 
     for fplist in finder_plists:
 
@@ -247,8 +243,8 @@ def parse_finderplists(headers, output):
                 output.write_record(record)
 
 
-def parse_sidebarplists(headers, output):
-    sidebar_plists = multiglob(inputdir, ['Users/*/Library/Preferences/com.apple.sidebarlists.plist', 'private/var/*/Library/Preferences/com.apple.sidebarlists.plist'])
+def parse_sidebarplists(ctx, headers, output):
+    sidebar_plists = multiglob(ctx.inputdir, ['Users/*/Library/Preferences/com.apple.sidebarlists.plist', 'private/var/*/Library/Preferences/com.apple.sidebarlists.plist'])
 
     for sblist in sidebar_plists:
 
@@ -278,15 +274,15 @@ def parse_sidebarplists(headers, output):
                 output.write_record(record)
 
 
-def module():
+def module(ctx):
     headers = ['src_file', 'user', 'src_name', 'item_index', 'order', 'name', 'url', 'source_key']
-    output = data_writer(_modName, headers)
+    output = ctx.data_writer(_modName, headers)
 
-    parse_sfls(headers, output)
-    parse_sfl2s(headers, output)
-    parse_securebookmarks(headers, output)
-    parse_sidebarplists(headers, output)
-    parse_finderplists(headers, output)
+    parse_sfls(ctx, headers, output)
+    parse_sfl2s(ctx, headers, output)
+    parse_securebookmarks(ctx, headers, output)
+    parse_sidebarplists(ctx, headers, output)
+    parse_finderplists(ctx, headers, output)
     output.flush_record()
 
 
@@ -294,5 +290,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
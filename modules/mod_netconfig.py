@@ -8,10 +8,6 @@ import re
 import sys
 from collections import OrderedDict
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (OSVersion, archive, data_writer, forensic_mode,
-                      full_prefix, inputdir, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import finditem
 
@@ -20,17 +16,17 @@ _modVers = '1.0.1'
 log = logging.getLogger(_modName)
 
 
-def module():
+def module(ctx):
     _headers = ['type', 'name', 'last_connected', 'security', 'hotspot']
-    _output = data_writer(_modName, _headers)
+    _output = ctx.data_writer(_modName, _headers)
 
     if sys.version_info[0] < 3:
-        airport = plistlib.readPlist(os.path.join(inputdir, 'Library/Preferences/SystemConfiguration/com.apple.airport.preferences.plist'))
-        interface = plistlib.readPlist(os.path.join(inputdir, 'Library/Preferences/SystemConfiguration/NetworkInterfaces.plist'))
+        airport = plistlib.readPlist(os.path.join(ctx.inputdir, 'Library/Preferences/SystemConfiguration/com.apple.airport.preferences.plist'))
+        interface = plistlib.readPlist(os.path.join(ctx.inputdir, 'Library/Preferences/SystemConfiguration/NetworkInterfaces.plist'))
     else:
-        with open(os.path.join(inputdir, 'Library/Preferences/SystemConfiguration/com.apple.airport.preferences.plist'), 'rb') as fp:
+        with open(os.path.join(ctx.inputdir, 'Library/Preferences/SystemConfiguration/com.apple.airport.preferences.plist'), 'rb') as fp:
             airport = plistlib.load(fp)
-        with open(os.path.join(inputdir, 'Library/Preferences/SystemConfiguration/NetworkInterfaces.plist'), 'rb') as fp:
+        with open(os.path.join(ctx.inputdir, 'Library/Preferences/SystemConfiguration/NetworkInterfaces.plist'), 'rb') as fp:
             interface = plistlib.load(fp)
 
     # KEEP THE LINE BELOW TO GENERATE AN ORDEREDDICT BASED ON THE HEADERS
@@ -66,5 +62,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
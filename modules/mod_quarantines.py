@@ -6,10 +6,6 @@ import logging
 import sys
 from collections import OrderedDict
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-                      inputdir, no_tarball, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import cocoa_time, multiglob, query_db
 
@@ -18,12 +14,12 @@ _modVers = '1.0.3'
 log = logging.getLogger(_modName)
 
 
-def module():
+def module(ctx):
     headers = ['user', 'timestamp', 'bundle_id', 'quarantine_agent', 'download_url', 'sender_name',
                'sender_address', 'typeno', 'origin_title', 'origin_title', 'origin_url', 'origin_alias']
-    output = data_writer(_modName, headers)
+    output = ctx.data_writer(_modName, headers)
 
-    qevents_list = multiglob(inputdir, ['Users/*/Library/Preferences/com.apple.LaunchServices.QuarantineEventsV2',
+    qevents_list = multiglob(ctx.inputdir, ['Users/*/Library/Preferences/com.apple.LaunchServices.QuarantineEventsV2',
                                         'private/var/*/Library/Preferences/com.apple.LaunchServices.QuarantineEventsV2'])
     qry = 'SELECT * FROM LSQuarantineEvent'
 
@@ -31,7 +27,7 @@ def module():
         log.debug("Files not found in: {0}".format(qevents_list))
 
     for i in qevents_list:
-        data = query_db(i, qry, outputdir)
+        data = query_db(i, qry, ctx.outputdir)
 
         userpath = i.split('/')
         if 'Users' in userpath:
@@ -63,5 +59,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
@@ -9,11 +9,6 @@ import sys
 import traceback
 from collections import OrderedDict
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (OSVersion, archive, data_writer, forensic_mode,
-                      full_prefix, inputdir, no_tarball, outputdir, quiet,
-                      startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common import ccl_bplist as bplist
 from .common.functions import cocoa_time, query_db, read_stream_bplist, stats2
@@ -23,21 +18,21 @@ _modVers = '1.0.2'
 log = logging.getLogger(_modName)
 
 
-def module():
+def module(ctx):
     headers = ['uid', 'path', 'name', 'last_hit_date', 'hit_count',
                'file_last_modified', 'generator', 'file_size']
-    output = data_writer(_modName, headers)
+    output = ctx.data_writer(_modName, headers)
 
-    q_loc = os.path.join(inputdir, 'private/var/folders/*/*/C/com.apple.QuickLook.thumbnailcache/index.sqlite')
+    q_loc = os.path.join(ctx.inputdir, 'private/var/folders/*/*/C/com.apple.QuickLook.thumbnailcache/index.sqlite')
     qlist = glob.glob(q_loc)
 
-    if OSVersion is not None:
-        ver = float('.'.join(OSVersion.split('.')[1:]))
-        if ver > 14.0 and ver is not None and forensic_mode is not True:
+    if ctx.OSVersion is not None:
+        ver = float('.'.join(ctx.OSVersion.split('.')[1:]))
+        if ver > 14.0 and ver is not None and ctx.forensic_mode is not True:
             log.error("Artifacts are inaccessible on and above OS version 10.14 on live systems.")
             return
     else:
-        if forensic_mode is not True:
+        if ctx.forensic_mode is not True:
             log.debug("OSVersion not detected, but going to try to parse anyway.")
         else:
             log.error("OSVersion not detected, so will not risk parsing as artifacts are inaccessible on and above OS version 10.14 on live systems.")
@@ -54,7 +49,7 @@ def module():
 
         uid = stats2(qfile)['uid']
 
-        data = query_db(qfile, ql_sql, outputdir)
+        data = query_db(qfile, ql_sql, ctx.outputdir)
 
         for item in data:
             item = list(item)
@@ -95,5 +90,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
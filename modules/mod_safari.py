@@ -5,17 +5,11 @@ Downloads.plist for each user on disk.
 import logging
 import os
 import plistlib
-import shutil
 import sqlite3
 import sys
 import traceback
 from collections import OrderedDict
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (OSVersion, archive, data_writer, forensic_mode,
-                      full_prefix, inputdir, no_tarball, outputdir, quiet,
-                      startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.dateutil import parser
 from .common.functions import cocoa_time, multiglob, read_bplist, stats2, get_db_column_headers
@@ -26,7 +20,7 @@ log = logging.getLogger(_modName)
 
 
 # create_temp_sqlite_file returns the string name of the main sqlite file created
-def create_temp_sqlite_file(db_location):
+def create_temp_sqlite_file(ctx, db_location):
     tmp_db = os.path.basename(db_location) + '-tmp'
     tmp_shm_db = os.path.basename(db_location) + '-tmp-shm'
     tmp_wal_db = os.path.basename(db_location) + '-tmp-wal'
@@ -34,22 +28,22 @@ def create_temp_sqlite_file(db_location):
 
     log.debug("Trying to copy {0} temp location".format(db_location))
     try:
-        shutil.copyfile(db_location, os.path.join(outputdir, tmp_db))
-        shutil.copyfile(db_location + "-shm", os.path.join(outputdir, tmp_shm_db))
-        shutil.copyfile(db_location + "-wal", os.path.join(outputdir, tmp_wal_db))
+        ctx.governor.copyfile(db_location, os.path.join(ctx.outputdir, tmp_db))
+        ctx.governor.copyfile(db_location + "-shm", os.path.join(ctx.outputdir, tmp_shm_db))
+        ctx.governor.copyfile(db_location + "-wal", os.path.join(ctx.outputdir, tmp_wal_db))
     except Exception as e:
         log.error("Could not copy {0} to temp location: {1}".format(db_location, e))
         try:
-            os.remove(os.path.join(outputdir, 'History.db-tmp'))
-            os.remove(os.path.join(outputdir, 'History.db-tmp-shm'))
-            os.remove(os.path.join(outputdir, 'History.db-tmp-wal'))
+            os.remove(os.path.join(ctx.outputdir, 'History.db-tmp'))
+            os.remove(os.path.join(ctx.outputdir, 'History.db-tmp-shm'))
+            os.remove(os.path.join(ctx.outputdir, 'History.db-tmp-wal'))
         except OSError:
             pass
         return None
     return tmp_db
 
 
-def connect_to_db(db_location, main_table):
+def connect_to_db(ctx, db_location, main_table):
     try:
         log.debug("Trying to connect to {0} directly...".format(db_location))
         history_db = db_location
@@ -60,10 +54,10 @@ def connect_to_db(db_location, main_table):
         log.debug("Could not connect to {0} [{1}].".format(db_location, error[0]))
 
         if "database is locked" or "unable to open" in error[0]:
-            tmpdb = create_temp_sqlite_file(db_location)
+            tmpdb = create_temp_sqlite_file(ctx, db_location)
             if tmpdb is None:
                 return None
-            history_db = os.path.join(outputdir, tmpdb)
+            history_db = os.path.join(ctx.outputdir, tmpdb)
 
             try:
                 get_db_column_headers(history_db, main_table)
@@ -205,48 +199,48 @@ def pull_visit_history(recently_closed_plist, history_db, user, history_output,
 
     nondict = dict.fromkeys(desired_columns)
     for item in history_data:
-        record = OrderedDict((h, '') for h in history_headers)
-        item_dict = dict(zip(query_columns_list, item))
-        nondict.update(item_dict)
-
-        record['user'] = user
-        record['visit_time'] = cocoa_time(nondict['visit_time'])
-        if nondict['title'] is not None:
-            record['title'] = nondict['title']
-        record['url'] = nondict['url']
-        record['visit_count'] = nondict['visit_count']
-
-        if nondict['url'] in d.keys():
-
-            record['recently_closed'] = 'Yes'
-            record['tab_title'] = d[nondict['url']][0]
-            record['date_closed'] = d[nondict['url']][1]
-            record['last_visit_time'] = d[nondict['url']][2]
-
-        history_output.write_record(record)
+        nondict.update(zip(query_columns_list, item))
+
+        title = nondict['title']
+        if title is None:
+            title = ''
+
+        # columns in the order of history_headers
+        closed = d.get(nondict['url'])
+        if closed is not None:
+            history_output.write_row((
+                user, cocoa_time(nondict['visit_time']), title, nondict['url'], nondict['visit_count'],
+                closed[2], 'Yes', closed[0], closed[1]
+            ))
+        else:
+            history_output.write_row((
+                user, cocoa_time(nondict['visit_time']), title, nondict['url'], nondict['visit_count'],
+                '', '', '', ''
+            ))
 
 
-def module(safari_location):
-    if OSVersion is not None:
-        ver = float('.'.join(OSVersion.split('.')[1:]))
-        if ver > 14.0 and forensic_mode is not True:
+def module(ctx):
+    safari_location = multiglob(ctx.inputdir, ['Users/*/Library/Safari/', 'private/var/*/Library/Safari'])
+    if ctx.OSVersion is not None:
+        ver = float('.'.join(ctx.OSVersion.split('.')[1:]))
+        if ver > 14.0 and ctx.forensic_mode is not True:
             log.error("Artifacts are inaccessible on and above OS version 10.14 on live systems.")
             return
     else:
-        if forensic_mode is not True:
+        if ctx.forensic_mode is not True:
             log.debug("OSVersion not detected, but going to try to parse anyway.")
         else:
             log.error("OSVersion not detected, so will not risk parsing as artifacts are inaccessible on and above OS version 10.14 on live systems.")
             return
 
     history_headers = ['user', 'visit_time', 'title', 'url', 'visit_count', 'last_visit_time', 'recently_closed', 'tab_title', 'date_closed']
-    history_output = data_writer('browser_safari_history', history_headers)
+    history_output = ctx.data_writer('browser_safari_history', history_headers, async_write=True)
 
     downloads_headers = ['user', 'download_url', 'download_path', 'download_started', 'download_finished', 'download_totalbytes', 'download_bytes_received']
-    downloads_output = data_writer('browser_safari_downloads', downloads_headers)
+    downloads_output = ctx.data_writer('browser_safari_downloads', downloads_headers)
 
     extensions_headers = ['user', 'name', 'bundle_directory', 'enabled', 'apple_signed', 'developer_id', 'bundle_id', 'ctime', 'mtime', 'atime', 'size']
-    extensions_output = data_writer('browser_safari_extensions', extensions_headers)
+    extensions_output = ctx.data_writer('browser_safari_extensions', extensions_headers)
 
     for c in safari_location:
         userpath = c.split('/')
@@ -262,7 +256,7 @@ def module(safari_location):
             log.debug("Did not find History.db under {0} user.".format(user))
             continue
 
-        history_db = connect_to_db(os.path.join(c, 'History.db'), 'history_visits')
+        history_db = connect_to_db(ctx, os.path.join(c, 'History.db'), 'history_visits')
         recently_closed_plist = os.path.join(c, 'RecentlyClosedTabs.plist')
         if history_db:
             pull_visit_history(recently_closed_plist, history_db, user, history_output, history_headers)
@@ -277,9 +271,9 @@ def module(safari_location):
             log.debug("No extensions folder found. Skipping.")
 
         try:
-            os.remove(os.path.join(outputdir, 'History.db-tmp'))
-            os.remove(os.path.join(outputdir, 'History.db-tmp-shm'))
-            os.remove(os.path.join(outputdir, 'History.db-tmp-wal'))
+            os.remove(os.path.join(ctx.outputdir, 'History.db-tmp'))
+            os.remove(os.path.join(ctx.outputdir, 'History.db-tmp-shm'))
+            os.remove(os.path.join(ctx.outputdir, 'History.db-tmp-wal'))
         except OSError:
             pass
     history_output.flush_record()
@@ -291,6 +285,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    safari_location = multiglob(inputdir, ['Users/*/Library/Safari/', 'private/var/*/Library/Safari'])
-    module(safari_location)
@@ -7,10 +7,6 @@ import logging
 import plistlib
 import sys
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-                      inputdir, no_tarball, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import multiglob
 
@@ -19,11 +15,11 @@ _modVers = '1.0.3'
 log = logging.getLogger(_modName)
 
 
-def module():
+def module(ctx):
     headers = ['user', 'shortcut', 'display_name', 'last_used', 'url']
-    output = data_writer(_modName, headers)
+    output = ctx.data_writer(_modName, headers)
 
-    user_inputdir = multiglob(inputdir, ['Users/*/Library/Application Support/com.apple.spotlight.Shortcuts',
+    user_inputdir = multiglob(ctx.inputdir, ['Users/*/Library/Application Support/com.apple.spotlight.Shortcuts',
                                          'private/var/*/Library/Application Support/com.apple.spotlight.Shortcuts'])
 
     for file in user_inputdir:
@@ -61,5 +57,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
@@ -9,10 +9,6 @@ import subprocess
 import sys
 from collections import OrderedDict
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-                      inputdir, no_tarball, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import multiglob, stats2
 
@@ -21,11 +17,11 @@ _modVers = '1.0.3'
 log = logging.getLogger(_modName)
 
 
-def module():
+def module(ctx):
     known_hosts_headers = ['src_name', 'user', 'bits', 'fingerprint', 'host', 'keytype']
-    output = data_writer(_modName, known_hosts_headers)
+    output = ctx.data_writer(_modName, known_hosts_headers)
 
-    user_inputdir = multiglob(inputdir, ["Users/*/.ssh", "private/var/*/.ssh"])
+    user_inputdir = multiglob(ctx.inputdir, ["Users/*/.ssh", "private/var/*/.ssh"])
 
     record = OrderedDict((h, '') for h in known_hosts_headers)
 
@@ -78,5 +74,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
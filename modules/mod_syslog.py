@@ -9,10 +9,6 @@ import re
 import sys
 from collections import OrderedDict
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-                      inputdir, no_tarball, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import stats2
 from .common.dateutil import parser
@@ -96,12 +92,12 @@ def syslog_parse(logfile, logdata, headers, output):
             output.write_record(record)
 
 
-def module():
+def module(ctx):
 
     headers = ['src_file', 'timestamp', 'log_systemname', 'processname', 'pid', 'message']
-    output = data_writer(_modName, headers)
+    output = ctx.data_writer(_modName, headers)
 
-    syslog_loc = os.path.join(inputdir, 'private/var/log/system.log*')
+    syslog_loc = os.path.join(ctx.inputdir, 'private/var/log/system.log*')
     varlog_inputdir = glob.glob(syslog_loc)
 
     if len(varlog_inputdir) == 0:
@@ -115,12 +111,10 @@ def module():
             with gzip.open(c_syslog, 'r') as go_syslog:
                 syslog_parse(c_syslog, go_syslog, headers, output)
 
-    output.flush_record()
+    output.flush_record(final=True)
 
 
 if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
@@ -10,11 +10,6 @@ import subprocess
 import sys
 from collections import OrderedDict
 
-# KEEP THIS - IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (OSVersion, archive, data_writer, forensic_mode,
-                      full_prefix, inputdir, inputsysdir, outputdir, quiet,
-                      serial, startTime)
-
 # KEEP THIS - IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import finditem, read_bplist, stats2
 
@@ -34,45 +29,45 @@ _headers = ['local_hostname', 'computer_name', 'hostname', 'model',
             'sip_status']
 
 
-def module():
+def module(ctx):
     # KEEP THIS - ENABLES WRITING OUTPUT FILE.
-    _output = data_writer(_modName, _headers)
+    _output = ctx.data_writer(_modName, _headers)
 
     # -------------BEGIN MODULE-SPECIFIC LOGIC------------- #
     try:
-        globalpreferences = read_bplist(os.path.join(inputdir, 'Library/Preferences/.GlobalPreferences.plist'))
+        globalpreferences = read_bplist(os.path.join(ctx.inputdir, 'Library/Preferences/.GlobalPreferences.plist'))
     except FileNotFoundError:
-        globalpreferences = read_bplist(os.path.join(inputsysdir, 'Library/Preferences/.GlobalPreferences.plist'))
+        globalpreferences = read_bplist(os.path.join(ctx.inputsysdir, 'Library/Preferences/.GlobalPreferences.plist'))
     if sys.version_info[0] < 3:
         try:
-            preferences = plistlib.readPlist(os.path.join(inputdir, 'Library/Preferences/SystemConfiguration/preferences.plist'))
+            preferences = plistlib.readPlist(os.path.join(ctx.inputdir, 'Library/Preferences/SystemConfiguration/preferences.plist'))
         except FileNotFoundError:
-            preferences = plistlib.readPlist(os.path.join(inputsysdir, 'Library/Preferences/SystemConfiguration/preferences.plist'))
+            preferences = plistlib.readPlist(os.path.join(ctx.inputsysdir, 'Library/Preferences/SystemConfiguration/preferences.plist'))
     else:
         try:
-            with open(os.path.join(inputdir, 'Library/Preferences/SystemConfiguration/preferences.plist'), 'rb') as fp:
+            with open(os.path.join(ctx.inputdir, 'Library/Preferences/SystemConfiguration/preferences.plist'), 'rb') as fp:
                 preferences = plistlib.load(fp)
         except FileNotFoundError:
-            with open(os.path.join(inputsysdir, 'Library/Preferences/SystemConfiguration/preferences.plist'), 'rb') as fp:
+            with open(os.path.join(ctx.inputsysdir, 'Library/Preferences/SystemConfiguration/preferences.plist'), 'rb') as fp:
                 preferences = plistlib.load(fp)
     if sys.version_info[0] < 3:
         try:
-            systemversion = plistlib.readPlist(os.path.join(inputdir, 'System/Library/CoreServices/SystemVersion.plist'))
+            systemversion = plistlib.readPlist(os.path.join(ctx.inputdir, 'System/Library/CoreServices/SystemVersion.plist'))
         except FileNotFoundError:
-            systemversion = plistlib.readPlist(os.path.join(inputsysdir, 'System/Library/CoreServices/SystemVersion.plist'))
+            systemversion = plistlib.readPlist(os.path.join(ctx.inputsysdir, 'System/Library/CoreServices/SystemVersion.plist'))
     else:
         try:
-            with open(os.path.join(inputdir, 'System/Library/CoreServices/SystemVersion.plist'), 'rb') as fp:
+            with open(os.path.join(ctx.inputdir, 'System/Library/CoreServices/SystemVersion.plist'), 'rb') as fp:
                 systemversion = plistlib.load(fp)
         except FileNotFoundError:
-            with open(os.path.join(inputsysdir, 'System/Library/CoreServices/SystemVersion.plist'), 'rb') as fp:
+            with open(os.path.join(ctx.inputsysdir, 'System/Library/CoreServices/SystemVersion.plist'), 'rb') as fp:
                 systemversion = plistlib.load(fp)
 
     # KEEP THE LINE BELOW TO GENERATE AN ORDEREDDICT BASED ON THE HEADERS
     record = OrderedDict((h, '') for h in _headers)
 
     record['local_hostname'] = finditem(preferences, 'LocalHostName')
-    record['ipaddress'] = full_prefix.split(',')[2]
+    record['ipaddress'] = ctx.full_prefix.split(',')[2]
 
     computer_name = finditem(preferences, 'ComputerName')
     if computer_name is not None:
@@ -82,13 +77,13 @@ def module():
             record['computer_name'] = computer_name.encode('utf-8')
     record['hostname'] = finditem(preferences, 'HostName')
     record['model'] = finditem(preferences, 'Model')
-    record['product_version'] = OSVersion
+    record['product_version'] = ctx.OSVersion
     record['product_build_version'] = finditem(systemversion, 'ProductBuildVersion')
-    record['serial_no'] = serial
-    record['volume_created'] = stats2(inputdir + "/", oMACB=True)['btime']
-    record['amtc_runtime'] = str(startTime).replace(' ', 'T').replace('+00:00', 'Z')
+    record['serial_no'] = ctx.serial
+    record['volume_created'] = stats2(ctx.inputdir + "/", oMACB=True)['btime']
+    record['amtc_runtime'] = str(ctx.startTime).replace(' ', 'T').replace('+00:00', 'Z')
 
-    if 'Volumes' not in inputdir and forensic_mode is not True:
+    if 'Volumes' not in ctx.inputdir and ctx.forensic_mode is not True:
 
         tz, e = subprocess.Popen(["systemsetup", "-gettimezone"], stdout=subprocess.PIPE).communicate()
         record['system_tz'] = tz.decode().rstrip().replace('Time Zone: ', '')
@@ -110,7 +105,7 @@ def module():
             record['system_tz'] = globalpreferences[0]['com.apple.TimeZonePref.Last_Selected_City'][3]
         except Exception:
             try:
-                record['system_tz'] = os.readlink(os.path.join(inputdir, 'etc/localtime'))[26:]
+                record['system_tz'] = os.readlink(os.path.join(ctx.inputdir, 'etc/localtime'))[26:]
             except Exception:
                 log.error("Could not get system timezone")
                 record['system_tz'] = "ERROR"
@@ -130,5 +125,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
@@ -20,21 +20,17 @@ from xml.parsers.expat import ExpatError
 
 from .common.Crypto.Cipher import AES
 
-# KEEP THIS - IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (OSVersion, archive, data_writer, forensic_mode,
-                      full_prefix, inputdir, outputdir, quiet, startTime)
-
 _modName = __name__.split('_')[-1]
 _modVers = '1.0.2'
 log = logging.getLogger(_modName)
 
 
-def module():
+def module(ctx):
 
     _headers = ['user', 'window_id', 'datablock', 'window_title', 'tab_working_directory_url', 'tab_working_directory_url_string', 'line_index', 'line']
-    _output = data_writer(_modName, _headers)
+    _output = ctx.data_writer(_modName, _headers)
 
-    user_inputdir = multiglob(inputdir, ["Users/*/Library/Saved Application State/com.apple.Terminal.savedState/",
+    user_inputdir = multiglob(ctx.inputdir, ["Users/*/Library/Saved Application State/com.apple.Terminal.savedState/",
                                          "private/var/*/Library/Saved Application State/com.apple.Terminal.savedState/"])
     if len(user_inputdir) <= 0:
         log.info("No Terminal.savedState files were found")
@@ -197,5 +193,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
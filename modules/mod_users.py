@@ -13,10 +13,6 @@ import sys
 import traceback
 from collections import OrderedDict
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import (archive, data_writer, forensic_mode, full_prefix,
-                      inputdir, no_tarball, outputdir, quiet, startTime)
-
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.dateutil import parser
 from .common.functions import read_bplist, stats2
@@ -31,12 +27,12 @@ log = logging.getLogger(_modNameVer)
 # 		or the deleted users may remain in the Users folder but be deleted as an account
 
 
-def module():
+def module(ctx):
     headers = ['mtime', 'atime', 'ctime', 'btime', 'date_deleted', 'uniq_id', 'user', 'real_name', 'admin', 'lastloggedin_user']
-    output = data_writer(_modName, headers)
+    output = ctx.data_writer(_modName, headers)
 
     # Parse the com.apple.preferences.accounts.plist to identify deleted accounts.
-    _deletedusers_plist = os.path.join(inputdir, 'Library/Preferences/com.apple.preferences.accounts.plist')
+    _deletedusers_plist = os.path.join(ctx.inputdir, 'Library/Preferences/com.apple.preferences.accounts.plist')
     log.debug("Getting deleted users metadata.")
     if not os.path.exists(_deletedusers_plist):
         log.debug("File not found: {0}".format(_deletedusers_plist))
@@ -58,14 +54,14 @@ def module():
         output.write_record(record)
 
     # Try to determine admin users on the system.
-    _admins = os.path.join(inputdir, 'private/var/db/dslocal/nodes/Default/groups/admin.plist')
+    _admins = os.path.join(ctx.inputdir, 'private/var/db/dslocal/nodes/Default/groups/admin.plist')
     log.debug("Getting admin users metadata.")
     try:
         # Should work on forensic images and live systems under Mojave.
         admins = list(read_bplist(_admins)[0]['users'])
     except Exception:
         log.debug("Could not access dslocal: [{0}].".format([traceback.format_exc()]))
-        if not forensic_mode:
+        if not ctx.forensic_mode:
             try:
                 log.debug("Trying DSCL to obtain admin users as input is live system.")
                 admin_users, e = subprocess.Popen(["dscl", ".", "-read", "/Groups/admin", "GroupMembership"], stdout=subprocess.PIPE).communicate()
@@ -80,8 +76,8 @@ def module():
 
     # Enumerate users still active on disk in /Users and /private/var off live/dead disks.
     log.debug("Enumerating user directories on disk.")
-    _liveusers = glob.glob((os.path.join(inputdir, 'Users/*')))
-    _privateusers = glob.glob((os.path.join(inputdir, 'private/var/*')))
+    _liveusers = glob.glob((os.path.join(ctx.inputdir, 'Users/*')))
+    _privateusers = glob.glob((os.path.join(ctx.inputdir, 'private/var/*')))
 
     not_users = ['.localized', 'Shared', 'agentx', 'at', 'audit', 'backups', 'db', 'empty',
                  'folders', 'install', 'jabberd', 'lib', 'log', 'mail', 'msgs', 'netboot',
@@ -94,7 +90,7 @@ def module():
     only_user_dirs = False
     try:
         # This should work on forensic images and live systems under Mojave.
-        _userplists = glob.glob(os.path.join(inputdir, 'private/var/db/dslocal/nodes/Default/users/*'))
+        _userplists = glob.glob(os.path.join(ctx.inputdir, 'private/var/db/dslocal/nodes/Default/users/*'))
         users_dict = {}
         for plist in _userplists:
             i_plist_array = read_bplist(plist)[0]
@@ -107,7 +103,7 @@ def module():
         users_dict = {}
 
     # For live systems Mojave and above, use dscl to get the same dict.
-    if not forensic_mode and len(users_dict) == 0:
+    if not ctx.forensic_mode and len(users_dict) == 0:
         user_ids, e = subprocess.Popen(["dscl", ".", "-list", "Users", "UniqueID"], stdout=subprocess.PIPE).communicate()
         for i in user_ids.decode('utf-8').split('\n'):
             data = i.split(' ')
@@ -117,7 +113,7 @@ def module():
         for i in user_names.decode('utf-8').split('\n'):
             data = i.split(' ')
             users_dict[data[0]]['real_name'] = ' '.join(filter(None, data[1:]))
-    elif forensic_mode and len(users_dict) == 0:
+    elif ctx.forensic_mode and len(users_dict) == 0:
         # If running in forensic mode and there was still an error accessing dslocal, operate only with the paths for each user.
         users_dict = {}
         only_user_dirs = True
@@ -126,7 +122,7 @@ def module():
 
     # Get last logged in user on system.
     log.debug("Getting last logged in user metadata.")
-    _loginwindow = os.path.join(inputdir, 'Library/Preferences/com.apple.loginwindow.plist')
+    _loginwindow = os.path.join(ctx.inputdir, 'Library/Preferences/com.apple.loginwindow.plist')
     if not os.path.exists(_loginwindow):
         log.debug("File not found: {0}".format(_loginwindow))
     else:
@@ -195,5 +191,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
@@ -5,18 +5,6 @@
 # IMPORT FUNCTIONS FROM COMMON.FUNCTIONS
 from .common.functions import stats2
 
-# IMPORT STATIC VARIABLES FROM MAIN
-from __main__ import inputdir
-from __main__ import outputdir
-from __main__ import forensic_mode
-from __main__ import no_tarball
-from __main__ import quiet
-
-from __main__ import archive
-from __main__ import startTime
-from __main__ import full_prefix
-from __main__ import data_writer
-
 import sys
 import os
 import glob
@@ -44,11 +32,11 @@ def decode_logon(int_code):
     return logon_type
 
 
-def module():
+def module(ctx):
     headers = ['user', 'id', 'terminal_type', 'pid', 'logon_type', 'timestamp', 'hostname']
-    output = data_writer(_modName, headers)
+    output = ctx.data_writer(_modName, headers)
 
-    utmpx_path = glob.glob(os.path.join(inputdir, 'private/var/run/utmpx'))
+    utmpx_path = glob.glob(os.path.join(ctx.inputdir, 'private/var/run/utmpx'))
 
     # This is a string version of the struct format, as described in the following:
     # https://opensource.apple.com/source/Libc/Libc-1158.50.2/include/NetBSD/utmpx.h.auto.html
@@ -104,5 +92,3 @@ if __name__ == "__main__":
     print("This is an AutoMacTC module, and is not meant to be run stand-alone.")
     print("Exiting.")
     sys.exit(0)
-else:
-    module()
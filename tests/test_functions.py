@@ -0,0 +1,32 @@
+import threading
+import time
+import unittest
+
+from modules.common.functions import WorkerQueue
+
+
+class WorkerQueueTest(unittest.TestCase):
+
+    def test_resize_while_workers_wait(self):
+        threads = set()
+        mux = threading.Lock()
+
+        def work(item):
+            with mux:
+                threads.add(threading.current_thread().name)
+
+        pool = WorkerQueue(work, 4, 100)
+        try:
+            time.sleep(0.1)  # all workers are waiting for an item
+            pool.resize(1)
+            for i in range(50):
+                pool.put(i)
+            pool.join()
+        finally:
+            pool.close()
+        self.assertEqual(threads, set(['worker-0']))
+        self.assertEqual(pool.workers, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
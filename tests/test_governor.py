@@ -0,0 +1,16 @@
+import unittest
+
+from modules.common.governor import ResourceGovernor
+
+
+class BackoffTest(unittest.TestCase):
+
+    def test_backoff_needs_a_limit(self):
+        self.assertFalse(ResourceGovernor().backoff)
+        self.assertTrue(ResourceGovernor(read_rate=1048576).backoff)
+        self.assertTrue(ResourceGovernor(cpu_share=0.5).backoff)
+        self.assertTrue(ResourceGovernor(backoff=True).backoff)
+
+
+if __name__ == '__main__':
+    unittest.main()
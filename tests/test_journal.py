@@ -0,0 +1,44 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from modules.common.context import CollectionContext
+from modules.common.journal import RunJournal
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.outputdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.outputdir, 'test,journal-run.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.outputdir)
+
+    def writer(self, journal):
+        ctx = CollectionContext(outputdir=self.outputdir, runID='-run', journal=journal)
+        return ctx.for_module('mod_dirlist').data_writer('dirlist', ['path'], resume=True)
+
+    def test_checkpoints_hold_new_state_only(self):
+        journal = RunJournal(self.path)
+        output = self.writer(journal)
+        output.write_row(('/a',))
+        output.checkpoint(dirs=['/a'])
+        output.write_row(('/b',))
+        output.checkpoint(dirs=['/b'])
+        output.close()
+        journal.close()
+
+        with open(self.path) as f:
+            checkpoints = [json.loads(line) for line in f]
+        self.assertEqual([c['dirs'] for c in checkpoints], [['/a'], ['/b']])
+
+        resumed = self.writer(RunJournal(self.path))
+        self.assertEqual(resumed.resumed_state('dirs'), set(['/a', '/b']))
+        resumed.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from modules import mod_users
+from modules.common.context import CollectionContext
+from modules.common.metrics import MetricsRecorder
+from modules.common.output import OutputDatabase
+
+
+class ExceptionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.outputdir = tempfile.mkdtemp()
+        database = OutputDatabase(os.path.join(self.outputdir, 'test.sqlite'))
+        self.ctx = CollectionContext(outputdir=self.outputdir, output_format='sqlite', output_database=database)
+        database.entry = self.ctx.register_file(database.path, 'sqlite', 'sqlite')
+
+    def tearDown(self):
+        self.ctx.output_database.close()
+        shutil.rmtree(self.outputdir)
+
+    def test_errors_logged_by_module(self):
+        recorder = MetricsRecorder()
+        metrics = recorder.measure('mod_users')
+        mod_users.log.error("Could not parse a user")
+        mod_users.log.error("Could not parse another user")
+        logging.getLogger('users').error("Not the logger of mod_users")
+        metrics.stop(True)
+        recorder.write(self.ctx)
+
+        self.ctx.output_database.close()
+        conn = sqlite3.connect(self.ctx.output_database.path)
+        try:
+            rows = conn.execute('SELECT module, exceptions FROM metrics').fetchall()
+        finally:
+            conn.close()
+        self.assertEqual(rows, [('users', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from modules.common.context import CollectionContext
+from modules.common.metrics import MetricsRecorder
+from modules.common.output import OutputDatabase
+
+
+class SqliteOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.outputdir = tempfile.mkdtemp()
+        database = OutputDatabase(os.path.join(self.outputdir, 'test.sqlite'))
+        self.ctx = CollectionContext(outputdir=self.outputdir, output_format='sqlite', output_database=database)
+        database.entry = self.ctx.register_file(database.path, 'sqlite', 'sqlite')
+
+    def tearDown(self):
+        self.ctx.output_database.close()
+        shutil.rmtree(self.outputdir)
+
+    def query(self, sql):
+        self.ctx.output_database.close()
+        conn = sqlite3.connect(self.ctx.output_database.path)
+        try:
+            return conn.execute(sql).fetchall()
+        finally:
+            conn.close()
+
+    def test_metrics_records(self):
+        recorder = MetricsRecorder()
+        metrics = recorder.measure('mod_utmpx')
+        output = self.ctx.for_module('mod_utmpx').data_writer('utmpx', ['user', 'host'])
+        output.write_row(('root', 'localhost'))
+        output.write_row(('admin', 'remote'))
+        output.flush_record(final=True)
+        metrics.stop(True)
+        self.ctx.manifest.take('mod_utmpx')
+        recorder.write(self.ctx)
+
+        rows = self.query('SELECT module, records, bytes, writer_records FROM metrics')
+        self.assertEqual(rows, [('utmpx', 2, 24, 'utmpx=2')])
+
+    def test_write_entry_fits_columns(self):
+        output = self.ctx.for_module('mod_utmpx').data_writer('utmpx', ['user', 'host'])
+        output.write_entry(['root'])
+        output.write_entry(['admin', 'remote', 'extra'])
+        output.close()
+
+        self.assertEqual(self.query('SELECT user, host FROM utmpx'), [('root', None), ('admin', 'remote')])
+
+
+if __name__ == '__main__':
+    unittest.main()
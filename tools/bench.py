@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+'''
+
+@ purpose:
+
+End-to-end forensic mode benchmark of automactc modules. Runs
+automactc.py -f -i <volume> once per module (and per repetition) and reports
+the throughput of every module from the metrics output of the run:
+
+    rows/s  - records written per second of module wall time
+    files/s - files opened per second of module wall time
+    MB/s    - input megabytes per second, using the per-module input sizes
+              from the <volume>.json written by synthvol.py, or output
+              megabytes if the volume has no description
+
+Build a volume with tools/synthvol.py first. automactc.py requires root, so
+run the benchmark as root as well. Code signatures can only be checked on
+macOS, elsewhere -NC is passed to automactc.py.
+
+Basic invocation: sudo python3 tools/bench.py /tmp/vol -m dirlist chrome -n 3
+Arguments after -- are passed to automactc.py, e.g. -- -H md5 sha256
+
+'''
+
+import argparse
+import csv
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+AUTOMACTC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'automactc.py')
+
+RESULT_HEADERS = ['module', 'run', 'status', 'elapsed', 'wall_time', 'cpu_user', 'cpu_system', 'peak_rss_delta',
+                  'records', 'files_opened', 'input_bytes', 'output_bytes', 'rows_per_s', 'files_per_s', 'mb_per_s']
+
+
+def available_modules():
+    mods = glob.glob(os.path.join(os.path.dirname(AUTOMACTC), 'modules', 'mod_*.py'))
+    return sorted(os.path.basename(m)[:-3].split('_')[-1] for m in mods if 'mod_live_' not in m)
+
+
+def read_metrics(outputdir, module):
+    """Returns the metrics row of module from the metrics output in outputdir.
+    """
+    for path in glob.glob(os.path.join(outputdir, '*,metrics*.csv')):
+        with open(path) as f:
+            for row in csv.DictReader(f):
+                if row['module'] == module:
+                    return row
+    return None
+
+
+def _rate(amount, seconds):
+    if amount in (None, '') or seconds <= 0:
+        return ''
+    return '{0:.1f}'.format(float(amount) / seconds)
+
+
+def run_module(python, volume, module, extra, input_bytes, run):
+    """Run a single module against volume and return its result row.
+    """
+    outputdir = tempfile.mkdtemp(prefix='amtc-bench-')
+    cmd = [python, AUTOMACTC, '-f', '-i', volume, '-o', outputdir, '-m', module,
+           '-nt', '-nl', '-np', '-q', '-fmt', 'csv'] + extra
+    if sys.platform != 'darwin':
+        cmd.append('-NC')
+    try:
+        start = time.time()
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        out = proc.communicate()[0]
+        elapsed = time.time() - start
+
+        metrics = read_metrics(outputdir, module)
+        if metrics is None:
+            sys.stderr.write('No metrics for {0} (exit code {1}):\n{2}\n'.format(module, proc.returncode, out.decode('utf-8', 'replace')))
+            return None
+    finally:
+        shutil.rmtree(outputdir, ignore_errors=True)
+
+    wall = float(metrics['wall_time'])
+    output_bytes = int(metrics['bytes'] or 0)
+    mb = (input_bytes if input_bytes is not None else output_bytes) / 1048576.0
+    return {
+        'module': module,
+        'run': run,
+        'status': metrics['status'],
+        'elapsed': '{0:.3f}'.format(elapsed),
+        'wall_time': metrics['wall_time'],
+        'cpu_user': metrics['cpu_user'],
+        'cpu_system': metrics['cpu_system'],
+        'peak_rss_delta': metrics['peak_rss_delta'],
+        'records': metrics['records'],
+        'files_opened': metrics['files_opened'],
+        'input_bytes': input_bytes if input_bytes is not None else '',
+        'output_bytes': output_bytes,
+        'rows_per_s': _rate(metrics['records'], wall),
+        'files_per_s': _rate(metrics['files_opened'], wall),
+        'mb_per_s': _rate(mb, wall),
+    }
+
+
+def parseArguments():
+    argv = sys.argv[1:]
+    extra = []
+    if '--' in argv:
+        extra = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+
+    parser = argparse.ArgumentParser(description='Benchmark automactc modules in forensic mode against a (synthetic) volume.')
+    parser.add_argument('volume', help='volume to analyze, e.g. built with tools/synthvol.py')
+    parser.add_argument('-m', '--modules', nargs='+', default=None, help='modules to benchmark, defaults to all non-live modules')
+    parser.add_argument('-n', '--repeat', type=int, default=1, help='runs per module, defaults to 1')
+    parser.add_argument('-p', '--python', default=sys.executable, help='interpreter to run automactc.py with, defaults to this one')
+    parser.add_argument('-o', '--output', default=None, help='also write the results to this CSV file')
+    args = parser.parse_args(argv)
+    args.extra = extra
+    return args
+
+
+def main():
+    args = parseArguments()
+    volume = os.path.abspath(args.volume)
+
+    inputs = {}
+    description = volume.rstrip(os.sep) + '.json'
+    if os.path.exists(description):
+        with open(description) as f:
+            inputs = dict((m, v['input_bytes']) for m, v in json.load(f)['modules'].items())
+
+    modules = args.modules or available_modules()
+    results = []
+    for module in modules:
+        for run in range(1, args.repeat + 1):
+            result = run_module(args.python, volume, module, args.extra, inputs.get(module), run)
+            if result is not None:
+                results.append(result)
+                print('{module:<16} run {run}  {status:<9} wall {wall_time:>8}s  {rows_per_s:>10} rows/s  '
+                      '{files_per_s:>9} files/s  {mb_per_s:>8} MB/s'.format(**result))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            writer = csv.DictWriter(f, RESULT_HEADERS)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+
+'''
+
+@ purpose:
+
+Build a synthetic macOS volume on any OS, to be analyzed by automactc in
+forensic mode (-f -i <volume>). Used with tools/bench.py to measure the
+throughput of the modules without a real Mac image.
+
+The volume holds, for every user:
+    Chrome History and Cookies, Firefox places.sqlite and cookies.sqlite,
+    Safari History.db and Downloads.plist, QuarantineEventsV2,
+    LaunchAgents, .sfl2 MRU lists and a .bash_history
+and, system wide:
+    SystemVersion.plist, LaunchDaemons (XML and binary plists),
+    system.log with .gz rotations, a utmpx file and a deep directory tree.
+
+Row counts and the size of the directory tree are configurable. Generation
+is deterministic for a given --seed.
+
+A description of the volume is written next to it as <volume>.json, with
+the number of input bytes generated for each module, which bench.py uses
+to report MB/s.
+
+Requires python 3.8+ (plistlib.UID for the NSKeyedArchiver .sfl2 files).
+
+Basic invocation: python3 tools/synthvol.py /tmp/vol --users 2 --tree-files 20000
+
+'''
+
+import argparse
+import gzip
+import json
+import os
+import plistlib
+import random
+import sqlite3
+import struct
+import sys
+from datetime import datetime, timedelta
+
+# Offsets between the unix epoch and the epochs used in the databases.
+CHROME_EPOCH = 11644473600  # 1601-01-01, microseconds
+COCOA_EPOCH = 978307200     # 2001-01-01, seconds
+
+DOMAINS = ['example.com', 'github.com', 'apple.com', 'wikipedia.org', 'python.org',
+           'mozilla.org', 'google.com', 'stackoverflow.com', 'news.ycombinator.com']
+PROGRAMS = ['/usr/bin/python', '/usr/libexec/sshd-keygen-wrapper', '/Library/Application Support/Synth/agent',
+            '/usr/local/bin/updater', '/bin/sh']
+PROCESSES = ['kernel', 'syslogd', 'sshd', 'loginwindow', 'launchd', 'com.apple.xpc.launchd', 'softwareupdated']
+
+
+class Volume(object):
+    """
+    Writes the synthetic volume and keeps track of the bytes written per
+    module.
+    """
+
+    def __init__(self, root, seed=0):
+        self.root = os.path.abspath(root)
+        self.rand = random.Random(seed)
+        self.now = datetime(2021, 6, 1, 12, 0, 0)
+        self.inputs = {}
+        self.rows = {}
+
+    def path(self, *parts):
+        p = os.path.join(self.root, *parts)
+        d = os.path.dirname(p)
+        if not os.path.isdir(d):
+            os.makedirs(d)
+        return p
+
+    def track(self, module, path, rows=0):
+        """Count the file at path as input of module.
+        """
+        self.inputs[module] = self.inputs.get(module, 0) + os.path.getsize(path)
+        self.rows[module] = self.rows.get(module, 0) + rows
+
+    def url(self):
+        return 'https://{0}/{1}/{2}'.format(self.rand.choice(DOMAINS), self.rand.randint(0, 9999),
+                                            self.rand.choice(['index.html', 'search?q=term', 'download.dmg', 'a/b/c']))
+
+    def unix_time(self):
+        return (self.now - timedelta(seconds=self.rand.randint(0, 86400 * 365)) - datetime(1970, 1, 1)).total_seconds()
+
+    def sqlite(self, path, schema, tables):
+        """Create a database at path from the schema statements and a dict of
+        table name to list of rows.
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        for statement in schema:
+            conn.execute(statement)
+        for table, rows in tables.items():
+            if rows:
+                conn.executemany('INSERT INTO {0} VALUES ({1})'.format(table, ','.join('?' * len(rows[0]))), rows)
+        conn.commit()
+        conn.close()
+        return path
+
+
+def gen_system(vol, os_version):
+    for d in ['Applications', 'Library', 'System', 'Users', 'private/var/log', 'private/var/run']:
+        p = os.path.join(vol.root, d)
+        if not os.path.isdir(p):
+            os.makedirs(p)
+
+    with open(vol.path('System/Library/CoreServices/SystemVersion.plist'), 'wb') as f:
+        plistlib.dump({'ProductName': 'Mac OS X', 'ProductVersion': os_version,
+                       'ProductBuildVersion': '19H2'}, f)
+
+
+def gen_chrome(vol, user, rows):
+    base = os.path.join('Users', user, 'Library/Application Support/Google/Chrome')
+    with open(vol.path(base, 'Local State'), 'w') as f:
+        json.dump({'profile': {'info_cache': {'Default': {'active_time': vol.unix_time(), 'name': user,
+                                                          'is_using_default_avatar': True}}},
+                   'user_experience_metrics': {'stats_version': '91.0.4472.77'}}, f)
+
+    visits = []
+    urls = []
+    terms = []
+    for i in range(1, rows + 1):
+        t = int((vol.unix_time() + CHROME_EPOCH) * 1000000)
+        urls.append((i, vol.url(), 'Title {0}'.format(i), vol.rand.randint(1, 20), vol.rand.randint(0, 5), t, 0))
+        visits.append((i, i, t, vol.rand.randint(0, 600) * 1000000))
+        if i % 10 == 0:
+            terms.append((1, i, 'term {0}'.format(i), 'term {0}'.format(i)))
+    downloads = [(i, '/Users/{0}/Downloads/file{1}.dmg'.format(user, i), '/Users/{0}/Downloads/file{1}.dmg'.format(user, i),
+                  int((vol.unix_time() + CHROME_EPOCH) * 1000000), int((vol.unix_time() + CHROME_EPOCH) * 1000000),
+                  0, 1, 'Tue, 01 Jun 2021 12:00:00 GMT', vol.url(), vol.url(), vol.url(), vol.url())
+                 for i in range(1, rows // 20 + 2)]
+    chains = [(i, 0, vol.url()) for i in range(1, rows // 20 + 2)]
+
+    history = vol.sqlite(vol.path(base, 'Default/History'), [
+        'CREATE TABLE meta(key LONGVARCHAR NOT NULL UNIQUE PRIMARY KEY, value LONGVARCHAR)',
+        'CREATE TABLE urls(id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, visit_count INTEGER, typed_count INTEGER, last_visit_time INTEGER, hidden INTEGER)',
+        'CREATE TABLE visits(id INTEGER PRIMARY KEY, url INTEGER, visit_time INTEGER, visit_duration INTEGER)',
+        'CREATE TABLE keyword_search_terms(keyword_id INTEGER, url_id INTEGER, term LONGVARCHAR, normalized_term LONGVARCHAR)',
+        'CREATE TABLE downloads(id INTEGER PRIMARY KEY, current_path LONGVARCHAR, target_path LONGVARCHAR, start_time INTEGER, end_time INTEGER, danger_type INTEGER, opened INTEGER, last_modified VARCHAR, referrer VARCHAR, tab_url VARCHAR, tab_referrer_url VARCHAR, site_url VARCHAR)',
+        'CREATE TABLE downloads_url_chains(id INTEGER, chain_index INTEGER, url LONGVARCHAR)',
+    ], {'meta': [('version', '46')], 'urls': urls, 'visits': visits, 'keyword_search_terms': terms,
+        'downloads': downloads, 'downloads_url_chains': chains})
+    vol.track('chrome', history, len(visits) + len(downloads))
+
+    cookies = [(vol.rand.choice(DOMAINS), 'cookie{0}'.format(i), '', '/', int((vol.unix_time() + CHROME_EPOCH) * 1000000),
+                int((vol.unix_time() + CHROME_EPOCH) * 1000000), int((vol.unix_time() + CHROME_EPOCH) * 1000000),
+                1, 0, 1, 1, 1, b'\x00' * 32, 0, 2) for i in range(rows)]
+    db = vol.sqlite(vol.path(base, 'Default/Cookies'), [
+        'CREATE TABLE meta(key LONGVARCHAR NOT NULL UNIQUE PRIMARY KEY, value LONGVARCHAR)',
+        'CREATE TABLE cookies(host_key TEXT, name TEXT, value TEXT, path TEXT, creation_utc INTEGER, expires_utc INTEGER, last_access_utc INTEGER, is_secure INTEGER, is_httponly INTEGER, has_expires INTEGER, is_persistent INTEGER, priority INTEGER, encrypted_value BLOB, samesite INTEGER, source_scheme INTEGER)',
+    ], {'meta': [('version', '12')], 'cookies': cookies})
+    vol.track('cookies', db, len(cookies))
+
+
+def gen_firefox(vol, user, rows):
+    base = os.path.join('Users', user, 'Library/Application Support/Firefox/Profiles/synth.default')
+    with open(vol.path(base, 'compatibility.ini'), 'w') as f:
+        f.write('[Compatibility]\nLastVersion=89.0_20210527174632/20210527174632\n')
+    with open(vol.path(base, 'extensions.json'), 'w') as f:
+        json.dump({'addons': [{'id': 'synth@example.com', 'updateURL': None, 'installDate': 1600000000000,
+                               'updateDate': 1600000000000, 'sourceURI': vol.url(),
+                               'defaultLocale': {'name': 'Synth', 'creator': 'Synth', 'description': 'Synthetic add-on',
+                                                 'homepageURL': vol.url()}}]}, f)
+    vol.track('firefox', os.path.join(vol.root, base, 'extensions.json'), 1)
+
+    places = []
+    visits = []
+    for i in range(1, rows + 1):
+        t = int(vol.unix_time() * 1000000)
+        places.append((i, vol.url(), 'Title {0}'.format(i), vol.rand.randint(1, 20), 0, t, 'Description {0}'.format(i)))
+        visits.append((i, i, t, 1))
+    annos = []
+    for i in range(1, rows // 20 + 2):
+        t = int(vol.unix_time() * 1000000)
+        annos.append((2 * i - 1, i, 1, 'file:///Users/{0}/Downloads/file{1}.zip'.format(user, i), t))
+        annos.append((2 * i, i, 2, '{{"state":1,"endTime":{0},"fileSize":{1}}}'.format(t // 1000, vol.rand.randint(1, 10 ** 8)), t))
+
+    db = vol.sqlite(vol.path(base, 'places.sqlite'), [
+        'CREATE TABLE moz_places(id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, visit_count INTEGER, typed INTEGER, last_visit_date INTEGER, description TEXT)',
+        'CREATE TABLE moz_historyvisits(id INTEGER PRIMARY KEY, place_id INTEGER, visit_date INTEGER, visit_type INTEGER)',
+        'CREATE TABLE moz_annos(id INTEGER PRIMARY KEY, place_id INTEGER, anno_attribute_id INTEGER, content LONGVARCHAR, dateAdded INTEGER)',
+    ], {'moz_places': places, 'moz_historyvisits': visits, 'moz_annos': annos})
+    vol.track('firefox', db, len(visits) + len(annos) // 2)
+
+    cookies = [(vol.rand.choice(DOMAINS), 'cookie{0}'.format(i), '', '/', int(vol.unix_time() * 1000000),
+                int(vol.unix_time()), int(vol.unix_time() * 1000000), 1, 0, 0, 0) for i in range(rows)]
+    db = vol.sqlite(vol.path(base, 'cookies.sqlite'), [
+        'CREATE TABLE moz_cookies(host TEXT, name TEXT, value TEXT, path TEXT, creationTime INTEGER, expiry INTEGER, lastAccessed INTEGER, isSecure INTEGER, isHttpOnly INTEGER, inBrowserElement INTEGER, sameSite INTEGER)',
+    ], {'moz_cookies': cookies})
+    vol.track('cookies', db, len(cookies))
+
+
+def gen_safari(vol, user, rows):
+    base = os.path.join('Users', user, 'Library/Safari')
+    items = []
+    visits = []
+    for i in range(1, rows + 1):
+        items.append((i, vol.url(), vol.rand.randint(1, 20)))
+        visits.append((i, i, vol.unix_time() - COCOA_EPOCH, 'Title {0}'.format(i)))
+    db = vol.sqlite(vol.path(base, 'History.db'), [
+        'CREATE TABLE history_items(id INTEGER PRIMARY KEY, url TEXT, visit_count INTEGER)',
+        'CREATE TABLE history_visits(id INTEGER PRIMARY KEY, history_item INTEGER, visit_time REAL, title TEXT)',
+    ], {'history_items': items, 'history_visits': visits})
+    # Safari keeps History.db in WAL mode, the module copies all three files.
+    for suffix in ['-shm', '-wal']:
+        open(db + suffix, 'wb').close()
+    vol.track('safari', db, len(visits))
+
+    downloads = [{'DownloadEntryURL': vol.url(), 'DownloadEntryPath': '~/Downloads/file{0}.pkg'.format(i),
+                  'DownloadEntryDateAddedKey': vol.now, 'DownloadEntryDateFinishedKey': vol.now,
+                  'DownloadEntryProgressTotalToLoad': 1024 * i, 'DownloadEntryProgressBytesSoFar': 1024 * i}
+                 for i in range(rows // 20 + 1)]
+    with open(vol.path(base, 'Downloads.plist'), 'wb') as f:
+        plistlib.dump({'DownloadHistory': downloads}, f, fmt=plistlib.FMT_BINARY)
+    vol.track('safari', os.path.join(vol.root, base, 'Downloads.plist'), len(downloads))
+
+
+def gen_quarantine(vol, user, rows):
+    events = [('{0:08X}-0000-0000-0000-{1:012X}'.format(vol.rand.getrandbits(32), i), vol.unix_time() - COCOA_EPOCH,
+               'com.apple.Safari', 'Safari', vol.url(), None, None, 0, None, vol.url(), None)
+              for i in range(rows)]
+    db = vol.sqlite(vol.path('Users', user, 'Library/Preferences/com.apple.LaunchServices.QuarantineEventsV2'), [
+        'CREATE TABLE LSQuarantineEvent(LSQuarantineEventIdentifier TEXT PRIMARY KEY NOT NULL, LSQuarantineTimeStamp REAL, LSQuarantineAgentBundleIdentifier TEXT, LSQuarantineAgentName TEXT, LSQuarantineDataURLString TEXT, LSQuarantineSenderName TEXT, LSQuarantineSenderAddress TEXT, LSQuarantineTypeNumber INTEGER, LSQuarantineOriginTitle TEXT, LSQuarantineOriginURLString TEXT, LSQuarantineOriginAlias BLOB)',
+    ], {'LSQuarantineEvent': events})
+    vol.track('quarantines', db, len(events))
+
+
+def gen_launch_items(vol, count, users):
+    locations = ['Library/LaunchDaemons', 'Library/LaunchAgents'] + ['Users/{0}/Library/LaunchAgents'.format(u) for u in users]
+    for i in range(count):
+        loc = locations[i % len(locations)]
+        label = 'com.synth.item{0}'.format(i)
+        program = vol.rand.choice(PROGRAMS)
+        plist = {'Label': label, 'ProgramArguments': [program, '--run', str(i)], 'RunAtLoad': True}
+        fmt = plistlib.FMT_BINARY if i % 2 else plistlib.FMT_XML
+        p = vol.path(loc, label + '.plist')
+        with open(p, 'wb') as f:
+            plistlib.dump(plist, f, fmt=fmt)
+        vol.track('autoruns', p, 1)
+
+    # Programs referenced by the launch items, so that they can be hashed.
+    for program in PROGRAMS:
+        p = vol.path(program.lstrip('/'))
+        if not os.path.exists(p):
+            with open(p, 'wb') as f:
+                f.write(os.urandom(vol.rand.randint(4096, 65536)))
+        vol.track('autoruns', p)
+
+
+def _keyed_archive(root):
+    """Encode root (dicts, lists, strings, numbers and bytes) as an
+    NSKeyedArchiver plist, the format of .sfl2 files.
+    """
+    objects = ['$null']
+    classes = {}
+
+    def klass(name):
+        if name not in classes:
+            objects.append({'$classname': name, '$classes': [name, 'NSObject']})
+            classes[name] = plistlib.UID(len(objects) - 1)
+        return classes[name]
+
+    def encode(value):
+        if isinstance(value, dict):
+            obj = {}
+            objects.append(obj)
+            uid = plistlib.UID(len(objects) - 1)
+            obj['NS.keys'] = [encode(k) for k in value]
+            obj['NS.objects'] = [encode(v) for v in value.values()]
+            obj['$class'] = klass('NSDictionary')
+            return uid
+        if isinstance(value, list):
+            obj = {}
+            objects.append(obj)
+            uid = plistlib.UID(len(objects) - 1)
+            obj['NS.objects'] = [encode(v) for v in value]
+            obj['$class'] = klass('NSArray')
+            return uid
+        objects.append(value)
+        return plistlib.UID(len(objects) - 1)
+
+    top = encode(root)
+    return plistlib.dumps({'$archiver': 'NSKeyedArchiver', '$version': 100000,
+                           '$top': {'root': top}, '$objects': objects}, fmt=plistlib.FMT_BINARY)
+
+
+def gen_sfl2(vol, user, rows):
+    base = os.path.join('Users', user, 'Library/Application Support/com.apple.sharedfilelist')
+    for name in ['com.apple.LSSharedFileList.RecentDocuments', 'com.apple.LSSharedFileList.RecentApplications']:
+        items = []
+        for i in range(rows):
+            path = '/Users/{0}/Documents/document{1}.txt'.format(user, i)
+            bookmark = b'book\x00\x00\x00\x00' + ('file;' + path).encode('utf-8') + b'\x00'
+            items.append({'Name': os.path.basename(path), 'Bookmark': bookmark})
+        data = _keyed_archive({'items': items, 'properties': {'com.apple.LSSharedFileList.MaxAmount': 10}})
+        p = vol.path(base, name + '.sfl2')
+        with open(p, 'wb') as f:
+            f.write(data)
+        vol.track('mru', p, len(items))
+
+
+def gen_bash(vol, user, rows):
+    p = vol.path('Users', user, '.bash_history')
+    with open(p, 'w') as f:
+        for i in range(rows):
+            f.write('ls -la /tmp/{0}\n'.format(i))
+    vol.track('bash', p, rows)
+
+
+def gen_syslog(vol, lines, rotations):
+    def write(f, count):
+        for i in range(count):
+            t = vol.now - timedelta(seconds=vol.rand.randint(0, 86400 * 7))
+            line = '{0} synth-mac {1}[{2}]: synthetic message {3}\n'.format(
+                t.strftime('%b %d %H:%M:%S'), vol.rand.choice(PROCESSES), vol.rand.randint(1, 65535), i)
+            f.write(line.encode('utf-8'))
+
+    p = vol.path('private/var/log/system.log')
+    with open(p, 'wb') as f:
+        write(f, lines)
+    vol.track('syslog', p, lines)
+    for n in range(rotations):
+        p = vol.path('private/var/log/system.log.{0}.gz'.format(n))
+        with gzip.open(p, 'wb') as f:
+            write(f, lines)
+        vol.track('syslog', p, lines)
+
+
+def gen_utmpx(vol, rows, users):
+    fmt = '256s4s32sih2xii256s64x'
+    records = [struct.pack(fmt, b'utmpx-1.00', b'', b'', 0, 10, 0, 0, b'')]
+    records.append(struct.pack(fmt, b'', b'', b'', 1, 2, int(vol.unix_time()), 0, b''))
+    for i in range(rows):
+        user = users[i % len(users)].encode('utf-8')
+        records.append(struct.pack(fmt, user, b'\x00\x00\x00\x01', 'ttys{0:03d}'.format(i % 100).encode('utf-8'),
+                                   1000 + i, 7, int(vol.unix_time()), 0, b''))
+    p = vol.path('private/var/run/utmpx')
+    with open(p, 'wb') as f:
+        f.write(b''.join(records))
+    vol.track('utmpx', p, len(records) - 1)
+
+
+def gen_tree(vol, files, depth, fanout, max_size, user):
+    """Spread files over a directory tree of the given depth and fanout.
+    """
+    dirs = ['']
+    level = ['']
+    for _ in range(depth):
+        level = [os.path.join(d, 'dir{0}'.format(n)) for d in level for n in range(fanout)]
+        dirs.extend(level)
+    base = os.path.join('Users', user, 'Documents/tree')
+    for i in range(files):
+        d = dirs[vol.rand.randrange(len(dirs))]
+        p = vol.path(base, d, 'file{0}.{1}'.format(i, vol.rand.choice(['txt', 'dat', 'log', 'plist', 'bin'])))
+        with open(p, 'wb') as f:
+            f.write(os.urandom(vol.rand.randint(0, max_size)))
+
+
+def parseArguments():
+    parser = argparse.ArgumentParser(description='Build a synthetic macOS volume for automactc forensic mode benchmarks.')
+    parser.add_argument('volume', help='directory to build the volume in, created if needed')
+    parser.add_argument('--users', type=int, default=2, help='number of user home directories, defaults to 2')
+    parser.add_argument('--history-rows', type=int, default=5000, help='browser history and cookie rows per user per browser, defaults to 5000')
+    parser.add_argument('--quarantine-rows', type=int, default=2000, help='QuarantineEventsV2 rows per user, defaults to 2000')
+    parser.add_argument('--launch-items', type=int, default=200, help='number of LaunchAgents and LaunchDaemons plists, defaults to 200')
+    parser.add_argument('--mru-rows', type=int, default=100, help='items per .sfl2 file, defaults to 100')
+    parser.add_argument('--bash-rows', type=int, default=1000, help='.bash_history lines per user, defaults to 1000')
+    parser.add_argument('--syslog-lines', type=int, default=20000, help='lines per system.log file, defaults to 20000')
+    parser.add_argument('--syslog-rotations', type=int, default=3, help='number of system.log.N.gz rotations, defaults to 3')
+    parser.add_argument('--utmpx-rows', type=int, default=500, help='utmpx login records, defaults to 500')
+    parser.add_argument('--tree-files', type=int, default=10000, help='number of files in the directory tree, defaults to 10000')
+    parser.add_argument('--tree-depth', type=int, default=4, help='depth of the directory tree, defaults to 4')
+    parser.add_argument('--tree-fanout', type=int, default=4, help='subdirectories per tree directory, defaults to 4')
+    parser.add_argument('--max-file-size', type=int, default=65536, help='maximum size in bytes of tree files, defaults to 65536')
+    parser.add_argument('--os-version', default='10.15.7', help='ProductVersion in SystemVersion.plist, defaults to 10.15.7')
+    parser.add_argument('--seed', type=int, default=0, help='random seed, defaults to 0')
+    return parser.parse_args()
+
+
+def main():
+    args = parseArguments()
+    vol = Volume(args.volume, args.seed)
+    users = ['user{0}'.format(n) for n in range(args.users)]
+
+    gen_system(vol, args.os_version)
+    for user in users:
+        gen_chrome(vol, user, args.history_rows)
+        gen_firefox(vol, user, args.history_rows)
+        gen_safari(vol, user, args.history_rows)
+        gen_quarantine(vol, user, args.quarantine_rows)
+        gen_sfl2(vol, user, args.mru_rows)
+        gen_bash(vol, user, args.bash_rows)
+    gen_launch_items(vol, args.launch_items, users)
+    gen_syslog(vol, args.syslog_lines, args.syslog_rotations)
+    gen_utmpx(vol, args.utmpx_rows, users)
+    if users:
+        gen_tree(vol, args.tree_files, args.tree_depth, args.tree_fanout, args.max_file_size, users[0])
+
+    total_bytes = 0
+    total_files = 0
+    for root, _, files in os.walk(vol.root):
+        total_files += len(files)
+        total_bytes += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    vol.inputs['dirlist'] = total_bytes
+    vol.rows['dirlist'] = total_files
+
+    description = {
+        'volume': vol.root,
+        'generated': datetime.utcnow().isoformat() + 'Z',
+        'arguments': vars(args),
+        'modules': dict((m, {'input_bytes': vol.inputs[m], 'expected_rows': vol.rows.get(m, 0)}) for m in sorted(vol.inputs)),
+    }
+    with open(vol.root.rstrip(os.sep) + '.json', 'w') as f:
+        json.dump(description, f, indent=2)
+
+    print('Built {0}: {1} files, {2:.1f} MB.'.format(vol.root, total_files, total_bytes / 1048576.0))
+
+
+if __name__ == '__main__':
+    if sys.version_info < (3, 8):
+        sys.exit('synthvol.py requires python 3.8 or later.')
+    main()